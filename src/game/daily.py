@@ -1,21 +1,45 @@
+import functools
 import logging
-import random
 from datetime import date
+from typing import Sequence
 
-from phase2.country import Country, get_country, get_random_country
+from game.feedback import FeedbackMatrix
+from game.schedule import get_daily_schedule, pick_daily_country
+from phase2 import DATA_DIR
+from phase2.country import Country, get_catalog, get_country
 from phase2.round import GuessFeedback, RoundStats
 from phase2.statistics import get_statistics_repository
+from phase2.write_queue import RoundWriteQueue
 
 logger = logging.getLogger("phase2.daily")
 
+FEEDBACK_MATRIX_CACHE = DATA_DIR / "feedback_matrix.bin"
+# Queued rounds are spooled here so they aren't lost if the server stops first
+ROUND_SPOOL = DATA_DIR / "round_spool"
 
-def get_daily_country() -> Country:
+# Records finished rounds in the background once started (see main.py)
+round_writer = RoundWriteQueue(lambda: get_statistics_repository(), spool=ROUND_SPOOL)
+
+
+def get_daily_country(day: date | None = None) -> Country:
     """
-    Gets a country for today's date, deterministically
+    Gets a country for today's date (or the given date), deterministically.
+    Answers are read from the precomputed daily schedule; dates outside it are
+    worked out once and reused until the date changes.
     """
-    today_str = date.today().isoformat()
-    random.seed(today_str)  # seed random with date (every daily country is the same)
-    return get_random_country()
+    if day is None:
+        day = date.today()
+
+    country = get_daily_schedule().lookup(day)
+    if country is not None:
+        return country
+    return _unscheduled_daily_country(day)
+
+
+# Only the most recently requested date outside the schedule is kept
+@functools.lru_cache(maxsize=1)
+def _unscheduled_daily_country(day: date) -> Country:
+    return pick_daily_country(day)
 
 
 async def handle_guess(input: str, round_stats: RoundStats):
@@ -34,13 +58,12 @@ async def handle_guess(input: str, round_stats: RoundStats):
 
     # Error handling in case the countryinfo API isn't able to serve info we need
     try:
-        feedback: GuessFeedback = compare_countries(country, daily_country)
+        feedback: GuessFeedback = grade_guess(country, daily_country)
     except AttributeError:
         round_stats.guess_error.emit()
         return
 
-    round_stats.guessed_names.append(country.name)
-    round_stats.guesses += 1
+    round_stats.record_guess(country.name, feedback)
 
     if feedback.name:  # correct guess
         await end_game(True, round_stats)
@@ -50,6 +73,60 @@ async def handle_guess(input: str, round_stats: RoundStats):
     round_stats.guess_graded.emit(country, feedback)
 
 
+@functools.cache
+def get_feedback_matrix() -> FeedbackMatrix:
+    """
+    Returns the process-wide feedback matrix for every country in the catalog,
+    loading it from the cache file or building it on first use
+    """
+    countries = get_catalog().countries
+    matrix = FeedbackMatrix.load(
+        FEEDBACK_MATRIX_CACHE, countries, compare_countries, COMPARE_VERSION
+    )
+    source = "loaded from cache"
+    if matrix is None:
+        matrix = FeedbackMatrix(countries, compare_countries, version=COMPARE_VERSION)
+        source = "built"
+        try:
+            matrix.save(FEEDBACK_MATRIX_CACHE)
+        except OSError:
+            logger.warning("Couldn't write the feedback matrix cache")
+
+    logger.info(
+        f"Feedback matrix for {len(matrix)} countries {source} in "
+        f"{matrix.build_seconds * 1000:.1f}ms, "
+        f"using {matrix.memory_bytes / 1024:.1f}KiB"
+    )
+    return matrix
+
+
+def grade_guess(guess: Country, answer: Country) -> GuessFeedback:
+    """
+    Returns the feedback for a guess, looked up in the feedback matrix.
+    Countries that aren't in the matrix are compared directly.
+    """
+    feedback = get_feedback_matrix().feedback(guess, answer)
+    if feedback is None:
+        feedback = compare_countries(guess, answer)
+    return feedback
+
+
+def compare_many(
+    guess: Country, answers: Sequence[Country] | None = None
+) -> list[GuessFeedback]:
+    """
+    Compares one guess against many answers (every country in the catalog by
+    default) in a single pass, returning the feedback for each answer in order.
+    Same results as calling compare_countries for each answer.
+    """
+    return get_feedback_matrix().feedback_for(guess, answers)
+
+
+# Bump whenever compare_countries changes how countries are graded, so feedback
+# matrices cached by earlier versions are rebuilt
+COMPARE_VERSION = 1
+
+
 def compare_countries(guess: Country, answer: Country) -> GuessFeedback:
     """
     Check if the two countries match.
@@ -92,64 +169,49 @@ def compare_countries(guess: Country, answer: Country) -> GuessFeedback:
     # Compare region
     feedback.region = guess.region == answer.region
 
-    # Compare currencies
-    guess_currencies = set(guess.currencies) if guess.currencies else set()
-    answer_currencies = set(answer.currencies) if answer.currencies else set()
-
-    if answer_currencies:
-        if guess_currencies == answer_currencies:
-            feedback.currencies = True
-        elif guess_currencies & answer_currencies:  # Has intersection
-            feedback.currencies = "partial"
-        else:
-            feedback.currencies = False
-
-    # Compare languages
-    guess_languages = set(guess.languages) if guess.languages else set()
-    answer_languages = set(answer.languages) if answer.languages else set()
-
-    if answer_languages:
-        if guess_languages == answer_languages:
-            feedback.languages = True
-        elif guess_languages & answer_languages:  # Has intersection
-            feedback.languages = "partial"
-        else:
-            feedback.languages = False
-
-    # Compare timezones
-    guess_timezones = set(guess.timezones) if guess.timezones else set()
-    answer_timezones = set(answer.timezones) if answer.timezones else set()
-
-    if answer_timezones:
-        if guess_timezones == answer_timezones:
-            feedback.timezones = True
-        elif guess_timezones & answer_timezones:  # Has intersection
-            feedback.timezones = "partial"
-        else:
-            feedback.timezones = False
+    # Compare currencies, languages and timezones (as bitmasks of each set)
+    if answer.currency_mask:
+        feedback.currencies = compare_masks(guess.currency_mask, answer.currency_mask)
+
+    if answer.language_mask:
+        feedback.languages = compare_masks(guess.language_mask, answer.language_mask)
+
+    if answer.timezone_mask:
+        feedback.timezones = compare_masks(guess.timezone_mask, answer.timezone_mask)
 
     return feedback
 
 
+def compare_masks(guess_mask: int, answer_mask: int) -> bool | str:
+    """
+    Compares two sets stored as bitmasks. Returns True if they match,
+    'partial' if they overlap, or False if they have nothing in common.
+    """
+    if guess_mask == answer_mask:
+        return True
+    elif guess_mask & answer_mask:  # Has intersection
+        return "partial"
+    else:
+        return False
+
+
 async def end_game(won: bool, round_stats: RoundStats):
     """
     End the game in either a win or a loss, and pass this game's statistics
     on to be processed in statistics.py, and show a breakdown of this game's
     stats to the user
     """
-    stats_repo = get_statistics_repository()
-
     round_stats.end_round()
     round_stats.won = won
     logger.info("Round stats:")
-    logger.info(vars(round_stats))
+    logger.info(round_stats.summary())
 
     # TODO (milestone 2): Get the user id of the currently playing user, if there is one
     round_stats.user_id = 0
     # TODO (milestone 3): Add in the number of survival rounds completed
 
     # Add round to the round stats database (currently with placeholder user id)
-    await stats_repo.add_round(round_stats)
+    await round_writer.put(round_stats)
 
     # Show game stats in UI
     round_stats.game_ended.emit(won)
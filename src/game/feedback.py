@@ -0,0 +1,182 @@
+"""
+Precomputed feedback for every possible (guess, answer) pair of countries.
+
+There are only a couple hundred countries, so instead of comparing the guess
+and the answer on every guess, all the comparisons are done once at startup and
+packed into a flat array of GuessFeedback codes (see GuessFeedback.pack).
+"""
+
+import hashlib
+import logging
+import time
+from array import array
+from pathlib import Path
+from typing import Callable, Sequence
+
+from phase2.country import Country
+from phase2.memory import deep_getsizeof
+from phase2.round import FEEDBACK_FIELDS, FIELD_CODES, GuessFeedback
+
+logger = logging.getLogger("phase2.feedback")
+
+_CACHE_MAGIC = b"FBM1"
+
+
+def _fingerprint(countries: tuple[Country, ...], version: int) -> bytes:
+    """
+    Hash of everything the comparisons depend on (the country data, the version
+    of the comparison and the feedback encoding), so a cached matrix is only
+    reused if it would come out exactly the same
+    """
+    digest = hashlib.sha256()
+    digest.update(repr((version, FEEDBACK_FIELDS, FIELD_CODES)).encode())
+    for country in countries:
+        digest.update(
+            repr(
+                (
+                    country.name,
+                    country.population,
+                    country.size,
+                    country.region,
+                    sorted(country.currencies or ()),
+                    sorted(country.languages or ()),
+                    sorted(country.timezones or ()),
+                )
+            ).encode()
+        )
+    return digest.digest()
+
+
+class FeedbackMatrix:
+    """
+    Packed feedback for every (guess, answer) pair of the given countries.
+    The feedback for guess i against answer j is stored at i * len(countries) + j.
+    """
+
+    def __init__(
+        self,
+        countries: tuple[Country, ...],
+        compare: Callable[[Country, Country], GuessFeedback],
+        codes: array | None = None,
+        version: int = 0,
+    ):
+        """
+        version identifies the compare function's grading rules (see
+        COMPARE_VERSION), and is saved with the matrix
+        """
+        start = time.perf_counter()
+
+        self.countries = countries
+        self.compare = compare
+        self.version = version
+        self._index = {country.name: i for i, country in enumerate(countries)}
+
+        if codes is None:
+            codes = array("H")
+            for guess in countries:
+                codes.extend(compare(guess, answer).pack() for answer in countries)
+        self.codes = codes
+
+        self.build_seconds = time.perf_counter() - start
+        self.memory_bytes = deep_getsizeof((self.codes, self._index))
+
+    def __len__(self) -> int:
+        return len(self.countries)
+
+    def index(self, country: Country) -> int | None:
+        """
+        Returns the position of the given country in the matrix, or None if
+        it isn't in it
+        """
+        return self._index.get(country.name)
+
+    def code(self, guess: Country, answer: Country) -> int | None:
+        """
+        Returns the packed feedback for the given guess and answer, or None if
+        either country isn't in the matrix
+        """
+        guess_index = self._index.get(guess.name)
+        answer_index = self._index.get(answer.name)
+        if guess_index is None or answer_index is None:
+            return None
+        return self.codes[guess_index * len(self.countries) + answer_index]
+
+    def feedback(self, guess: Country, answer: Country) -> GuessFeedback | None:
+        """
+        Returns the feedback for the given guess and answer, or None if either
+        country isn't in the matrix
+        """
+        code = self.code(guess, answer)
+        if code is None:
+            return None
+        return GuessFeedback.unpack(code)
+
+    def codes_for(self, guess: Country, answers: Sequence[Country] | None = None) -> array:
+        """
+        Returns the packed feedback for one guess against each of the given
+        answers (every country in the matrix by default), in the same order.
+        Countries that aren't in the matrix are compared directly.
+        """
+        n = len(self.countries)
+        guess_index = self._index.get(guess.name)
+
+        if answers is None:
+            if guess_index is not None:
+                return self.codes[guess_index * n : (guess_index + 1) * n]
+            answers = self.countries
+
+        if guess_index is None:
+            return array("H", (self.compare(guess, answer).pack() for answer in answers))
+
+        codes = array("H")
+        row = guess_index * n
+        for answer in answers:
+            answer_index = self._index.get(answer.name)
+            if answer_index is None:
+                codes.append(self.compare(guess, answer).pack())
+            else:
+                codes.append(self.codes[row + answer_index])
+        return codes
+
+    def feedback_for(
+        self, guess: Country, answers: Sequence[Country] | None = None
+    ) -> list[GuessFeedback]:
+        """
+        Same as codes_for, but unpacked into GuessFeedback objects
+        """
+        return [GuessFeedback.unpack(code) for code in self.codes_for(guess, answers)]
+
+    def save(self, path: Path):
+        """
+        Writes the matrix to a cache file that load() can read back
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(_CACHE_MAGIC)
+            file.write(_fingerprint(self.countries, self.version))
+            self.codes.tofile(file)
+
+    @classmethod
+    def load(
+        cls,
+        path: Path,
+        countries: tuple[Country, ...],
+        compare: Callable[[Country, Country], GuessFeedback],
+        version: int = 0,
+    ) -> "FeedbackMatrix | None":
+        """
+        Reads a matrix saved by save(), or returns None if the file is missing
+        or was built from different country data, grading rules or encoding
+        """
+        try:
+            with open(path, "rb") as file:
+                if file.read(len(_CACHE_MAGIC)) != _CACHE_MAGIC:
+                    return None
+                if file.read(32) != _fingerprint(countries, version):
+                    return None
+                codes = array("H")
+                codes.fromfile(file, len(countries) ** 2)
+        except (OSError, EOFError):
+            return None
+
+        return cls(countries, compare, codes, version)
@@ -4,7 +4,8 @@ from datetime import datetime, timezone
 from nicegui import ui
 
 from game.daily import get_daily_country, handle_guess
-from game.leaderboard_ui import fetch_leaderboard
+from game.hints import describe_remaining
+from game.leaderboard_ui import fetch_leaderboard, fetch_leaderboard_around
 from phase2.account_ui import SESSION
 from phase2.country import Country
 from phase2.round import GuessFeedback, RoundStats
@@ -73,7 +74,7 @@ def content():
         """
 
         with guesses:
-            for attr, value in vars(feedback).items():
+            for attr, value in feedback.items():
                 classes = "aspect-square h-28 justify-center text-center p-0 "
                 arrow_style = None
                 # Style card based on the feedback given
@@ -117,6 +118,14 @@ def content():
 
                         ui.label(text).classes("break-all")
 
+        update_remaining()
+
+    def update_remaining():
+        """
+        Updates the hint showing how many countries are still possible answers
+        """
+        remaining_text.set_text(describe_remaining(round_stats))
+
     @round_stats.guess_error.subscribe
     def guess_error():
         """
@@ -184,6 +193,10 @@ def content():
             )
             submit = ui.button("Submit", on_click=try_guess)
 
+            hints = ui.switch("Show remaining countries")
+            remaining_text = ui.label().bind_visibility_from(hints, "value").mark("remaining")
+            update_remaining()
+
         def go_to_account():
             user = SESSION.get("user")
             if user:
@@ -245,16 +258,17 @@ def popup_leaderboard(mode: str):
                 "sortable": True,
             }
         )
-    table = ui.table(columns=columns, rows=fetch_leaderboard(), row_key="entry_id", pagination=10)
-
-    # TODO: Properly retrieve user id for logged in user
-    user_id = "Dave"
-    row_index = None
-    # Iterate through table until finding the correct entry
-    for i, row in enumerate(table.rows):
-        if row["user_id"] == user_id:
-            row_index = i
-    if not row_index:
+    user = SESSION.get("user")
+    user_id = user.id if user else None
+
+    rows = fetch_leaderboard_around(user_id) if user_id is not None else []
+    if not rows:
+        # The player isn't on the leaderboard yet, so show it from the top
+        rows = fetch_leaderboard()
+    table = ui.table(columns=columns, rows=rows, row_key="entry_id", pagination=10)
+
+    row_index = next((i for i, row in enumerate(rows) if row["user_id"] == user_id), None)
+    if row_index is None:
         return
 
     # Jump to page containing the given user
@@ -0,0 +1,151 @@
+"""
+Works out which countries are still possible answers given the feedback a
+player has received so far, for the "N countries remain" hint.
+"""
+
+import functools
+import logging
+import threading
+from datetime import date
+
+from game import survival
+from game.daily import get_daily_country, get_feedback_matrix
+from game.feedback import FeedbackMatrix
+from game.schedule import daily_answer_pool, get_daily_schedule
+from phase2.country import Country, CountryPool, get_catalog
+from phase2.difficulty import get_tier_pool
+from phase2.round import GuessFeedback, RoundStats
+
+logger = logging.getLogger("phase2.hints")
+
+
+class CandidateIndex:
+    """
+    For each guess, the set of possible answers that would give each feedback
+    code, stored as an int bitset over the countries in the feedback matrix.
+    Narrowing down the candidates is then one dict lookup and one AND per guess.
+    """
+
+    def __init__(self, matrix: FeedbackMatrix, answers: CountryPool):
+        self.matrix = matrix
+        self.answers = answers
+
+        self._answer_indexes = [matrix.index(country) for country in answers.countries]
+        self.all_answers = 0
+        for index in self._answer_indexes:
+            self.all_answers |= 1 << index
+
+        # guess index -> {feedback code -> bitset of answers}, filled in as guesses come in
+        self._by_guess: dict[int, dict[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def _partition(self, guess: Country) -> dict[int, int]:
+        codes = self.matrix.codes_for(guess, self.answers.countries)
+        partition: dict[int, int] = {}
+        for answer_index, code in zip(self._answer_indexes, codes):
+            partition[code] = partition.get(code, 0) | (1 << answer_index)
+        return partition
+
+    def consistent(self, guess: Country, feedback: GuessFeedback | int) -> int:
+        """
+        Returns the bitset of answers that would give this feedback for this guess
+        """
+        code = feedback if isinstance(feedback, int) else feedback.pack()
+
+        guess_index = self.matrix.index(guess)
+        if guess_index is None:
+            return self._partition(guess).get(code, 0)
+
+        partition = self._by_guess.get(guess_index)
+        if partition is None:
+            with self._lock:
+                partition = self._by_guess.setdefault(guess_index, self._partition(guess))
+        return partition.get(code, 0)
+
+    def narrow(self, candidates: int, guess: Country, feedback: GuessFeedback | int) -> int:
+        """
+        Returns the candidates that are still possible after the given guess
+        """
+        return candidates & self.consistent(guess, feedback)
+
+    def countries(self, candidates: int) -> list[Country]:
+        """
+        Returns the countries in a candidate bitset
+        """
+        return [
+            self.matrix.countries[index]
+            for index in self._answer_indexes
+            if candidates >> index & 1
+        ]
+
+
+@functools.cache
+def get_candidate_index(answers: CountryPool | None = None) -> CandidateIndex:
+    """
+    Returns the process-wide candidate index over the given possible answers
+    (every eligible country by default)
+    """
+    if answers is None:
+        answers = get_catalog().eligible
+    return CandidateIndex(get_feedback_matrix(), answers)
+
+
+def answer_pool(mode: str) -> CountryPool:
+    """
+    The countries a round's answer can be drawn from in the given game mode
+    """
+    if mode == "survival":
+        return get_tier_pool(survival.DIFFICULTY_TIER)
+    return daily_answer_pool()
+
+
+def remaining_candidates(round_stats: RoundStats) -> int:
+    """
+    Returns the bitset of countries that are consistent with all the feedback
+    in the round so far
+    """
+    index = get_candidate_index(answer_pool(round_stats.mode))
+    catalog = get_catalog()
+
+    candidates = index.all_answers
+    for name, feedback in zip(round_stats.guessed_names, round_stats.feedback):
+        candidates = index.narrow(candidates, catalog.get(name), feedback)
+    return candidates
+
+
+def remaining_countries(round_stats: RoundStats) -> list[Country]:
+    index = get_candidate_index(answer_pool(round_stats.mode))
+    return index.countries(remaining_candidates(round_stats))
+
+
+def count_remaining(round_stats: RoundStats) -> int:
+    return remaining_candidates(round_stats).bit_count()
+
+
+def describe_remaining(round_stats: RoundStats) -> str:
+    """
+    The remaining-countries hint, e.g. "1 country remains" or "12 countries remain"
+    """
+    count = count_remaining(round_stats)
+    if count == 1:
+        return "1 country remains"
+    return f"{count} countries remain"
+
+
+def warm_daily(day: date) -> Country:
+    """
+    Gets everything a day's daily game reads ready ahead of time: the schedule
+    entry for the day, its answer, the feedback matrix it's graded from and the
+    candidate index over the daily answer pool. Returns the day's answer.
+    """
+    get_daily_schedule().warm(day)
+    answer = get_daily_country(day)
+
+    matrix = get_feedback_matrix()
+    if matrix.index(answer) is None:
+        # Still playable, guesses against it are just compared directly
+        logger.warning(f"Daily country for {day.isoformat()} isn't in the feedback matrix")
+    get_candidate_index(daily_answer_pool())
+
+    logger.info(f"Daily game for {day.isoformat()} is warm")
+    return answer
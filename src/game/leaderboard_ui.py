@@ -1,9 +1,12 @@
+import logging
 from typing import Any, Dict, List
 
 import httpx  # Will update to getting directly from DB once wired
 from nicegui import ui
 
-from phase2.leaderboard import get_leaderboard_repository
+from phase2.leaderboard import PAGE_SIZE, LeaderboardEntry, get_leaderboard_repository
+
+logger = logging.getLogger("phase2.leaderboard_ui")
 
 API_BASE_URL = "http://localhost:8000" 
 
@@ -79,6 +82,35 @@ def fetch_leaderboard() -> List[Dict[str, Any]]:
     return rows
 
 
+def entry_row(rank: int, entry: LeaderboardEntry) -> Dict[str, Any]:
+    """Table row for a leaderboard entry"""
+    return {
+        "entry_id": entry.entry_id,
+        "user_id": entry.user_id,
+        "daily_streak": entry.daily_streak,
+        "longest_daily_streak": entry.longest_daily_streak,
+        "average_daily_guesses": entry.average_daily_guesses,
+        "average_daily_time": f"{entry.average_daily_time.total_seconds():.1f}s",
+        "longest_survival_streak": entry.longest_survival_streak,
+        "high_score": entry.score,
+        "rank": rank,
+    }
+
+
+def fetch_leaderboard_around(user_id: int, radius: int = PAGE_SIZE // 2) -> List[Dict[str, Any]]:
+    """
+    Rows for the user's leaderboard entry and the entries ranked around it.
+    Empty if the user has no entry or the leaderboard can't be read.
+    """
+    try:
+        window = get_leaderboard_repository().get_window(user_id, radius)
+    except Exception:
+        logger.exception("Couldn't load the leaderboard around the player")
+        return []
+
+    return [entry_row(rank, entry) for rank, entry in window]
+
+
 def leaderboard_page() -> None:
     ui.label("Leaderboard").classes("text-3xl font-bold mb-4")
 
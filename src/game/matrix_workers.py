@@ -0,0 +1,40 @@
+"""
+Process pools for the offline jobs that simulate games (game.solver and
+game.rate_difficulty). Each worker gets the feedback matrix codes once, when
+it starts, instead of having them pickled into every task.
+"""
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+# Set in each worker process by share(), or in this process when not using a pool
+codes: array | None = None
+size = 0
+answers: list[int] = []
+
+
+def share(matrix_codes: array, matrix_size: int, answer_indexes: list[int] | None = None):
+    """
+    Sets the matrix (and optionally the answer indexes) worker functions read
+    from this module
+    """
+    global codes, size, answers
+    codes = matrix_codes
+    size = matrix_size
+    answers = answer_indexes or []
+
+
+def matrix_pool(
+    processes: int | None,
+    matrix_codes: array,
+    matrix_size: int,
+    answer_indexes: list[int] | None = None,
+) -> ProcessPoolExecutor:
+    """
+    Starts a process pool whose workers have been given the matrix with share()
+    """
+    return ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=share,
+        initargs=(matrix_codes, matrix_size, answer_indexes),
+    )
@@ -0,0 +1,94 @@
+"""
+Offline job that rates how hard each country is to guess, by simulating many
+games against it, and saves the ratings for phase2.difficulty to use.
+
+Run `python -m game.rate_difficulty` to regenerate phase2/difficulty.json.
+"""
+
+import argparse
+import logging
+import random
+import time
+from array import array
+
+from game import matrix_workers as workers
+from game.daily import get_feedback_matrix
+from game.feedback import FeedbackMatrix
+from game.matrix_workers import matrix_pool
+from phase2.country import CountryPool, get_catalog
+from phase2.difficulty import DIFFICULTY_FILE, DifficultyTable
+
+logger = logging.getLogger("phase2.difficulty")
+
+GAMES_PER_COUNTRY = 200
+
+
+def _play(target: int, rng: random.Random) -> int:
+    """
+    Plays one game as a player who always guesses a random country that fits
+    the feedback so far. Returns the number of guesses it took.
+    """
+    codes, size = workers.codes, workers.size
+    candidates = workers.answers
+    guess = rng.randrange(size)  # any country can be the first guess
+    guesses = 1
+    while guess != target:
+        row = guess * size
+        code = codes[row + target]
+        candidates = [candidate for candidate in candidates if codes[row + candidate] == code]
+        guess = candidates[rng.randrange(len(candidates))]
+        guesses += 1
+    return guesses
+
+
+def _rate(target: int, games: int, seed: int) -> float:
+    """
+    Returns the average number of guesses needed for the given target
+    """
+    rng = random.Random(seed * 1_000_003 + target)
+    return sum(_play(target, rng) for _ in range(games)) / games
+
+
+def rate_countries(
+    matrix: FeedbackMatrix | None = None,
+    pool: CountryPool | None = None,
+    games: int = GAMES_PER_COUNTRY,
+    processes: int | None = None,
+    seed: int = 0,
+) -> DifficultyTable:
+    """
+    Simulates games against every country in the pool across a process pool,
+    and returns their difficulty ratings
+    """
+    matrix = matrix if matrix is not None else get_feedback_matrix()
+    pool = pool if pool is not None else get_catalog().eligible
+
+    answers = [matrix.index(country) for country in pool.countries]
+    initargs = (matrix.codes, len(matrix), answers)
+
+    if processes == 1:
+        workers.share(*initargs)
+        scores = [_rate(target, games, seed) for target in answers]
+    else:
+        with matrix_pool(processes, *initargs) as executor:
+            scores = list(
+                executor.map(_rate, answers, [games] * len(answers), [seed] * len(answers))
+            )
+
+    return DifficultyTable(pool, array("f", scores))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rate how hard each country is to guess")
+    parser.add_argument("--games", type=int, default=GAMES_PER_COUNTRY)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    table = rate_countries(games=args.games, processes=args.processes, seed=args.seed)
+    table.save(DIFFICULTY_FILE)
+
+    print(f"Rated {len(table.scores)} countries in {time.perf_counter() - start:.1f}s")
+    for tier, countries in table.tiers.items():
+        print(f"{tier}: {', '.join(country.name for country in countries[:5])}, ...")
@@ -0,0 +1,186 @@
+"""
+Precomputed schedule of daily countries, so that finding the daily answer is a
+table lookup and upcoming answers can be audited ahead of time.
+
+Run `python -m game.schedule` to print the upcoming answers as CSV.
+"""
+
+import argparse
+import asyncio
+import csv
+import functools
+import logging
+import random
+import sys
+import threading
+from array import array
+from datetime import date, datetime, time, timedelta
+from typing import Callable, Iterator
+
+from phase2.country import Country, CountryPool, get_catalog
+from phase2.difficulty import get_difficulty_table, get_tier_pool
+
+logger = logging.getLogger("phase2.schedule")
+
+# How far ahead answers are precomputed
+SCHEDULE_HORIZON_DAYS = 366
+# How long before midnight the next day's answer is warmed
+WARM_LEAD = timedelta(minutes=5)
+# Difficulty tier ("easy", "medium" or "hard") to pick daily countries from, or None for any
+DAILY_DIFFICULTY_TIER: str | None = None
+
+
+def daily_answer_pool() -> CountryPool:
+    """
+    The countries daily answers are drawn from
+    """
+    return get_tier_pool(DAILY_DIFFICULTY_TIER)
+
+
+def pick_daily_country(day: date, pool: CountryPool | None = None) -> Country:
+    """
+    Picks the daily country for the given date using a random number generator
+    seeded with the date (so every daily country is the same), without touching
+    the global random state
+    """
+    if pool is None:
+        pool = get_catalog().eligible
+
+    rng = random.Random(day.isoformat())
+
+    if DAILY_DIFFICULTY_TIER is not None:
+        table = get_difficulty_table()
+        if table is not None and table.pool is pool:
+            return table.draw(DAILY_DIFFICULTY_TIER, rng)
+
+    return pool.draw(rng)
+
+
+class DailySchedule:
+    """
+    The daily countries for a run of consecutive dates, stored as one pool
+    index per day.
+    """
+
+    def __init__(
+        self,
+        start: date | None = None,
+        days: int = SCHEDULE_HORIZON_DAYS,
+        pool: CountryPool | None = None,
+    ):
+        self.pool = pool if pool is not None else get_catalog().eligible
+        self.horizon = days
+        self._lock = threading.Lock()
+        # (first date, pool index per day), swapped as a whole so readers never see a partial table
+        self._table: tuple[date, array] = (start or date.today(), array("H"))
+        self.extend_to(self._table[0] + timedelta(days=days - 1))
+
+    def __len__(self) -> int:
+        return len(self._table[1])
+
+    @property
+    def start(self) -> date:
+        return self._table[0]
+
+    @property
+    def end(self) -> date:
+        """
+        The last date in the schedule
+        """
+        start, indexes = self._table
+        return start + timedelta(days=len(indexes) - 1)
+
+    def lookup(self, day: date) -> Country | None:
+        """
+        Returns the daily country for the given date, or None if the date is
+        outside the schedule
+        """
+        start, indexes = self._table
+        offset = (day - start).days
+        if 0 <= offset < len(indexes):
+            return self.pool.countries[indexes[offset]]
+        return None
+
+    def extend_to(self, last_day: date):
+        """
+        Computes answers for every day up to and including last_day
+        """
+        with self._lock:
+            start, indexes = self._table
+            day = start + timedelta(days=len(indexes))
+            if day > last_day:
+                return
+
+            extended = array("H", indexes)
+            while day <= last_day:
+                extended.append(self.pool.index(pick_daily_country(day, self.pool)))
+                day += timedelta(days=1)
+            self._table = (start, extended)
+
+    def warm(self, day: date):
+        """
+        Makes sure the schedule covers the given date and a full horizon after it,
+        and drops days before the one preceding it
+        """
+        self.extend_to(day + timedelta(days=self.horizon - 1))
+
+        with self._lock:
+            start, indexes = self._table
+            keep_from = day - timedelta(days=1)
+            if keep_from > start:
+                self._table = (keep_from, indexes[(keep_from - start).days :])
+
+        logger.info(f"Daily country for {day.isoformat()} is ready")
+
+    def rows(self) -> Iterator[tuple[date, str]]:
+        """
+        Yields every (date, country name) pair in the schedule
+        """
+        start, indexes = self._table
+        for offset, index in enumerate(indexes):
+            yield start + timedelta(days=offset), self.pool.countries[index].name
+
+    def write_csv(self, file):
+        writer = csv.writer(file)
+        writer.writerow(["date", "country"])
+        for day, name in self.rows():
+            writer.writerow([day.isoformat(), name])
+
+
+@functools.cache
+def get_daily_schedule() -> DailySchedule:
+    """
+    Returns the process-wide schedule, starting from today
+    """
+    schedule = DailySchedule()
+    logger.info(f"Daily schedule computed from {schedule.start} to {schedule.end}")
+    return schedule
+
+
+async def warm_before_midnight(warm: Callable[[date], object], lead: timedelta = WARM_LEAD):
+    """
+    Runs forever, calling warm with the next day's date shortly before each
+    midnight (in a worker thread, off the event loop). See hints.warm_daily.
+    """
+    while True:
+        now = datetime.now()
+        tomorrow = now.date() + timedelta(days=1)
+        warm_at = datetime.combine(tomorrow, time()) - lead
+        await asyncio.sleep(max((warm_at - now).total_seconds(), 0))
+
+        try:
+            await asyncio.to_thread(warm, tomorrow)
+        except Exception:
+            logger.exception(f"Error warming the daily game for {tomorrow.isoformat()}")
+
+        # Wait until we're past midnight before looking for the next one
+        await asyncio.sleep(lead.total_seconds() + 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print upcoming daily countries as CSV")
+    parser.add_argument("--start", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--days", type=int, default=SCHEDULE_HORIZON_DAYS)
+    args = parser.parse_args()
+
+    DailySchedule(args.start, args.days).write_csv(sys.stdout)
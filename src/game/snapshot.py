@@ -0,0 +1,299 @@
+"""
+Compact binary snapshots of survival sessions, so a run survives a reconnect
+or server restart.
+
+A snapshot is a fixed header, two bytes per guess at the current country and
+two bytes per country left in the run's shuffle bag (under 500 bytes whatever
+the length of the run), rewritten after every graded guess. The round's guess
+log, which grows with the run, goes in a second file that each write only
+appends the new entries to, so the I/O per guess stays constant. Countries are
+stored by catalog index, and the header carries the catalog's fingerprint so a
+snapshot written against different country data is discarded rather than
+resumed with the wrong countries. Files are only fsynced periodically, and
+restoring a session is two small reads.
+"""
+
+import functools
+import logging
+import os
+import struct
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from game.daily import grade_guess
+from phase2 import DATA_DIR
+from phase2.country import get_catalog
+from phase2.round import GUESS_LOG_ENTRY, RoundStats
+
+if TYPE_CHECKING:
+    from game.survival import SurvivalStats
+
+logger = logging.getLogger("phase2.snapshot")
+
+SNAPSHOT_DIR = DATA_DIR / "survival"
+SNAPSHOT_VERSION = 3
+
+# Dirty snapshots are fsynced once this many have been written...
+FSYNC_EVERY = 64
+# ...or this many seconds after the last fsync, whichever comes first
+FSYNC_INTERVAL = 5.0
+
+# version, lives, guesses, number of guessed names, streak, total countries guessed,
+# current country (catalog index), start time (microseconds since the epoch, or -1),
+# catalog fingerprint, guess log entries (in the log file), countries left in the shuffle bag
+_HEADER = struct.Struct("<BBBBHHHqIHH")
+_NO_COUNTRY = 0xFFFF
+_NO_START_TIME = -1
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def pack_snapshot(survival_stats: "SurvivalStats", round_stats: RoundStats) -> bytes:
+    """
+    Encodes the parts of a survival session needed to resume it, apart from the
+    guess log, which is stored as it is (see SnapshotStore.write)
+    """
+    catalog = get_catalog()
+
+    current = survival_stats.current_country
+    start_time = round_stats.start_time
+    guessed = [catalog.index(catalog.get(name)) for name in round_stats.guessed_names]
+    remaining = [catalog.index(country) for country in survival_stats.countries.remaining()]
+
+    header = _HEADER.pack(
+        SNAPSHOT_VERSION,
+        survival_stats.lives,
+        round_stats.guesses,
+        len(guessed),
+        survival_stats.streak,
+        survival_stats.total_countries_guessed,
+        _NO_COUNTRY if current is None else catalog.index(current),
+        _NO_START_TIME if start_time is None else (start_time - _EPOCH) // _MICROSECOND,
+        catalog.fingerprint,
+        len(round_stats.guess_log) // GUESS_LOG_ENTRY.size,
+        len(remaining),
+    )
+    return (
+        header
+        + struct.pack(f"<{len(guessed)}H", *guessed)
+        + struct.pack(f"<{len(remaining)}H", *remaining)
+    )
+
+
+def unpack_snapshot(
+    data: bytes,
+    survival_stats: "SurvivalStats",
+    round_stats: RoundStats,
+    guess_log: bytes = b"",
+):
+    """
+    Restores a survival session from a snapshot written by pack_snapshot() and
+    its guess log into the given (freshly created) stats. Log entries past the
+    ones the snapshot counts are ignored. Raises ValueError if the snapshot is
+    malformed or was written against a different catalog.
+    """
+    try:
+        (
+            version,
+            lives,
+            guesses,
+            guessed_count,
+            streak,
+            total_countries_guessed,
+            current,
+            start_time,
+            fingerprint,
+            log_length,
+            remaining_count,
+        ) = _HEADER.unpack_from(data)
+    except struct.error as e:
+        raise ValueError(f"Malformed survival snapshot: {e}") from e
+
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported survival snapshot version {version}")
+
+    catalog = get_catalog()
+    if fingerprint != catalog.fingerprint:
+        raise ValueError("Survival snapshot was written against a different country catalog")
+
+    try:
+        offset = _HEADER.size
+        guessed = struct.unpack_from(f"<{guessed_count}H", data, offset)
+        offset += 2 * guessed_count
+        remaining = struct.unpack_from(f"<{remaining_count}H", data, offset)
+        offset += 2 * remaining_count
+    except struct.error as e:
+        raise ValueError(f"Malformed survival snapshot: {e}") from e
+    if offset != len(data):
+        raise ValueError("Malformed survival snapshot: trailing data")
+
+    # The log is in the same layout as RoundStats.guess_log
+    if len(guess_log) < log_length * GUESS_LOG_ENTRY.size:
+        raise ValueError("Survival snapshot's guess log is missing entries")
+    guess_log = bytearray(guess_log[: log_length * GUESS_LOG_ENTRY.size])
+
+    countries = catalog.countries
+    try:
+        current_country = None if current == _NO_COUNTRY else countries[current]
+        guessed_names = [countries[index].name for index in guessed]
+        remaining_countries = [countries[index] for index in remaining]
+    except IndexError as e:
+        raise ValueError("Survival snapshot refers to an unknown country") from e
+    if any(index >= len(countries) for index, _, _ in GUESS_LOG_ENTRY.iter_unpack(guess_log)):
+        raise ValueError("Survival snapshot refers to an unknown country")
+
+    survival_stats.lives = lives
+    survival_stats.streak = streak
+    survival_stats.total_countries_guessed = total_countries_guessed
+    survival_stats.current_country = current_country
+    survival_stats.countries.resume(remaining_countries, current_country)
+
+    round_stats.guesses = guesses
+    round_stats.guessed_names = guessed_names
+    round_stats.guess_log = guess_log
+    # Feedback isn't stored, it's cheap to grade the guesses again
+    if current_country is not None:
+        round_stats.feedback = [grade_guess(countries[i], current_country) for i in guessed]
+    if start_time != _NO_START_TIME:
+        round_stats.start_time = _EPOCH + start_time * _MICROSECOND
+
+
+class SnapshotStore:
+    """
+    Keeps a snapshot file and a guess log file per survival session in a
+    directory. Snapshots are written to a temporary file that replaces the old
+    one, and log entries are appended before the snapshot that counts them, so
+    a crash mid-write leaves the previous snapshot in place. Fsyncs are batched
+    across sessions, so after a power loss the latest snapshot can be missing
+    or malformed; restore() discards malformed snapshots rather than resuming
+    from them.
+    """
+
+    def __init__(
+        self,
+        directory: Path = SNAPSHOT_DIR,
+        fsync_every: int = FSYNC_EVERY,
+        fsync_interval: float = FSYNC_INTERVAL,
+    ):
+        self.directory = Path(directory)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+
+        self._dirty: set[Path] = set()
+        self._last_fsync = time.monotonic()
+        self._lock = threading.Lock()
+
+    def path(self, key: str) -> Path:
+        if not key.replace("-", "").replace("_", "").isalnum():
+            raise ValueError(f"Invalid session key {key!r}")
+        return self.directory / f"{key}.snap"
+
+    def log_path(self, key: str) -> Path:
+        return self.path(key).with_suffix(".log")
+
+    def save(self, key: str, survival_stats: "SurvivalStats", round_stats: RoundStats):
+        """
+        Writes the snapshot for a session, replacing any previous one
+        """
+        self.write(key, pack_snapshot(survival_stats, round_stats), bytes(round_stats.guess_log))
+
+    def write(self, key: str, data: bytes, guess_log: bytes = b""):
+        """
+        Writes an already packed snapshot and the round's guess log for a
+        session, fsyncing dirty snapshots if one is due. Only the log entries
+        not already in the log file are written. Safe to call from a worker thread.
+        """
+        path = self.path(key)
+        log_path = self.log_path(key)
+        temp = path.with_suffix(".tmp")
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        try:
+            logged = log_path.stat().st_size
+        except FileNotFoundError:
+            logged = 0
+        if logged > len(guess_log) or logged % GUESS_LOG_ENTRY.size:
+            # Left over from another run, or cut short: start the log again
+            log_path.write_bytes(guess_log)
+        elif logged < len(guess_log):
+            with open(log_path, "ab") as file:
+                file.write(guess_log[logged:])
+
+        temp.write_bytes(data)
+        os.replace(temp, path)
+
+        with self._lock:
+            self._dirty.update((path, log_path))
+            due = (
+                len(self._dirty) >= self.fsync_every
+                or time.monotonic() - self._last_fsync >= self.fsync_interval
+            )
+        if due:
+            self.flush()
+
+    def restore(self, key: str, survival_stats: "SurvivalStats", round_stats: RoundStats) -> bool:
+        """
+        Restores a session into the given stats. Returns False (leaving them
+        untouched) if the session has no usable snapshot.
+        """
+        try:
+            data = self.path(key).read_bytes()
+        except FileNotFoundError:
+            return False
+        try:
+            guess_log = self.log_path(key).read_bytes()
+        except FileNotFoundError:
+            guess_log = b""
+
+        try:
+            unpack_snapshot(data, survival_stats, round_stats, guess_log)
+        except ValueError as e:
+            logger.warning(f"Discarding survival snapshot for {key}: {e}")
+            self.delete(key)
+            return False
+        return True
+
+    def delete(self, key: str):
+        path = self.path(key)
+        log_path = self.log_path(key)
+        with self._lock:
+            self._dirty.difference_update((path, log_path))
+        path.unlink(missing_ok=True)
+        log_path.unlink(missing_ok=True)
+
+    def flush(self):
+        """
+        Forces every snapshot written since the last flush to disk
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            self._last_fsync = time.monotonic()
+
+        for path in dirty:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue  # deleted since it was written
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+        if dirty and hasattr(os, "O_DIRECTORY"):
+            # Make the renames durable too
+            fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+
+@functools.cache
+def get_snapshot_store() -> SnapshotStore:
+    """
+    Returns the process-wide snapshot store
+    """
+    return SnapshotStore()
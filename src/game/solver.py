@@ -0,0 +1,206 @@
+"""
+Solver that picks the guess which narrows down the possible answers the most,
+plus a benchmark that plays every possible answer with it.
+
+Run `python -m game.solver` to benchmark the solver against MAX_GUESSES.
+"""
+
+import argparse
+import logging
+import time
+from array import array
+from collections import Counter
+
+from game import matrix_workers as workers
+from game.daily import get_feedback_matrix
+from game.feedback import FeedbackMatrix
+from game.matrix_workers import matrix_pool
+from game.schedule import daily_answer_pool
+from phase2.country import Country, CountryPool
+from phase2.round import MAX_GUESSES
+
+logger = logging.getLogger("phase2.solver")
+
+# How a guess is scored from the sizes of the groups it splits the candidates into
+STRATEGIES = ("expected", "minimax")
+
+# Guesses scored per task sent to the process pool
+CHUNK_SIZE = 16
+
+
+def _score(codes: array, size: int, guess: int, candidates: list[int], strategy: str) -> float:
+    """
+    Scores a guess by how it splits the candidates up by feedback (lower is better).
+    'expected' is the expected number of candidates left after the guess,
+    'minimax' is the number left in the worst case.
+    """
+    row = guess * size
+    groups = Counter(codes[row + candidate] for candidate in candidates)
+
+    if strategy == "minimax":
+        return max(groups.values())
+    return sum(count * count for count in groups.values()) / len(candidates)
+
+
+def _best_in_chunk(
+    codes: array, size: int, guesses: list[int], candidates: list[int], strategy: str
+) -> tuple[float, bool, int]:
+    """
+    Returns (score, not a candidate, guess) for the best guess in the chunk.
+    Ties go to guesses that could be the answer.
+    """
+    candidate_set = set(candidates)
+    return min(
+        (_score(codes, size, guess, candidates, strategy), guess not in candidate_set, guess)
+        for guess in guesses
+    )
+
+
+def _score_chunk(
+    guesses: list[int], candidates: list[int], strategy: str
+) -> tuple[float, bool, int]:
+    """
+    _best_in_chunk, run in a worker process against the matrix it was given
+    """
+    return _best_in_chunk(workers.codes, workers.size, guesses, candidates, strategy)
+
+
+class BenchmarkResult:
+    def __init__(self, guesses_needed: dict[str, int], seconds: float):
+        self.guesses_needed = guesses_needed
+        self.seconds = seconds
+        self.games = len(guesses_needed)
+        self.distribution = Counter(guesses_needed.values())
+        self.average_guesses = sum(guesses_needed.values()) / self.games
+        self.most_guesses = max(guesses_needed.values())
+        self.solved = sum(1 for guesses in guesses_needed.values() if guesses <= MAX_GUESSES)
+
+    def __str__(self) -> str:
+        distribution = ", ".join(
+            f"{guesses}: {count}" for guesses, count in sorted(self.distribution.items())
+        )
+        return (
+            f"Played {self.games} games in {self.seconds:.1f}s\n"
+            f"Average guesses: {self.average_guesses:.3f} (most: {self.most_guesses})\n"
+            f"Solved within {MAX_GUESSES} guesses: {self.solved}/{self.games} "
+            f"({self.solved / self.games:.1%})\n"
+            f"Guesses needed: {distribution}"
+        )
+
+
+class Solver:
+    """
+    Picks guesses that minimize the remaining candidate count, using the
+    precomputed feedback matrix. Scoring is spread across a process pool
+    when processes is more than 1.
+    """
+
+    def __init__(
+        self,
+        matrix: FeedbackMatrix | None = None,
+        answers: CountryPool | None = None,
+        processes: int | None = None,
+        strategy: str = "expected",
+    ):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy {strategy!r}, expected one of {STRATEGIES}")
+
+        self.matrix = matrix if matrix is not None else get_feedback_matrix()
+        self.answers = answers if answers is not None else daily_answer_pool()
+        self.strategy = strategy
+        self.answer_indexes = [self.matrix.index(country) for country in self.answers.countries]
+
+        self._pool = None
+        if processes is None or processes > 1:
+            self._pool = matrix_pool(processes, self.matrix.codes, len(self.matrix))
+
+        # The best guess for each set of candidates seen so far
+        self._best: dict[tuple[int, ...], int] = {}
+
+    def __enter__(self) -> "Solver":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def best_guess(self, candidates: list[int]) -> int:
+        """
+        Returns the index (in the feedback matrix) of the best guess for the
+        given candidate answer indexes
+        """
+        if len(candidates) <= 2:
+            return candidates[0]
+
+        key = tuple(candidates)
+        best = self._best.get(key)
+        if best is not None:
+            return best
+
+        guesses = list(range(len(self.matrix)))
+        chunks = [guesses[i : i + CHUNK_SIZE] for i in range(0, len(guesses), CHUNK_SIZE)]
+        if self._pool is None:
+            results = [
+                _best_in_chunk(
+                    self.matrix.codes, len(self.matrix), chunk, candidates, self.strategy
+                )
+                for chunk in chunks
+            ]
+        else:
+            results = self._pool.map(
+                _score_chunk,
+                chunks,
+                [candidates] * len(chunks),
+                [self.strategy] * len(chunks),
+            )
+
+        best = min(results)[2]
+        self._best[key] = best
+        return best
+
+    def narrow(self, candidates: list[int], guess: int, answer: int) -> list[int]:
+        """
+        Returns the candidates that give the same feedback for the guess as the answer
+        """
+        codes = self.matrix.codes
+        row = guess * len(self.matrix)
+        code = codes[row + answer]
+        return [candidate for candidate in candidates if codes[row + candidate] == code]
+
+    def play(self, answer: Country) -> list[Country]:
+        """
+        Plays a game against the given answer, returning the guesses made
+        """
+        answer_index = self.matrix.index(answer)
+        candidates = self.answer_indexes
+        guesses = []
+        while True:
+            guess = self.best_guess(candidates)
+            guesses.append(self.matrix.countries[guess])
+            if guess == answer_index:
+                return guesses
+            candidates = self.narrow(candidates, guess, answer_index)
+
+    def benchmark(self) -> BenchmarkResult:
+        """
+        Plays every possible answer and reports how many guesses each one took
+        """
+        start = time.perf_counter()
+        guesses_needed = {
+            answer.name: len(self.play(answer)) for answer in self.answers.countries
+        }
+        return BenchmarkResult(guesses_needed, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the solver on every daily answer")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--strategy", choices=STRATEGIES, default="expected")
+    args = parser.parse_args()
+
+    with Solver(processes=args.processes, strategy=args.strategy) as solver:
+        print(solver.benchmark())
@@ -1,26 +1,152 @@
+import asyncio
 import logging
+import random
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Sequence
 
-from game.daily import compare_countries
-from phase2.country import get_country, get_random_country
+from game.daily import grade_guess, round_writer
+from game.snapshot import get_snapshot_store, pack_snapshot
+from phase2.country import Country, get_country
+from phase2.difficulty import get_tier_pool
 from phase2.round import GuessFeedback, RoundStats
-from phase2.statistics import get_statistics_repository
 
 logger = logging.getLogger("phase2.survival")
 
 # Survival mode configuration
 STARTING_LIVES = 3
 MAX_LIVES = 5
+# Difficulty tier ("easy", "medium" or "hard") to pick countries from, or None for any
+DIFFICULTY_TIER: str | None = None
+# Memory a survival run should fit in ten countries in (50 graded guesses), in bytes.
+# Past that it only grows by the guess log's 8 bytes per guess.
+SESSION_MEMORY_BUDGET = 3 * 1024
+# Start shuffling the next cycle of countries when this many are left in the current one
+REFILL_AT = 10
+
+# Shuffles upcoming cycles for every session's ShuffleBag off the guess-response path
+_refiller = ThreadPoolExecutor(max_workers=1, thread_name_prefix="survival-refill")
+
+
+class ShuffleBag:
+    """
+    Hands out countries in a random order, never repeating one until every
+    country has been handed out. The next shuffled cycle is prepared in the
+    background while the current one runs low, so taking a country is O(1).
+    The order is kept as an array of 2-byte indexes into the countries.
+    """
+
+    __slots__ = ("_countries", "_rng", "refill_at", "_order", "_position", "_next_cycle", "_last")
+
+    def __init__(
+        self,
+        countries: Sequence[Country],
+        rng: random.Random = random,
+        refill_at: int = REFILL_AT,
+    ):
+        if not countries:
+            raise ValueError("ShuffleBag needs at least one country")
+
+        self._countries = tuple(countries)
+        # Bags share the global generator by default, rather than each carrying
+        # a few KB of generator state
+        self._rng = rng
+        self.refill_at = refill_at
+
+        self._order = self._shuffled()
+        self._position = 0
+        self._next_cycle: Future | None = None
+        self._last: int | None = None
+
+    def __len__(self) -> int:
+        """Number of countries left in the current cycle"""
+        return len(self._order) - self._position
+
+    def _shuffled(self) -> array:
+        order = list(range(len(self._countries)))
+        self._rng.shuffle(order)
+        return array("H", order)
+
+    def next(self) -> Country:
+        """Take the next country from the bag"""
+        if self._position == len(self._order):
+            self._refill()
+
+        index = self._order[self._position]
+        self._position += 1
+        self._last = index
+
+        if len(self) <= self.refill_at and self._next_cycle is None:
+            self._next_cycle = _refiller.submit(self._shuffled)
+
+        return self._countries[index]
+
+    def _refill(self):
+        if self._next_cycle is not None:
+            order = self._next_cycle.result()
+            self._next_cycle = None
+        else:
+            order = self._shuffled()
+
+        # Don't hand out the same country twice in a row across cycles
+        if len(order) > 1 and order[0] == self._last:
+            order[0], order[-1] = order[-1], order[0]
+
+        self._order = order
+        self._position = 0
+
+    def remaining(self) -> list[Country]:
+        """The countries left in the current cycle, in the order they'll be taken"""
+        return [self._countries[index] for index in self._order[self._position :]]
+
+    def resume(self, remaining: Sequence[Country], last: Country | None = None):
+        """
+        Continues a cycle saved with remaining(), with last being the country
+        taken most recently. Countries that are no longer in the bag are skipped.
+        """
+        index = {country.name: i for i, country in enumerate(self._countries)}
+        self._order = array("H", [index[c.name] for c in remaining if c.name in index])
+        self._position = 0
+        self._last = None if last is None else index.get(last.name)
+        self._next_cycle = None
+        if len(self) <= self.refill_at:
+            self._next_cycle = _refiller.submit(self._shuffled)
+
+
+def survival_countries() -> Sequence[Country]:
+    """
+    The countries survival mode picks from: the configured difficulty tier if
+    there is one (and ratings are available), otherwise every eligible country
+    """
+    return get_tier_pool(DIFFICULTY_TIER).countries
 
 
 class SurvivalStats:
     """
     Extended stats class specifically for survival mode
     """
+
+    __slots__ = (
+        "lives",
+        "streak",
+        "current_country",
+        "total_countries_guessed",
+        "countries",
+        "session_key",
+    )
+
     def __init__(self):
         self.lives = STARTING_LIVES
         self.streak = 0  # Number of consecutive correct guesses
         self.current_country = None
         self.total_countries_guessed = 0
+        self.countries = ShuffleBag(survival_countries())
+        self.session_key: str | None = None  # Snapshots are kept for sessions with a key
+
+    def next_country(self) -> Country:
+        """Move on to the next country in this run"""
+        self.current_country = self.countries.next()
+        return self.current_country
         
     def lose_life(self):
         """Decrease lives by 1"""
@@ -44,24 +170,57 @@ class SurvivalStats:
         return self.lives <= 0
 
 
-def survival_mode():
+def survival_mode(session_key: str | None = None):
     """
     Run the core gameplay loop, as well
     as any survival-specific features
     (lives count + stats, generating new country)
+
+    If a session key is given, the run is resumed from its snapshot if there is
+    one, and snapshotted after every guess from then on.
     """
     survival_stats = SurvivalStats()
     round_stats = RoundStats(mode="survival")
-    
+    survival_stats.session_key = session_key
+
+    if session_key is not None and get_snapshot_store().restore(
+        session_key, survival_stats, round_stats
+    ):
+        logger.info(
+            f"Survival mode resumed with {survival_stats.lives} lives, "
+            f"streak {survival_stats.streak}"
+        )
+        return survival_stats, round_stats
+
     # Generate the first country
-    current_country = get_random_country()
-    survival_stats.current_country = current_country
+    survival_stats.next_country()
     
     logger.info(f"Survival mode started with {STARTING_LIVES} lives")
     
     return survival_stats, round_stats
 
 
+async def save_snapshot(round_stats: RoundStats, survival_stats: SurvivalStats):
+    """
+    Snapshot the run so it can be resumed, or drop its snapshot once it's over.
+    The snapshot is packed here, but written (and fsynced) in a worker thread
+    so the file I/O never blocks the event loop.
+    """
+    if survival_stats.session_key is None:
+        return
+
+    store = get_snapshot_store()
+    try:
+        if survival_stats.is_game_over():
+            await asyncio.to_thread(store.delete, survival_stats.session_key)
+        else:
+            data = pack_snapshot(survival_stats, round_stats)
+            guess_log = bytes(round_stats.guess_log)
+            await asyncio.to_thread(store.write, survival_stats.session_key, data, guess_log)
+    except OSError:
+        logger.exception("Error saving survival snapshot")
+
+
 async def handle_survival_guess(input: str, round_stats: RoundStats, survival_stats: SurvivalStats):
     """
     Handle a guess in survival mode. Similar to daily mode but with lives system
@@ -85,19 +244,20 @@ async def handle_survival_guess(input: str, round_stats: RoundStats, survival_st
     
     # Error handling in case the countryinfo API isn't able to serve info we need
     try:
-        feedback: GuessFeedback = compare_countries(country, survival_stats.current_country)
+        feedback: GuessFeedback = grade_guess(country, survival_stats.current_country)
     except AttributeError:
         logger.error("Error comparing countries")
         round_stats.guess_error.emit()
         return
     
-    round_stats.guessed_names.append(country.name)
-    round_stats.guesses += 1
+    round_stats.record_guess(country.name, feedback)
     
     if feedback.name:  # Correct guess
         await handle_correct_guess(round_stats, survival_stats)
     elif round_stats.guesses >= round_stats.max_guesses:  # Out of guesses for this country
         await handle_incorrect_guess(round_stats, survival_stats)
+
+    await save_snapshot(round_stats, survival_stats)
     
     round_stats.guess_graded.emit(country, feedback)
 
@@ -118,11 +278,12 @@ async def handle_correct_guess(round_stats: RoundStats, survival_stats: Survival
         logger.info(f"Bonus life awarded! Lives: {survival_stats.lives}")
     
     # Generate new country for next round
-    survival_stats.current_country = get_random_country()
+    survival_stats.next_country()
     
     # Reset guesses for the new country
     round_stats.guesses = 0
     round_stats.guessed_names = []
+    round_stats.feedback = []
     
     logger.info(f"Correct guess! Streak: {survival_stats.streak}, Lives: {survival_stats.lives}")
 
@@ -142,29 +303,28 @@ async def handle_incorrect_guess(round_stats: RoundStats, survival_stats: Surviv
         await end_survival_game(round_stats, survival_stats)
     else:
         # Generate new country and continue
-        survival_stats.current_country = get_random_country()
+        survival_stats.next_country()
         round_stats.guesses = 0
         round_stats.guessed_names = []
+        round_stats.feedback = []
 
 
 async def end_survival_game(round_stats: RoundStats, survival_stats: SurvivalStats):
     """
     End the survival game and process final statistics
     """
-    stats_repo = get_statistics_repository()
-    
     round_stats.end_round()
     round_stats.won = False  # Survival mode always ends in "loss"
     
     logger.info(f"Survival game ended. Final streak: {survival_stats.streak}")
     logger.info("Round stats:")
-    logger.info(vars(round_stats))
+    logger.info(round_stats.summary())
     
     #  Get the user id of the currently playing user, if there is one
     round_stats.user_id = 0
     
     # Add round to the rounds database with survival streak
-    await stats_repo.add_round(round_stats, survival_streak=survival_stats.streak)
+    await round_writer.put(round_stats, survival_streak=survival_stats.streak)
     
     # Emit game ended event with final stats
     round_stats.game_ended.emit(False)
@@ -4,11 +4,13 @@ from datetime import datetime, timezone
 
 from nicegui import ui
 
+from game.hints import describe_remaining
 from game.survival import (
     handle_survival_guess,
     survival_mode,
 )
-from phase2.country import Country
+from phase2.account_ui import SESSION
+from phase2.country import Country, get_country
 from phase2.round import GuessFeedback
 
 
@@ -60,7 +62,9 @@ async def try_guess(guess_input_or_value, round_stats, survival_stats):
 
 def survival_content():
     """Main UI content for survival mode"""
-    survival_stats, round_stats = survival_mode()
+    # Logged in players can pick their run back up after a reconnect
+    user = SESSION.get("user")
+    survival_stats, round_stats = survival_mode(str(user.id) if user else None)
 
     # load options (use for autocomplete)
     with open("src/game/countries.json") as file:
@@ -109,8 +113,24 @@ def survival_content():
     @round_stats.guess_graded.subscribe
     def display_feedback(country: Country, feedback: GuessFeedback):
         """Display feedback for the guess"""
+        show_guess(country, feedback)
+
+        # Update stats display
+        update_stats()
+        update_remaining()
+
+        # Show notification
+        if feedback.name:
+            ui.notify(correct_loaded_msg, type="positive")
+        else:
+            remaining = round_stats.max_guesses - round_stats.guesses
+            if remaining > 0:
+                ui.notify(f"❌ Wrong! {remaining} guesses left", type="warning")
+
+    def show_guess(country: Country, feedback: GuessFeedback):
+        """Add a row of feedback cards for the guess"""
         with guesses:
-            for attr, value in vars(feedback).items():
+            for attr, value in feedback.items():
                 classes = "aspect-square h-28 justify-center text-center p-0 "
                 arrow_style = None
 
@@ -154,17 +174,6 @@ def survival_content():
 
                         ui.label(text).classes("break-all")
 
-        # Update stats display
-        update_stats()
-
-        # Show notification
-        if feedback.name:
-            ui.notify(correct_loaded_msg, type="positive")
-        else:
-            remaining = round_stats.max_guesses - round_stats.guesses
-            if remaining > 0:
-                ui.notify(f"❌ Wrong! {remaining} guesses left", type="warning")
-
     @round_stats.guess_error.subscribe
     def guess_error():
         """Display error notification"""
@@ -206,6 +215,10 @@ def survival_content():
         lives_label.set_text(f"Lives: {hearts}")
         streak_label.set_text(f"Streak: {survival_stats.streak} 🔥")
 
+    def update_remaining():
+        """Update the hint showing how many countries are still possible answers"""
+        remaining_text.set_text(describe_remaining(round_stats))
+
     with ui.column(align_items="center").classes("mx-auto p-4"):
         ui.label("Survival Mode").classes("text-3xl font-bold")
 
@@ -231,6 +244,10 @@ def survival_content():
         # Guesses grid
         guesses = ui.grid(columns=7).classes("w-full")
 
+        # Guesses made before a resumed session reconnected
+        for name, feedback in zip(round_stats.guessed_names, round_stats.feedback):
+            show_guess(get_country(name), feedback)
+
         # Input card
         with ui.card(align_items="center"):
 
@@ -262,6 +279,10 @@ def survival_content():
 
             submit = ui.button("Submit", on_click=schedule_ui_try_click)
 
+            hints = ui.switch("Show remaining countries")
+            remaining_text = ui.label().bind_visibility_from(hints, "value").mark("remaining")
+            update_remaining()
+
     
         with ui.card().classes("w-full max-w-2xl p-4 mt-4"):
             ui.label("How to Play:").classes("font-bold text-lg")
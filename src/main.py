@@ -1,17 +1,21 @@
 import logging
 import os
 
-from nicegui import ui
+from nicegui import app, background_tasks, ui
 from nicegui.events import KeyEventArguments
 
 from game import game_ui
-from game.daily import get_daily_country
+from game.daily import get_daily_country, get_feedback_matrix, round_writer
+from game.hints import warm_daily
 from game.leaderboard_ui import leaderboard_page
+from game.schedule import get_daily_schedule, warm_before_midnight
 from local_repos.auth import LocalAuthRepo
 from local_repos.friends import LocalFriendsRepo
 from local_repos.stats import LocalStatisticsRepo
 from local_repos.users import LocalUserRepo
 from phase2.account_ui import account_ui
+from phase2.country import get_catalog
+from phase2.leaderboard import load_leaderboard_cache
 
 user_repo = LocalUserRepo()
 friends_repo = LocalFriendsRepo(user_repo)
@@ -44,6 +48,20 @@ FORMAT = logging.Formatter(
 )
 
 
+# Load every country (and the feedback for every pair of them) up front so the
+# first guess doesn't pay for it
+app.on_startup(get_catalog)
+app.on_startup(get_feedback_matrix)
+# Serve leaderboard reads from memory
+app.on_startup(load_leaderboard_cache)
+# Precompute upcoming daily countries, and get tomorrow's game warm before midnight
+app.on_startup(get_daily_schedule)
+app.on_startup(lambda: background_tasks.create(warm_before_midnight(warm_daily)))
+# Record finished rounds in the background, writing out any still queued on shutdown
+app.on_startup(round_writer.start)
+app.on_shutdown(round_writer.stop)
+
+
 @ui.page("/")
 def index_page():
     # Code to allow a log window to be displayed during the game by pressing 'l'
@@ -0,0 +1,5 @@
+import os
+from pathlib import Path
+
+# Where caches and other files written at runtime go (PHASE2_DATA_DIR, or ./cache)
+DATA_DIR = Path(os.environ.get("PHASE2_DATA_DIR", "cache"))
@@ -1,13 +1,70 @@
+import functools
+import hashlib
 import logging
 import random
-from typing import List
+import threading
+import time
+from typing import Iterator, List
 
 from countryinfo import CountryInfo
 
+from phase2.memory import deep_getsizeof
+
 logger = logging.getLogger("phase2.country")
 
+# Fields every country needs in the dataset before it can be looked up at all
+COUNTRY_INFO_KEYS = ["population", "area", "region", "languages", "currencies", "timezones"]
+# Fields that also need a value before a country can be picked as an answer
+REQUIRED_INFO_KEYS = ["name", *COUNTRY_INFO_KEYS]
+
+
+class BitInterner:
+    """
+    Gives each distinct value its own bit position, so that a set of values can
+    be stored as an int bitmask. Two masks from the same interner are equal
+    exactly when their sets are, and overlap exactly when their sets do.
+    """
+
+    def __init__(self):
+        self._bits: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._bits)
+
+    def bit(self, value: str) -> int:
+        bit = self._bits.get(value)
+        if bit is None:
+            with self._lock:
+                bit = self._bits.setdefault(value, len(self._bits))
+        return bit
+
+    def mask(self, values: List[str] | None) -> int:
+        mask = 0
+        for value in values or ():
+            mask |= 1 << self.bit(value)
+        return mask
+
+
+LANGUAGES = BitInterner()
+CURRENCIES = BitInterner()
+TIMEZONES = BitInterner()
+
 
 class Country:
+    __slots__ = (
+        "name",
+        "population",
+        "size",
+        "region",
+        "languages",
+        "currencies",
+        "timezones",
+        "language_mask",
+        "currency_mask",
+        "timezone_mask",
+    )
+
     name: str
     population: int
     size: float
@@ -15,6 +72,10 @@ class Country:
     languages: List[str]
     currencies: List[str]
     timezones: List[str]
+    # Bitmasks of the languages, currencies and timezones, for fast comparisons
+    language_mask: int
+    currency_mask: int
+    timezone_mask: int
 
     def __init__(self, name, population, size, region, languages, currencies, timezones):
         self.name = name
@@ -25,32 +86,183 @@ class Country:
         self.currencies = currencies
         self.timezones = timezones
 
+        self.language_mask = LANGUAGES.mask(languages)
+        self.currency_mask = CURRENCIES.mask(currencies)
+        self.timezone_mask = TIMEZONES.mask(timezones)
 
-def map_to_country_obj(country_info_obj: CountryInfo) -> Country:
-    name = country_info_obj.name()
-    population = country_info_obj.population()
-    size = country_info_obj.area()
-    region = country_info_obj.region()
-    languages = country_info_obj.languages()
-    currencies = country_info_obj.currencies()
-    timezones = country_info_obj.timezones()
 
-    return Country(name, population, size, region, languages, currencies, timezones)
+class CountryPool:
+    """
+    The countries that have all the info the game needs, stored as an indexed
+    tuple so that picking one is a single O(1) draw.
 
+    Countries that were left out are kept in excluded, mapped to the fields
+    they were missing.
+    """
 
-def get_random_country() -> Country:
+    def __init__(self, countries: list[Country], excluded: dict[str, tuple[str, ...]]):
+        self.countries: tuple[Country, ...] = tuple(countries)
+        self.excluded = excluded
+        self._index = {country.name: i for i, country in enumerate(self.countries)}
+
+    def __len__(self) -> int:
+        return len(self.countries)
+
+    def __contains__(self, country: Country) -> bool:
+        return country.name in self._index
+
+    def index(self, country: Country) -> int:
+        """
+        Returns the position of the given country in the pool
+        """
+        return self._index[country.name]
+
+    def draw(self, rng: random.Random = random) -> Country:
+        """
+        Returns a random country from the pool, using the given random number
+        generator (the global one by default)
+        """
+        return self.countries[rng.randrange(len(self.countries))]
+
+
+class CatalogStats:
     """
-    Returns a random country object.
+    Load-time and memory figures for a CountryCatalog
+    """
+
+    def __init__(self, countries: int, aliases: int, load_seconds: float, memory_bytes: int):
+        self.countries = countries
+        self.aliases = aliases
+        self.load_seconds = load_seconds
+        self.memory_bytes = memory_bytes
+
+    def __str__(self) -> str:
+        return (
+            f"{self.countries} countries ({self.aliases} aliases) loaded in "
+            f"{self.load_seconds * 1000:.1f}ms, using {self.memory_bytes / 1024:.1f}KiB"
+        )
+
+
+class CountryCatalog:
+    """
+    Every country in the countryinfo dataset, loaded once and kept in memory
+    as ready-made Country objects.
+
+    Countries are ordered by name so that seeded random picks are the same on
+    every machine, and can be looked up by name or by any of their alternative
+    spellings (case-insensitive).
     """
-    all_countries = CountryInfo().all()
-    random_country_name = random.choice(list(all_countries.keys()))
-    obj = CountryInfo(random_country_name)
 
-    if not verify_country(obj):
-        logger.warning("Daily country missing required info. Regenerating...")
-        return get_random_country()  # run again if the random country is missing info
+    def __init__(self, raw_countries: dict[str, dict] | None = None):
+        start = time.perf_counter()
+
+        if raw_countries is None:
+            raw_countries = CountryInfo().all()
+
+        countries: list[Country] = []
+        eligible: list[Country] = []
+        excluded: dict[str, tuple[str, ...]] = {}
+        by_name: dict[str, Country] = {}
+        for key in sorted(raw_countries):
+            info = raw_countries[key]
+            missing = missing_country_info(info)
+            if missing:
+                excluded[key] = missing
+
+            # Mirror CountryInfo, which raises a KeyError for countries missing a field
+            if any(prop not in info for prop in COUNTRY_INFO_KEYS):
+                continue
+
+            country = Country(
+                key,
+                info["population"],
+                info["area"],
+                info["region"],
+                info["languages"],
+                info["currencies"],
+                info["timezones"],
+            )
+            countries.append(country)
+            by_name[key] = country
+            if not missing:
+                eligible.append(country)
+
+        aliases = 0
+        for country in countries:
+            for spelling in raw_countries[country.name].get("altSpellings", []):
+                spelling = normalize_name(spelling)
+                if spelling not in by_name:
+                    by_name[spelling] = country
+                    aliases += 1
+
+        self.countries: tuple[Country, ...] = tuple(countries)
+        self.eligible = CountryPool(eligible, excluded)
+        self._by_name = by_name
+        self._index = {country.name: i for i, country in enumerate(self.countries)}
+        # Identifies the catalog's order, so anything stored by catalog index can
+        # tell when the data it was written against has changed
+        self.fingerprint = int.from_bytes(
+            hashlib.sha256("\n".join(self._index).encode()).digest()[:4], "little"
+        )
+
+        self._stats = CatalogStats(
+            countries=len(self.countries),
+            aliases=aliases,
+            load_seconds=time.perf_counter() - start,
+            memory_bytes=deep_getsizeof(
+                (self.countries, self._by_name, self._index, self.eligible)
+            ),
+        )
 
-    return map_to_country_obj(obj)
+    def __len__(self) -> int:
+        return len(self.countries)
+
+    def __iter__(self) -> Iterator[Country]:
+        return iter(self.countries)
+
+    def __contains__(self, name: str) -> bool:
+        return normalize_name(name) in self._by_name
+
+    def get(self, name: str) -> Country | None:
+        """
+        Returns the country with the given name or alternative spelling,
+        or None if there is no such country
+        """
+        return self._by_name.get(normalize_name(name))
+
+    def index(self, country: Country) -> int:
+        """
+        Returns the position of the given country in the catalog
+        """
+        return self._index[country.name]
+
+    def stats(self) -> CatalogStats:
+        return self._stats
+
+
+@functools.cache
+def get_catalog() -> CountryCatalog:
+    """
+    Returns the process-wide CountryCatalog, loading it on first use
+    """
+    catalog = CountryCatalog()
+    logger.info(f"Country catalog: {catalog.stats()}")
+    logger.info(
+        f"{len(catalog.eligible)} countries can be picked, "
+        f"{len(catalog.eligible.excluded)} are missing required info"
+    )
+    return catalog
+
+
+def normalize_name(name: str) -> str:
+    return name.strip().lower()
+
+
+def get_random_country() -> Country:
+    """
+    Returns a random country object.
+    """
+    return get_catalog().eligible.draw()
 
 
 def get_country(name: str) -> Country:
@@ -58,16 +270,18 @@ def get_country(name: str) -> Country:
     Returns the country that matches the given name string, or None
     if no such country exists.
     """
-    try:
-        country = CountryInfo(name)
-        return map_to_country_obj(country)
-    except KeyError:
-        return None
+    return get_catalog().get(name)
 
 
 def verify_country(country) -> bool:
     """
     Verifies that a CountryInfo object from the api has all the required data for the game
     """
-    props = ["name", "population", "area", "region", "languages", "currencies", "timezones"]
-    return all(country.info().get(key) is not None for key in props)
+    return not missing_country_info(country.info())
+
+
+def missing_country_info(info: dict) -> tuple[str, ...]:
+    """
+    Returns the required fields that are missing (or empty) in a country's raw info
+    """
+    return tuple(key for key in REQUIRED_INFO_KEYS if info.get(key) is None)
@@ -0,0 +1,166 @@
+"""
+Precomputed difficulty ratings for the countries that can be answers, used to
+pick countries by difficulty tier or weighted by difficulty in O(1) per draw.
+
+The ratings are produced offline by `python -m game.rate_difficulty`.
+"""
+
+import functools
+import json
+import logging
+import random
+from array import array
+from pathlib import Path
+
+from phase2.country import Country, CountryPool, get_catalog
+
+logger = logging.getLogger("phase2.difficulty")
+
+DIFFICULTY_FILE = Path(__file__).parent / "difficulty.json"
+
+# Tiers split the countries into equal thirds, easiest first
+TIERS = ("easy", "medium", "hard")
+
+
+class AliasSampler:
+    """
+    Draws indexes in proportion to the given weights in O(1) per draw,
+    using Vose's alias method.
+    """
+
+    def __init__(self, weights: list[float]):
+        n = len(weights)
+        total = sum(weights)
+        if n == 0 or total <= 0:
+            raise ValueError("AliasSampler needs at least one positive weight")
+
+        scaled = [weight * n / total for weight in weights]
+        self._probability = array("d", [0.0] * n)
+        self._alias = array("I", [0] * n)
+
+        small = [i for i, weight in enumerate(scaled) if weight < 1]
+        large = [i for i, weight in enumerate(scaled) if weight >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self._probability[less] = scaled[less]
+            self._alias[less] = more
+            scaled[more] -= 1 - scaled[less]
+            (small if scaled[more] < 1 else large).append(more)
+        for i in small + large:
+            self._probability[i] = 1.0
+
+    def __len__(self) -> int:
+        return len(self._probability)
+
+    def draw(self, rng: random.Random = random) -> int:
+        i = rng.randrange(len(self._probability))
+        return i if rng.random() < self._probability[i] else self._alias[i]
+
+
+class DifficultyTable:
+    """
+    A difficulty score (average guesses needed) for each country in a pool,
+    stored in pool order.
+    """
+
+    def __init__(self, pool: CountryPool, scores: array):
+        if len(scores) != len(pool):
+            raise ValueError(f"Expected {len(pool)} scores, got {len(scores)}")
+
+        self.pool = pool
+        self.scores = scores
+
+        by_difficulty = sorted(range(len(pool)), key=lambda i: (scores[i], i))
+        tier_size = -(-len(pool) // len(TIERS))
+        self.tiers: dict[str, tuple[Country, ...]] = {}
+        for n, tier in enumerate(TIERS):
+            indexes = by_difficulty[n * tier_size : (n + 1) * tier_size]
+            self.tiers[tier] = tuple(pool.countries[i] for i in indexes)
+        self.tier_pools = {
+            tier: CountryPool(list(countries), {}) for tier, countries in self.tiers.items()
+        }
+        # Harder countries are drawn more often by draw_weighted
+        self._sampler = AliasSampler(list(scores))
+
+    def score(self, country: Country) -> float:
+        return self.scores[self.pool.index(country)]
+
+    def tier(self, country: Country) -> str:
+        return next(tier for tier, countries in self.tiers.items() if country in countries)
+
+    def draw(self, tier: str, rng: random.Random = random) -> Country:
+        """
+        Returns a random country from the given difficulty tier
+        """
+        countries = self.tiers[tier]
+        return countries[rng.randrange(len(countries))]
+
+    def draw_weighted(self, rng: random.Random = random) -> Country:
+        """
+        Returns a random country, with harder countries being more likely
+        """
+        return self.pool.countries[self._sampler.draw(rng)]
+
+    def save(self, path: Path = DIFFICULTY_FILE):
+        ratings = {
+            country.name: round(score, 3)
+            for country, score in zip(self.pool.countries, self.scores)
+        }
+        with open(path, "w") as file:
+            json.dump(ratings, file, indent=1, sort_keys=True)
+
+    @classmethod
+    def load(cls, pool: CountryPool, path: Path = DIFFICULTY_FILE) -> "DifficultyTable | None":
+        """
+        Reads a table written by save(), or returns None if the file is missing
+        or doesn't rate every country in the pool
+        """
+        try:
+            with open(path) as file:
+                ratings = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            scores = array("f", (ratings[country.name] for country in pool.countries))
+        except KeyError:
+            logger.warning(f"{path} doesn't rate every country, ignoring it")
+            return None
+
+        return cls(pool, scores)
+
+
+@functools.cache
+def get_difficulty_table() -> DifficultyTable | None:
+    """
+    Returns the process-wide difficulty table for the eligible countries,
+    or None if no ratings are available
+    """
+    return DifficultyTable.load(get_catalog().eligible)
+
+
+def get_tier_pool(tier: str | None) -> CountryPool:
+    """
+    The countries in the given difficulty tier, or every eligible country if
+    tier is None or no ratings are available
+    """
+    table = get_difficulty_table()
+    if tier is None or table is None:
+        return get_catalog().eligible
+    return table.tier_pools[tier]
+
+
+def get_random_country_by_difficulty(
+    tier: str | None = None, rng: random.Random = random
+) -> Country:
+    """
+    Returns a random country from the given difficulty tier, or weighted towards
+    harder countries if no tier is given. Falls back to a uniform pick when no
+    ratings are available.
+    """
+    table = get_difficulty_table()
+    if table is None:
+        return get_catalog().eligible.draw(rng)
+    if tier is None:
+        return table.draw_weighted(rng)
+    return table.draw(tier, rng)
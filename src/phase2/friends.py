@@ -1,10 +1,11 @@
 from shared.database import Base
-from sqlalchemy import Integer
+from sqlalchemy import Index, Integer
 from sqlalchemy.orm import Mapped, mapped_column
 
 
 class Friendship(Base):
     __tablename__ = "friendships"
+    __table_args__ = (Index("ix_friendships_user_friend", "user_id", "friend_id"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -0,0 +1,199 @@
+"""
+Helpers for bringing an existing database's indexes in line with the ones
+declared on the models, plus a benchmark showing the query plans they change.
+
+Run `python -m phase2.indexes` to benchmark the hot queries on a generated
+SQLite database (1,000,000 rounds by default) before and after indexing.
+"""
+
+import argparse
+import logging
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from sqlalchemy import Engine, Index, Table, create_engine, insert, inspect, select, text
+
+from phase2.friends import Friendship
+from phase2.leaderboard import LEADERBOARD_ORDER, LeaderboardEntry
+from phase2.statistics import GuessEvent, RoundStatistics, UserStatsAggregate
+
+logger = logging.getLogger("phase2.indexes")
+
+# Tables whose declared indexes are managed here
+INDEXED_TABLES: tuple[Table, ...] = (
+    RoundStatistics.__table__,
+    LeaderboardEntry.__table__,
+    Friendship.__table__,
+    GuessEvent.__table__,
+    UserStatsAggregate.__table__,
+)
+
+
+# Indexes earlier versions created that declared ones have replaced, by table
+OBSOLETE_INDEXES: dict[str, tuple[str, ...]] = {
+    LeaderboardEntry.__tablename__: (
+        "ix_leaderboard_entry_score",
+        "ix_leaderboard_entry_score_entry_id",
+    ),
+}
+
+
+def _declared_indexes() -> list[Index]:
+    return [index for table in INDEXED_TABLES for index in table.indexes]
+
+
+def verify_indexes(engine: Engine) -> list[str]:
+    """
+    Returns the names of declared indexes missing from the database
+    (on tables that exist)
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    missing = []
+    for index in _declared_indexes():
+        if index.table.name not in existing_tables:
+            continue
+        existing = {found["name"] for found in inspector.get_indexes(index.table.name)}
+        if index.name not in existing:
+            missing.append(index.name)
+    return missing
+
+
+def ensure_indexes(engine: Engine) -> list[str]:
+    """
+    Creates any declared indexes missing from the database, and returns their names.
+    Indexes they've replaced are dropped once the replacements exist.
+    Fails with an IntegrityError if existing rows break a unique index (such as
+    duplicate leaderboard entries for a user), which have to be cleaned up first.
+    """
+    missing = set(verify_indexes(engine))
+    created = []
+    for index in _declared_indexes():
+        if index.name in missing:
+            logger.info(f"Creating index {index.name} on {index.table.name}")
+            index.create(engine)
+            created.append(index.name)
+
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    for table in INDEXED_TABLES:
+        if table.name not in existing_tables:
+            continue
+        existing = {found["name"] for found in inspector.get_indexes(table.name)}
+        for name in OBSOLETE_INDEXES.get(table.name, ()):
+            if name in existing:
+                logger.info(f"Dropping index {name} on {table.name}, which has been replaced")
+                quoted = engine.dialect.identifier_preparer.quote(name)
+                with engine.begin() as conn:
+                    conn.execute(text(f"DROP INDEX {quoted}"))
+    return created
+
+
+def drop_indexes(engine: Engine):
+    """
+    Drops the declared indexes, for benchmarking against unindexed tables
+    """
+    missing = set(verify_indexes(engine))
+    for index in _declared_indexes():
+        if index.name not in missing and index.table.name in inspect(engine).get_table_names():
+            index.drop(engine)
+
+
+def _hot_queries() -> dict[str, object]:
+    return {
+        "get_daily_round": select(RoundStatistics).where(
+            RoundStatistics.user_id == 42,
+            RoundStatistics.mode == "daily",
+            RoundStatistics.daily_date == date(2025, 6, 1),
+        ),
+        "rounds for user": select(RoundStatistics)
+        .where(RoundStatistics.user_id == 42)
+        .order_by(RoundStatistics.daily_date, RoundStatistics.id),
+        "leaderboard entry for user": select(LeaderboardEntry).where(
+            LeaderboardEntry.user_id == 42
+        ),
+        "top 10 by score": select(LeaderboardEntry).order_by(*LEADERBOARD_ORDER).limit(10),
+        "friends of user": select(Friendship.friend_id).where(Friendship.user_id == 42),
+    }
+
+
+def _fill(engine: Engine, rounds: int, users: int, batch_size: int = 50_000):
+    rng = random.Random(0)
+    start = date(2020, 1, 1)
+
+    with engine.begin() as conn:
+        for offset in range(0, rounds, batch_size):
+            conn.execute(
+                insert(RoundStatistics),
+                [
+                    {
+                        "user_id": rng.randrange(users),
+                        "round_length": timedelta(seconds=rng.randrange(10, 600)),
+                        "won": rng.random() < 0.6,
+                        "guesses": rng.randrange(1, 6),
+                        "mode": rng.choice(("daily", "survival")),
+                        "daily_date": start + timedelta(days=rng.randrange(2000)),
+                        "survival_streak": rng.randrange(20),
+                    }
+                    for _ in range(min(batch_size, rounds - offset))
+                ],
+            )
+        conn.execute(
+            insert(LeaderboardEntry),
+            [{"user_id": user_id, "score": rng.randrange(100)} for user_id in range(users)],
+        )
+        conn.execute(
+            insert(Friendship),
+            [
+                {"user_id": rng.randrange(users), "friend_id": rng.randrange(users)}
+                for _ in range(users * 10)
+            ],
+        )
+
+
+def _explain(engine: Engine, repeat: int = 20):
+    with engine.connect() as conn:
+        for name, statement in _hot_queries().items():
+            sql = str(statement.compile(engine, compile_kwargs={"literal_binds": True}))
+            plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                conn.exec_driver_sql(sql).fetchall()
+            elapsed = (time.perf_counter() - start) / repeat
+
+            print(f"  {name}: {elapsed * 1000:.2f}ms")
+            for row in plan:
+                print(f"    {row[-1]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show query plans before and after indexing")
+    parser.add_argument("--rounds", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{Path(directory) / 'benchmark.db'}")
+        for table in INDEXED_TABLES:
+            table.create(engine)
+        drop_indexes(engine)
+
+        start = time.perf_counter()
+        _fill(engine, args.rounds, args.users)
+        print(f"Generated {args.rounds:,} rounds in {time.perf_counter() - start:.1f}s\n")
+
+        print("Without indexes:")
+        _explain(engine)
+
+        start = time.perf_counter()
+        created = ensure_indexes(engine)
+        print(f"\nCreated {', '.join(created)} in {time.perf_counter() - start:.1f}s\n")
+
+        print("With indexes:")
+        _explain(engine)
+        engine.dispose()
@@ -1,16 +1,51 @@
+import base64
+import binascii
+import functools
+import logging
+import math
+import struct
+import threading
+import weakref
 from datetime import timedelta
+from typing import Iterable
 
 from pydantic import BaseModel
 from shared.database import Base, get_db
-from sqlalchemy import Integer, Interval, Sequence, select
+from sqlalchemy import (
+    Index,
+    Integer,
+    Interval,
+    Sequence,
+    and_,
+    case,
+    desc,
+    event,
+    func,
+    inspect,
+    literal,
+    or_,
+    select,
+    union,
+)
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Mapped, Session, mapped_column
 
 from phase2.friends import Friendship
+from phase2.sorted_set import InProcessSortedSet, SortedSet
+
+logger = logging.getLogger("phase2.leaderboard")
 
 
 class LeaderboardEntry(Base):
     __tablename__ = "leaderboard_entry"
+    __table_args__ = (
+        # A unique index rather than a constraint, so it can be added to existing tables
+        Index("ux_leaderboard_entry_user_id", "user_id", unique=True),
+        # Matches the leaderboard order (score descending, then entry_id) so
+        # pages can seek straight to a cursor
+        Index("ix_leaderboard_entry_score_desc_entry_id", desc("score"), "entry_id"),
+    )
 
     entry_id: Mapped[int] = mapped_column(Integer, Sequence("entry_id_seq"), primary_key=True)
     user_id: Mapped[int] = mapped_column(
@@ -31,10 +66,336 @@ class LeaderboardEntry(Base):
     score: Mapped[int] = mapped_column(Integer, nullable=False)
 
 
+# Entries on one page of the leaderboard
+PAGE_SIZE = 250
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE ... RETURNING
+_UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+# Leaderboard order: highest score first, ties going to whoever got an entry first
+LEADERBOARD_ORDER = (LeaderboardEntry.score.desc(), LeaderboardEntry.entry_id.asc())
+
+
+def ranked_below(score: int, entry_id: int):
+    """
+    Condition for entries ranked below the (score, entry_id) position. The
+    columns are ordered in opposite directions, so this can't be a row-value
+    comparison; the leading score bound is what the index seeks on.
+    """
+    return and_(
+        LeaderboardEntry.score <= score,
+        or_(LeaderboardEntry.score < score, LeaderboardEntry.entry_id > entry_id),
+    )
+
+
+def ranked_above(score: int, entry_id: int):
+    """
+    Condition for entries ranked above the (score, entry_id) position
+    """
+    return and_(
+        LeaderboardEntry.score >= score,
+        or_(LeaderboardEntry.score > score, LeaderboardEntry.entry_id < entry_id),
+    )
+
+
+_CURSOR = struct.Struct(">qq")
+
+
+def encode_cursor(entry: LeaderboardEntry) -> str:
+    """
+    Returns an opaque token for the position just after the given entry
+    """
+    return base64.urlsafe_b64encode(_CURSOR.pack(entry.score, entry.entry_id)).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[int, int]:
+    """
+    Returns the (score, entry_id) a cursor points after. Raises ValueError
+    if it isn't a cursor from encode_cursor()
+    """
+    try:
+        return _CURSOR.unpack(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, struct.error, UnicodeEncodeError) as e:
+        raise ValueError(f"Invalid leaderboard cursor {cursor!r}") from e
+
+
+# Columns copied into LeaderboardCache
+ENTRY_FIELDS = tuple(column.key for column in LeaderboardEntry.__table__.columns)
+
+
+class CachedEntry:
+    """
+    Read-only copy of a LeaderboardEntry, held by LeaderboardCache
+    """
+
+    __slots__ = ENTRY_FIELDS
+
+    def __init__(self, **values):
+        for name in ENTRY_FIELDS:
+            setattr(self, name, values[name])
+
+    @classmethod
+    def from_entry(cls, entry) -> "CachedEntry":
+        return cls(**{name: getattr(entry, name) for name in ENTRY_FIELDS})
+
+    def __repr__(self) -> str:
+        return f"CachedEntry(user_id={self.user_id}, score={self.score})"
+
+
+# Every FriendsLeaderboardCache, for the Friendship events below to invalidate
+_friends_caches: "weakref.WeakSet[FriendsLeaderboardCache]" = weakref.WeakSet()
+
+
+class FriendsLeaderboardCache:
+    """
+    Each user's friends leaderboard, as (rank, CachedEntry) pairs. A user's list
+    is dropped when one of their friendships is added, changed or removed
+    through the ORM, or when an entry is committed for anyone in their group.
+    """
+
+    def __init__(self):
+        self._leaderboards: dict[int, list[tuple[int, CachedEntry]]] = {}
+        # Each cached user's group (them and their friends), and the reverse:
+        # whose cached leaderboards each user is in the group for
+        self._groups: dict[int, set[int]] = {}
+        self._in_groups_of: dict[int, set[int]] = {}
+        # Bumped on every invalidation, so a list read before one isn't stored after it
+        self._version = 0
+        self._lock = threading.Lock()
+        _friends_caches.add(self)
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self, user_id: int) -> list[tuple[int, CachedEntry]] | None:
+        return self._leaderboards.get(user_id)
+
+    def put(
+        self,
+        user_id: int,
+        leaderboard: list[tuple[int, CachedEntry]],
+        group: set[int],
+        version: int,
+    ):
+        """
+        Stores a user's friends leaderboard for the given group, read when the
+        cache was at the given version. Ignored if anything has been invalidated since.
+        """
+        with self._lock:
+            if version != self._version:
+                return
+            self._leaderboards[user_id] = leaderboard
+            self._groups[user_id] = group
+            for member in group:
+                self._in_groups_of.setdefault(member, set()).add(user_id)
+
+    def invalidate(self, user_ids: Iterable[int]):
+        """
+        Drops the given users' friends leaderboards
+        """
+        with self._lock:
+            self._version += 1
+            for user_id in user_ids:
+                self._leaderboards.pop(user_id, None)
+                for member in self._groups.pop(user_id, ()):
+                    owners = self._in_groups_of[member]
+                    owners.discard(user_id)
+                    if not owners:
+                        del self._in_groups_of[member]
+
+    def entries_changed(self, user_ids: Iterable[int]):
+        """
+        Drops every friends leaderboard whose group includes one of the given users
+        """
+        with self._lock:
+            owners = set()
+            for user_id in user_ids:
+                owners.update(self._in_groups_of.get(user_id, ()))
+        self.invalidate(owners)
+
+
+@event.listens_for(Friendship, "after_insert")
+@event.listens_for(Friendship, "after_update")
+@event.listens_for(Friendship, "after_delete")
+def _friendship_changed(mapper, connection, friendship: Friendship):
+    # Includes the previous user_id when it's been changed
+    history = inspect(friendship).attrs.user_id.history
+    user_ids = {friendship.user_id, *history.deleted}
+    for cache in list(_friends_caches):
+        cache.invalidate(user_ids)
+
+
+# Sorted set members count down from here as entry ids go up
+_MEMBER_BASE = 10**20 - 1
+
+
+def _member(entry_id: int) -> str:
+    """
+    Sorted set member for an entry. Members are read in descending order, so
+    they're zero padded and count down as entry ids go up, which breaks ties
+    between equal scores the same way as LEADERBOARD_ORDER.
+    """
+    return f"{_MEMBER_BASE - entry_id:020d}"
+
+
+def _entry_id(member: str) -> int:
+    return _MEMBER_BASE - int(member)
+
+
+class LeaderboardCache:
+    """
+    Copy of the leaderboard kept outside the database. Scores are kept in a
+    SortedSet (in process by default) with one member per entry, and reads
+    walk it from the highest score down. Ranks and updates are O(log n) and
+    reading k entries from any rank is O(log n + k) with InProcessSortedSet.
+
+    Nothing is cached until load() is called (see main.py). After that, entries
+    are updated as they're committed by Leaderboard.sync_user_entry and
+    RoundStatisticsRepository.record_rounds.
+    """
+
+    def __init__(self, scores: SortedSet | None = None):
+        self.loaded = False
+        self.scores = scores if scores is not None else InProcessSortedSet()
+        # Used whether or not the rest of the cache is loaded
+        self.friends = FriendsLeaderboardCache()
+
+        self._by_entry_id: dict[int, CachedEntry] = {}
+        self._by_user_id: dict[int, CachedEntry] = {}
+        self._lock = threading.Lock()
+
+    def load(self, session: Session):
+        """
+        Rebuilds the cache from the leaderboard_entry table
+        """
+        columns = [LeaderboardEntry.__table__.c[name] for name in ENTRY_FIELDS]
+        with self._lock:
+            rows = session.execute(select(*columns))
+            entries = [CachedEntry(**row._mapping) for row in rows]
+
+            self.scores.clear()
+            self.scores.add({_member(entry.entry_id): entry.score for entry in entries})
+            self._by_entry_id = {entry.entry_id: entry for entry in entries}
+            self._by_user_id = {entry.user_id: entry for entry in entries}
+            self.loaded = True
+
+        logger.info(f"Loaded {len(entries)} leaderboard entries into the cache")
+
+    def update(self, entries: Iterable):
+        """
+        Adds or replaces the cached copies of committed entries
+        """
+        copies = [CachedEntry.from_entry(entry) for entry in entries]
+        self.friends.entries_changed(entry.user_id for entry in copies)
+        with self._lock:
+            if not self.loaded:
+                return  # load() will read them from the table
+
+            for entry in copies:
+                old = self._by_user_id.get(entry.user_id)
+                if old is not None and old.entry_id != entry.entry_id:
+                    self.scores.remove(_member(old.entry_id))
+                    del self._by_entry_id[old.entry_id]
+
+                self.scores.add({_member(entry.entry_id): entry.score})
+                self._by_entry_id[entry.entry_id] = entry
+                self._by_user_id[entry.user_id] = entry
+
+    def get(self, user_id: int) -> CachedEntry | None:
+        return self._by_user_id.get(user_id)
+
+    def rank(self, user_id: int) -> int | None:
+        """
+        The user's position on the leaderboard (1 for the top), or None
+        """
+        with self._lock:
+            entry = self._by_user_id.get(user_id)
+            if entry is None:
+                return None
+            return self.scores.rank(_member(entry.entry_id), reverse=True) + 1
+
+    def range(self, start: int, stop: int) -> list[CachedEntry]:
+        """
+        Entries at 0-based positions start to stop (exclusive)
+        """
+        with self._lock:
+            return self._range(start, stop)
+
+    def after(self, score: int, entry_id: int, limit: int) -> list[CachedEntry]:
+        """
+        Up to limit entries ranked below the (score, entry_id) position
+        """
+        member = _member(entry_id)
+        with self._lock:
+            if self.scores.score(member) == score:
+                start = self.scores.rank(member, reverse=True) + 1
+            else:
+                # The entry has moved since the cursor was made, so count the entries
+                # above its old position: higher scores, then ties with lower ids
+                higher = self.scores.count(math.nextafter(score, math.inf), math.inf)
+                ties = self.scores.range_by_score(score, score)
+                start = higher + sum(1 for tied, _ in ties if tied > member)
+            return self._range(start, start + limit)
+
+    def window(self, user_id: int, radius: int) -> list[tuple[int, CachedEntry]]:
+        """
+        (rank, entry) for the user's entry and up to radius entries either side
+        """
+        with self._lock:
+            entry = self._by_user_id.get(user_id)
+            if entry is None:
+                return []
+
+            position = self.scores.rank(_member(entry.entry_id), reverse=True)
+            start = max(position - radius, 0)
+            entries = self._range(start, position + radius + 1)
+        return list(enumerate(entries, start=start + 1))
+
+    def _range(self, start: int, stop: int) -> list[CachedEntry]:
+        if stop <= start:
+            return []
+        members = self.scores.range_by_rank(start, stop - 1, reverse=True)
+        return [self._by_entry_id[_entry_id(member)] for member, _ in members]
+
+
+@functools.cache
+def get_leaderboard_cache() -> LeaderboardCache:
+    """
+    Returns the process-wide leaderboard cache
+    """
+    return LeaderboardCache()
+
+
+def load_leaderboard_cache():
+    """
+    Fills the process-wide leaderboard cache from the database
+    """
+    session = get_db()
+    try:
+        get_leaderboard_cache().load(session)
+    finally:
+        session.close()
+
+
 class Leaderboard:
-    def __init__(self, session: Session, stats_repo=None):
+    """
+    Leaderboard entries stored in the leaderboard_entry table. Given a loaded
+    LeaderboardCache, reads of ranks, scores and pages come from the cache.
+    """
+
+    def __init__(self, session: Session, stats_repo=None, cache: LeaderboardCache | None = None):
         self.session = session
         self.stats_repo = stats_repo
+        self.cache = cache
+
+    @property
+    def _cached(self) -> LeaderboardCache | None:
+        """The cache, if there is one to read from"""
+        if self.cache is not None and self.cache.loaded:
+            return self.cache
+        return None
 
     async def sync_user_entry(self, user_id: int) -> LeaderboardEntry | None:
         """
@@ -49,6 +410,57 @@ class Leaderboard:
             # no rounds recorded; nothing to sync
             return None
 
+        entry = self.stage_entry(stats)
+
+        try:
+            self.session.commit()
+            self.session.refresh(entry)
+        except IntegrityError:
+            self.session.rollback()
+            return None
+
+        if self.cache is not None:
+            self.cache.update([entry])
+        return entry
+
+    def stage_entry(self, stats, upsert: bool = False) -> LeaderboardEntry:
+        """
+        Creates or updates the user's entry from their stats (a LeaderboardStats)
+        in the current transaction, without committing it. A user's score never
+        goes down.
+
+        With upsert, this is a single INSERT ... ON CONFLICT ... RETURNING on
+        databases that support it, instead of a SELECT followed by a flush.
+        """
+        values = {
+            "user_id": stats.user_id,
+            "daily_streak": stats.daily_streak,
+            "longest_daily_streak": stats.longest_daily_streak,
+            "average_daily_guesses": stats.average_daily_guesses,
+            "average_daily_time": stats.average_daily_time,
+            "longest_survival_streak": stats.longest_survival_streak,
+            "score": stats.score,
+        }
+
+        dialect = self.session.get_bind().dialect.name
+        if upsert and dialect in _UPSERT_INSERTS:
+            statement = _UPSERT_INSERTS[dialect](LeaderboardEntry).values(**values)
+            table = LeaderboardEntry.__table__
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.user_id],
+                set_={
+                    **{name: statement.excluded[name] for name in values if name != "score"},
+                    "score": case(
+                        (statement.excluded.score > table.c.score, statement.excluded.score),
+                        else_=table.c.score,
+                    ),
+                },
+            )
+            return self.session.scalars(
+                statement.returning(LeaderboardEntry),
+                execution_options={"populate_existing": True},
+            ).one()
+
         # Look for an existing leaderboard entry
         entry: LeaderboardEntry | None = (
             self.session.execute(
@@ -60,15 +472,7 @@ class Leaderboard:
 
         # If it doesn't exist, create it
         if entry is None:
-            entry = LeaderboardEntry(
-                user_id=stats.user_id,
-                daily_streak=stats.daily_streak,
-                longest_daily_streak=stats.longest_daily_streak,
-                average_daily_guesses=stats.average_daily_guesses,
-                average_daily_time=stats.average_daily_time,
-                longest_survival_streak=stats.longest_survival_streak,
-                score=stats.score,
-            )
+            entry = LeaderboardEntry(**values)
             self.session.add(entry)
 
         # If it does exist, update it
@@ -82,13 +486,6 @@ class Leaderboard:
             if stats.score > entry.score:
                 entry.score = stats.score
 
-        try:
-            self.session.commit()
-            self.session.refresh(entry)
-        except IntegrityError:
-            self.session.rollback()
-            return None
-
         return entry
 
     async def get_entry(self, user_id: int) -> LeaderboardEntry:
@@ -116,7 +513,10 @@ class Leaderboard:
         """
         Gets top 10 leaderboard entries
         """
-        stmt = select(LeaderboardEntry).order_by(LeaderboardEntry.score.desc()).limit(10)
+        if self._cached:
+            return self._cached.range(0, 10)
+
+        stmt = select(LeaderboardEntry).order_by(*LEADERBOARD_ORDER).limit(10)
 
         top10 = self.session.execute(stmt).scalars().all()
 
@@ -124,48 +524,168 @@ class Leaderboard:
 
     async def get_250_entries(self, position: int) -> list[LeaderboardEntry]:
         """
-        Get 250 leaderboard entries from the given position (from the top)
+        Get 250 leaderboard entries from the given position (from the top).
+        The database skips every entry above the position, so use get_page()
+        to page through the leaderboard.
         """
         offset_value = max(position - 1, 0)  # convert to 0-based offset
+        if self._cached:
+            return self._cached.range(offset_value, offset_value + PAGE_SIZE)
 
         stmt = (
             select(LeaderboardEntry)
-            .order_by(LeaderboardEntry.score.desc())
+            .order_by(*LEADERBOARD_ORDER)
             .offset(offset_value)
-            .limit(250)
+            .limit(PAGE_SIZE)
         )
 
         return self.session.execute(stmt).scalars().all()
 
-    def get_friends_entries(self, user_id: int) -> list[LeaderboardEntry]:
+    async def get_page(
+        self, cursor: str | None = None, limit: int = PAGE_SIZE
+    ) -> tuple[list[LeaderboardEntry], str | None]:
         """
-        Get all leaderboard entries for the given user's friends only
-        (including the given user)
+        Gets a page of leaderboard entries, starting from the top or after the
+        cursor returned with the previous page. Returns the entries and the cursor
+        for the next page (None on the last page).
+
+        Seeks to the cursor with the (score DESC, entry_id) index, so deep pages are as
+        fast as the first. Raises ValueError for an invalid cursor.
         """
+        after = decode_cursor(cursor) if cursor is not None else None
 
-        # Get friend IDs 
-        stmt = select(Friendship.friend_id).where(Friendship.user_id == user_id)
-        friend_ids = self.session.execute(stmt).scalars().all()
+        if self._cached:
+            if after is None:
+                entries = self._cached.range(0, limit + 1)
+            else:
+                entries = self._cached.after(*after, limit + 1)
+        else:
+            stmt = select(LeaderboardEntry).order_by(*LEADERBOARD_ORDER).limit(limit + 1)
+            if after is not None:
+                stmt = stmt.where(ranked_below(*after))
+            entries = self.session.execute(stmt).scalars().all()
 
-        # Always include the user's own ID
-        friend_ids.append(user_id)
+        if len(entries) <= limit:
+            return entries, None
+        return entries[:limit], encode_cursor(entries[limit - 1])
 
-        # Remove duplicates 
-        friend_ids = list(set(friend_ids))
+    def get_rank(self, user_id: int) -> int | None:
+        """
+        Returns the user's position on the leaderboard (1 for the top), or None
+        if they have no entry. Counts the entries ranked above theirs along the
+        (score DESC, entry_id) index.
+        """
+        if self._cached:
+            return self._cached.rank(user_id)
 
-        # Query leaderboard entries for the 
-        stmt = select(LeaderboardEntry).where(LeaderboardEntry.user_id.in_(friend_ids))
-        entries = self.session.execute(stmt).scalars().all()
+        entry = self._find_entry(user_id)
+        if entry is None:
+            return None
+        return self._count_above(entry) + 1
+
+    def get_window(
+        self, user_id: int, radius: int = PAGE_SIZE // 2
+    ) -> list[tuple[int, LeaderboardEntry]]:
+        """
+        Returns (rank, entry) for the user's entry and up to radius entries either
+        side of it, in leaderboard order. Empty if the user has no entry.
+        """
+        if self._cached:
+            return self._cached.window(user_id, radius)
 
-        #  Sort by score descending
-        entries.sort(key=lambda e: e.score, reverse=True)
+        entry = self._find_entry(user_id)
+        if entry is None:
+            return []
+
+        above = self.session.scalars(
+            select(LeaderboardEntry)
+            .where(ranked_above(entry.score, entry.entry_id))
+            .order_by(LeaderboardEntry.score.asc(), LeaderboardEntry.entry_id.desc())
+            .limit(radius)
+        ).all()
+        below = self.session.scalars(
+            select(LeaderboardEntry)
+            .where(ranked_below(entry.score, entry.entry_id))
+            .order_by(*LEADERBOARD_ORDER)
+            .limit(radius)
+        ).all()
+
+        first_rank = self._count_above(entry) + 1 - len(above)
+        entries = [*reversed(above), entry, *below]
+        return list(enumerate(entries, start=first_rank))
+
+    def _find_entry(self, user_id: int) -> LeaderboardEntry | None:
+        return self.session.scalars(
+            select(LeaderboardEntry).where(LeaderboardEntry.user_id == user_id)
+        ).first()
+
+    def _count_above(self, entry: LeaderboardEntry) -> int:
+        """Number of entries ranked above the given one"""
+        return self.session.scalar(
+            select(func.count())
+            .select_from(LeaderboardEntry)
+            .where(ranked_above(entry.score, entry.entry_id))
+        )
 
-        return entries
+    def get_friends_entries(
+        self, user_id: int, with_rank: bool = False
+    ) -> list[CachedEntry] | list[tuple[int, CachedEntry]]:
+        """
+        Get all leaderboard entries for the given user's friends only
+        (including the given user), in leaderboard order, as CachedEntry copies
+        whether or not they came from the cache. With with_rank, returns
+        (rank within the group, entry) pairs, with tied scores sharing a rank.
+        """
+        friends = self.cache.friends if self.cache is not None else None
+        leaderboard = friends.get(user_id) if friends is not None else None
+
+        if leaderboard is None:
+            version = friends.version if friends is not None else None
+
+            # The user and their friends (UNION drops duplicates), joined to their
+            # entries and ranked in one query
+            group = union(
+                select(Friendship.friend_id.label("user_id")).where(
+                    Friendship.user_id == user_id
+                ),
+                select(literal(user_id).label("user_id")),
+            ).subquery()
+            stmt = (
+                select(
+                    group.c.user_id,
+                    func.rank()
+                    .over(order_by=LeaderboardEntry.score.desc().nulls_last())
+                    .label("rank"),
+                    LeaderboardEntry,
+                )
+                .outerjoin(LeaderboardEntry, LeaderboardEntry.user_id == group.c.user_id)
+                .order_by(*LEADERBOARD_ORDER)
+            )
+            # Friends without an entry are still part of the group, so the cached
+            # leaderboard is dropped when they get one
+            rows = self.session.execute(stmt).all()
+            leaderboard = [
+                (rank, CachedEntry.from_entry(entry))
+                for _, rank, entry in rows
+                if entry is not None
+            ]
+
+            if friends is not None:
+                friends.put(user_id, leaderboard, {member for member, _, _ in rows}, version)
+
+        # A copy, so callers can't change the cached list
+        if with_rank:
+            return list(leaderboard)
+        return [entry for _, entry in leaderboard]
 
     async def get_score(self, user_id: int) -> int:
         """
         calculates user score
         """
+        if self._cached:
+            entry = self._cached.get(user_id)
+            return 0 if entry is None else entry.score
+
         entry = (
             self.session.execute(
                 select(LeaderboardEntry).where(LeaderboardEntry.user_id == user_id)
@@ -192,4 +712,4 @@ class LeaderboardEntrySchema(BaseModel):
 
 def get_leaderboard_repository() -> Leaderboard:
     db = get_db()
-    return Leaderboard(session=db)
\ No newline at end of file
+    return Leaderboard(session=db, cache=get_leaderboard_cache())
\ No newline at end of file
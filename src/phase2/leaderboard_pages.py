@@ -0,0 +1,94 @@
+"""
+Benchmark of paging through the leaderboard with OFFSET (get_250_entries)
+against seeking to a cursor (get_page).
+
+Run `python -m phase2.leaderboard_pages` to time pages from rank 1 down to
+rank 1,000,000 on a generated SQLite database.
+"""
+
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from phase2.leaderboard import (
+    LEADERBOARD_ORDER,
+    PAGE_SIZE,
+    Leaderboard,
+    LeaderboardEntry,
+    encode_cursor,
+)
+
+
+def _fill(session: Session, entries: int, batch_size: int = 100_000):
+    rng = random.Random(0)
+    for offset in range(0, entries, batch_size):
+        session.execute(
+            insert(LeaderboardEntry),
+            [
+                {"user_id": user_id, "score": rng.randrange(entries // 10)}
+                for user_id in range(offset, min(offset + batch_size, entries))
+            ],
+        )
+    session.commit()
+
+
+def _cursor_before(session: Session, rank: int) -> str | None:
+    """The cursor get_page() would have returned for the page ending just above rank"""
+    if rank <= 1:
+        return None
+    entry = session.scalars(
+        select(LeaderboardEntry).order_by(*LEADERBOARD_ORDER).offset(rank - 2).limit(1)
+    ).one()
+    return encode_cursor(entry)
+
+
+async def _time(read, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await read()
+    return (time.perf_counter() - start) / repeat
+
+
+async def main(entries: int, repeat: int):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{Path(directory) / 'benchmark.db'}")
+        LeaderboardEntry.__table__.create(engine)
+
+        with Session(engine) as session:
+            start = time.perf_counter()
+            _fill(session, entries)
+            print(f"Generated {entries:,} entries in {time.perf_counter() - start:.1f}s\n")
+
+            leaderboard = Leaderboard(session)
+            ranks = [1, 1_000, 10_000, 100_000, entries // 2, entries - PAGE_SIZE + 1]
+            print(f"{'rank':>10}  {'offset':>10}  {'cursor':>10}")
+            for rank in sorted(r for r in set(ranks) if 1 <= r <= entries):
+                cursor = _cursor_before(session, rank)
+                with_offset = await _time(lambda: leaderboard.get_250_entries(rank), repeat)
+                with_cursor = await _time(lambda: leaderboard.get_page(cursor), repeat)
+
+                # Both ways of reading the page should agree
+                page, _ = await leaderboard.get_page(cursor)
+                assert page == await leaderboard.get_250_entries(rank)
+                session.expunge_all()
+
+                print(
+                    f"{rank:>10,}  {with_offset * 1000:>8.2f}ms  {with_cursor * 1000:>8.2f}ms"
+                )
+
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark leaderboard paging")
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.entries, args.repeat))
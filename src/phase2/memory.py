@@ -0,0 +1,68 @@
+"""
+Helpers for measuring how much memory our in-process data structures use.
+"""
+
+import sys
+import tracemalloc
+from array import array
+from typing import Callable
+
+
+def deep_getsizeof(obj, seen: set[int] | None = None) -> int:
+    """
+    Approximate the number of bytes used by obj and everything it references.
+    Shared objects are only counted once.
+    """
+    if seen is None:
+        seen = set()
+
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool, array)) or obj is None:
+        return size
+
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_getsizeof(key, seen) + deep_getsizeof(value, seen)
+        return size
+
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += deep_getsizeof(item, seen)
+        return size
+
+    if hasattr(obj, "__dict__"):
+        size += deep_getsizeof(vars(obj), seen)
+
+    for cls in type(obj).__mro__:
+        for slot in getattr(cls, "__slots__", ()):
+            if slot in ("__dict__", "__weakref__") or not hasattr(obj, slot):
+                continue
+            size += deep_getsizeof(getattr(obj, slot), seen)
+
+    return size
+
+
+def measure_allocation(factory: Callable[[], object], count: int = 1000) -> float:
+    """
+    Average number of bytes allocated per object made by factory, measured with
+    tracemalloc over count calls. Unlike deep_getsizeof, objects the results share
+    (such as countries from the catalog) aren't counted.
+    """
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        objects = [factory() for _ in range(count)]
+        allocated = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+    del objects
+    return allocated / count
@@ -2,14 +2,62 @@
 This file contains classes and methods to be used for managing a game round.
 """
 
+import struct
 from datetime import datetime, timedelta, timezone
+from typing import Iterable
 
 from nicegui import Event
 
-from phase2.country import Country
+from phase2.country import Country, get_catalog
 
 MAX_GUESSES = 5
 
+# The fields of a GuessFeedback, in the order they're displayed and packed
+FEEDBACK_FIELDS = ("name", "population", "size", "region", "currencies", "languages", "timezones")
+
+# The 2-bit code for each value a field can hold. 0 means the field wasn't set.
+FIELD_CODES = {
+    "name": {True: 1, False: 2},
+    "population": {True: 1, "<": 2, ">": 3},
+    "size": {True: 1, "<": 2, ">": 3},
+    "region": {True: 1, False: 2},
+    "currencies": {True: 1, False: 2, "partial": 3},
+    "languages": {True: 1, False: 2, "partial": 3},
+    "timezones": {True: 1, False: 2, "partial": 3},
+}
+_FIELD_VALUES = {
+    field: {code: value for value, code in codes.items()} for field, codes in FIELD_CODES.items()
+}
+
+# Packed feedback codes are always below this
+FEEDBACK_CODE_LIMIT = 1 << (2 * len(FEEDBACK_FIELDS))
+
+# One guess in RoundStats.guess_log: country (catalog index), packed feedback,
+# milliseconds since the round started
+GUESS_LOG_ENTRY = struct.Struct("<HHI")
+
+
+def pack_guess_log(guesses: Iterable[tuple[str, int, int]]) -> bytearray:
+    """
+    Packs (country name, packed feedback, milliseconds) guesses into a guess log
+    """
+    catalog = get_catalog()
+    log = bytearray()
+    for name, feedback, offset in guesses:
+        log += GUESS_LOG_ENTRY.pack(catalog.index(catalog.get(name)), feedback, offset)
+    return log
+
+
+def unpack_guess_log(log: bytes) -> list[tuple[str, int, int]]:
+    """
+    The (country name, packed feedback, milliseconds) guesses in a guess log
+    """
+    countries = get_catalog().countries
+    return [
+        (countries[index].name, feedback, offset)
+        for index, feedback, offset in GUESS_LOG_ENTRY.iter_unpack(log)
+    ]
+
 
 class GuessFeedback:
     """
@@ -17,17 +65,99 @@ class GuessFeedback:
     match is set to True.
     Any numerical comparisons are either '<' or '>'
     Set comparisons are either False (no overlap) or 'partial'
+    Fields that couldn't be compared are None.
 
     All comparisons are in the form <guess> <operator> <answer>.
+
+    Every feedback has a canonical encoding as a small int (2 bits per field,
+    see pack()), which is also what equality and hashing are based on.
     """
 
-    name: bool
-    population: bool | str
-    size: bool | str
-    region: bool
-    currencies: bool | str
-    languages: bool | str
-    timezones: bool | str
+    __slots__ = FEEDBACK_FIELDS
+
+    name: bool | None
+    population: bool | str | None
+    size: bool | str | None
+    region: bool | None
+    currencies: bool | str | None
+    languages: bool | str | None
+    timezones: bool | str | None
+
+    def __init__(self, **fields):
+        for field in FEEDBACK_FIELDS:
+            setattr(self, field, fields.pop(field, None))
+        if fields:
+            raise TypeError(f"Unknown feedback fields: {', '.join(fields)}")
+
+    def items(self) -> list[tuple[str, bool | str]]:
+        """
+        Returns the (field, value) pairs that were compared, in FEEDBACK_FIELDS order
+        """
+        return [
+            (field, value)
+            for field in FEEDBACK_FIELDS
+            if (value := getattr(self, field)) is not None
+        ]
+
+    def as_dict(self) -> dict[str, bool | str]:
+        return dict(self.items())
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{field}={value!r}" for field, value in self.items())
+        return f"GuessFeedback({fields})"
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, GuessFeedback):
+            return NotImplemented
+        return self.pack() == other.pack()
+
+    def __hash__(self) -> int:
+        return self.pack()
+
+    def pack(self) -> int:
+        """
+        Packs the feedback into an int below FEEDBACK_CODE_LIMIT, 2 bits per
+        field in FEEDBACK_FIELDS order
+        """
+        code = 0
+        for shift, field in enumerate(FEEDBACK_FIELDS):
+            value = getattr(self, field)
+            if value is not None:
+                try:
+                    code |= FIELD_CODES[field][value] << (2 * shift)
+                except KeyError:
+                    message = f"Invalid value {value!r} for feedback field {field}"
+                    raise ValueError(message) from None
+        return code
+
+    @classmethod
+    def unpack(cls, code: int) -> "GuessFeedback":
+        """
+        Turns a code from pack() back into a GuessFeedback.
+        Raises ValueError if it isn't a valid code.
+        """
+        fields = _unpacked_fields.get(code)
+        if fields is None:
+            if not 0 <= code < FEEDBACK_CODE_LIMIT:
+                raise ValueError(f"Feedback code {code} out of range")
+
+            fields = {}
+            for shift, field in enumerate(FEEDBACK_FIELDS):
+                field_code = (code >> (2 * shift)) & 0b11
+                if not field_code:
+                    continue
+                try:
+                    fields[field] = _FIELD_VALUES[field][field_code]
+                except KeyError:
+                    message = f"Invalid code {field_code} for feedback field {field}"
+                    raise ValueError(message) from None
+            _unpacked_fields[code] = fields
+
+        return cls(**fields)
+
+
+# The fields each code unpacks to, filled in as codes are seen
+_unpacked_fields: dict[int, dict[str, bool | str]] = {}
 
 
 class RoundStats:
@@ -36,8 +166,28 @@ class RoundStats:
     playing.
     """
 
+    __slots__ = (
+        "guesses",
+        "guessed_names",
+        "feedback",
+        "guess_log",
+        "max_guesses",
+        "mode",
+        "user_id",
+        "start_time",
+        "guess_graded",
+        "game_ended",
+        "guess_error",
+        "round_length",
+        "won",
+    )
+
     guesses: int
     guessed_names: list[str]
+    feedback: list[GuessFeedback]  # feedback for each of guessed_names
+    # Every guess in the round as packed GUESS_LOG_ENTRY structs (see
+    # unpack_guess_log()), kept across survival countries
+    guess_log: bytearray
     max_guesses: int
     mode: str
     user_id: int
@@ -45,16 +195,21 @@ class RoundStats:
     guess_graded: Event[Country, GuessFeedback]
     game_ended: Event[bool]
     guess_error: Event
-    round_length: timedelta
+    round_length: timedelta | None
+    won: bool
 
     def __init__(self, mode: str, user_id: int = None):
         self.guesses = 0
         self.guessed_names = []
+        self.feedback = []
+        self.guess_log = bytearray()
         self.max_guesses = MAX_GUESSES
         self.mode = mode
         self.user_id = user_id
 
         self.start_time = None
+        self.round_length = None
+        self.won = False
 
         self.guess_graded = Event[Country, GuessFeedback]()
         self.game_ended = Event[bool]()
@@ -65,3 +220,30 @@ class RoundStats:
 
     def end_round(self):
         self.round_length = datetime.now(timezone.utc) - self.start_time
+
+    def record_guess(self, name: str, feedback: GuessFeedback):
+        """
+        Adds a graded guess to the round
+        """
+        self.guessed_names.append(name)
+        self.feedback.append(feedback)
+        self.guesses += 1
+
+        offset = datetime.now(timezone.utc) - self.start_time
+        self.guess_log += pack_guess_log(
+            [(name, feedback.pack(), offset // timedelta(milliseconds=1))]
+        )
+
+    def summary(self) -> dict:
+        """
+        The round's results, for logging
+        """
+        return {
+            "mode": self.mode,
+            "user_id": self.user_id,
+            "won": self.won,
+            "guesses": self.guesses,
+            "guessed_names": self.guessed_names,
+            "start_time": self.start_time,
+            "round_length": self.round_length,
+        }
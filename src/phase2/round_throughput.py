@@ -0,0 +1,125 @@
+"""
+Benchmark of how many finished rounds per second RoundStatisticsRepository.add_round
+can record, comparing the old two-commit write against the single transaction
+with and without the leaderboard upsert.
+
+Run `python -m phase2.round_throughput` to benchmark against a SQLite file.
+"""
+
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from shared.database import Base
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import Session
+
+from phase2.leaderboard import Leaderboard
+from phase2.round import GuessFeedback, RoundStats, pack_guess_log, unpack_guess_log
+from phase2.statistics import GuessEvent, RoundStatistics, RoundStatisticsRepository
+
+
+async def _add_round_two_commits(repo: RoundStatisticsRepository, round_stats: RoundStats):
+    """
+    How add_round used to write a round: the leaderboard sync commits and
+    refreshes the entry, then add_round commits again
+    """
+    start = round_stats.start_time
+    round_row = RoundStatistics(
+        user_id=round_stats.user_id,
+        round_length=round_stats.round_length,
+        won=round_stats.won,
+        guesses=round_stats.guesses,
+        mode=round_stats.mode,
+        daily_date=start.date(),
+        survival_streak=0,
+    )
+    with repo.session.no_autoflush:
+        repo.session.add(round_row)
+        repo._update_aggregate(round_row)
+
+    repo.session.flush()
+    repo.session.execute(
+        insert(GuessEvent),
+        [
+            {
+                "round_id": round_row.id,
+                "guess_index": index,
+                "country_id": country_id,
+                "feedback": feedback,
+                "time_offset": time_offset,
+            }
+            for index, (country_id, feedback, time_offset) in enumerate(
+                unpack_guess_log(round_stats.guess_log)
+            )
+        ],
+    )
+
+    await Leaderboard(repo.session, repo).sync_user_entry(round_stats.user_id)
+    repo.session.commit()
+
+
+def _make_rounds(count: int, users: int) -> list[RoundStats]:
+    rng = random.Random(0)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    rounds = []
+    for i in range(count):
+        round_stats = RoundStats(mode="daily", user_id=i % users)
+        round_stats.start_time = start + timedelta(days=i // users)
+        round_stats.round_length = timedelta(seconds=rng.randrange(10, 600))
+        round_stats.won = rng.random() < 0.6
+        round_stats.guesses = rng.randrange(1, 6)
+        rounds.append(round_stats)
+    return rounds
+
+
+async def _run(name: str, path: Path, rounds: list[RoundStats], write):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(1))
+
+    with Session(engine) as session:
+        repo = RoundStatisticsRepository(session)
+        start = time.perf_counter()
+        for round_stats in rounds:
+            await write(repo, round_stats)
+        elapsed = time.perf_counter() - start
+
+    engine.dispose()
+    print(
+        f"{name}: {len(rounds) / elapsed:,.0f} rounds/s, "
+        f"{len(statements) / len(rounds):.1f} statements per round"
+    )
+
+
+async def main(count: int, users: int):
+    rounds = _make_rounds(count, users)
+    feedback = GuessFeedback(name=False, region=True).pack()
+    for round_stats in rounds:
+        round_stats.guess_log = pack_guess_log(
+            ("peru", feedback, 1000 * n) for n in range(round_stats.guesses)
+        )
+
+    modes = {
+        "two commits": _add_round_two_commits,
+        "one transaction": lambda repo, r: repo.add_round(r, upsert=False),
+        "one transaction, upsert": lambda repo, r: repo.add_round(r, upsert=True),
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for n, (name, write) in enumerate(modes.items()):
+            await _run(name, Path(directory) / f"{n}.db", rounds, write)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark recording finished rounds")
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.rounds, args.users))
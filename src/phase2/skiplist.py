@@ -0,0 +1,195 @@
+"""
+An indexable skip list: a sorted list of keys where inserting, removing,
+finding a key's position and reading the key at a position are all O(log n).
+
+Each link records how many positions it skips, which is what makes lookups by
+position possible (see Pugh, "A Skip List Cookbook").
+"""
+
+import random
+from typing import Any, Iterable, Iterator
+
+# Enough levels for tens of millions of keys
+MAX_LEVEL = 24
+# Chance of a node reaching each level above the first
+LEVEL_PROBABILITY = 0.5
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key: Any, level: int):
+        self.key = key
+        self.next: list[_Node | None] = [None] * level
+        # Positions between this node and the next one on each level
+        self.width = [1] * level
+
+
+class IndexableSkipList:
+    """
+    Sorted list of unique, comparable keys. Positions are 0-based like a list's.
+    Not thread safe.
+    """
+
+    def __init__(self, keys: Iterable = (), rng: random.Random | None = None):
+        """
+        keys must already be sorted and unique, which lets the list be built in O(n)
+        """
+        self._random = rng or random.Random()
+        self._head = _Node(None, MAX_LEVEL)
+        self._size = 0
+
+        # The last node on each level, and its position (the head is position 0)
+        last = [self._head] * MAX_LEVEL
+        last_position = [0] * MAX_LEVEL
+        previous = None
+        for key in keys:
+            if previous is not None and not previous < key:
+                raise ValueError("Keys must be sorted and unique")
+            previous = key
+
+            self._size += 1
+            node = _Node(key, self._random_level())
+            for i in range(len(node.next)):
+                last[i].next[i] = node
+                last[i].width[i] = self._size - last_position[i]
+                last[i], last_position[i] = node, self._size
+
+        # Links off the end count the distance to one past the last key
+        for i in range(MAX_LEVEL):
+            last[i].width[i] = self._size + 1 - last_position[i]
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < MAX_LEVEL and self._random.random() < LEVEL_PROBABILITY:
+            level += 1
+        return level
+
+    def _find(self, key) -> tuple[list[_Node], list[int]]:
+        """
+        Returns the last node before key on each level, and their positions
+        """
+        update = [self._head] * MAX_LEVEL
+        positions = [0] * MAX_LEVEL
+
+        node, position = self._head, 0
+        for i in reversed(range(MAX_LEVEL)):
+            while node.next[i] is not None and node.next[i].key < key:
+                position += node.width[i]
+                node = node.next[i]
+            update[i], positions[i] = node, position
+        return update, positions
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, key) -> bool:
+        update, _ = self._find(key)
+        node = update[0].next[0]
+        return node is not None and node.key == key
+
+    def __iter__(self) -> Iterator:
+        return self.iter_from(0)
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("Skip list index out of range")
+        return self._node_at(index + 1).key
+
+    def _node_at(self, position: int) -> _Node:
+        node, current = self._head, 0
+        for i in reversed(range(MAX_LEVEL)):
+            while node.next[i] is not None and current + node.width[i] <= position:
+                current += node.width[i]
+                node = node.next[i]
+        return node
+
+    def add(self, key):
+        """
+        Inserts a key. Raises ValueError if it's already in the list.
+        """
+        update, positions = self._find(key)
+        following = update[0].next[0]
+        if following is not None and following.key == key:
+            raise ValueError(f"{key!r} is already in the skip list")
+
+        node = _Node(key, self._random_level())
+        before = positions[0]  # the new node goes at position before + 1
+        for i in range(len(node.next)):
+            previous = update[i]
+            node.next[i] = previous.next[i]
+            node.width[i] = previous.width[i] - (before - positions[i])
+            previous.next[i] = node
+            previous.width[i] = before + 1 - positions[i]
+        for i in range(len(node.next), MAX_LEVEL):
+            update[i].width[i] += 1
+
+        self._size += 1
+
+    def remove(self, key):
+        """
+        Removes a key. Raises ValueError if it isn't in the list.
+        """
+        update, _ = self._find(key)
+        node = update[0].next[0]
+        if node is None or node.key != key:
+            raise ValueError(f"{key!r} is not in the skip list")
+
+        for i in range(MAX_LEVEL):
+            if update[i].next[i] is node:
+                update[i].width[i] += node.width[i] - 1
+                update[i].next[i] = node.next[i]
+            else:
+                update[i].width[i] -= 1
+
+        self._size -= 1
+
+    def index(self, key) -> int:
+        """
+        Returns the position of a key. Raises ValueError if it isn't in the list.
+        """
+        update, positions = self._find(key)
+        node = update[0].next[0]
+        if node is None or node.key != key:
+            raise ValueError(f"{key!r} is not in the skip list")
+        return positions[0]
+
+    def bisect_left(self, key) -> int:
+        """
+        Returns the number of keys less than key
+        """
+        _, positions = self._find(key)
+        return positions[0]
+
+    def bisect_right(self, key) -> int:
+        """
+        Returns the number of keys less than or equal to key
+        """
+        update, positions = self._find(key)
+        node = update[0].next[0]
+        if node is not None and node.key == key:
+            return positions[0] + 1
+        return positions[0]
+
+    def iter_from(self, index: int) -> Iterator:
+        """
+        Iterates over the keys from the given position onwards
+        """
+        node = self._node_at(max(index, 0))
+        node = node.next[0]
+        while node is not None:
+            yield node.key
+            node = node.next[0]
+
+    def slice(self, start: int, stop: int) -> list:
+        """
+        Returns the keys at positions start to stop (exclusive), in O(log n + k)
+        """
+        keys = []
+        for key in self.iter_from(start):
+            if len(keys) >= stop - start:
+                break
+            keys.append(key)
+        return keys
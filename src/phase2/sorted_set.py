@@ -0,0 +1,231 @@
+"""
+Sorted sets with the semantics of Redis sorted sets (ZADD, ZINCRBY, ZRANK,
+ZRANGE, ZRANGEBYSCORE, ...), so leaderboard storage can move between an
+in-process implementation and a Redis server without changing its callers.
+
+Members are strings ordered by score, then by member (like Redis, which
+compares members byte by byte). Ranks are 0-based, and rank ranges include
+both ends and accept negative positions counted from the end.
+"""
+
+import threading
+from abc import ABC, abstractmethod
+from typing import Mapping
+
+from phase2.skiplist import IndexableSkipList
+
+
+class SortedSet(ABC):
+    """
+    A set of members, each with a score
+    """
+
+    @abstractmethod
+    def add(self, members: Mapping[str, float], gt: bool = False) -> int:
+        """
+        Sets the score of each member, adding members that aren't in the set yet.
+        With gt, existing members are only updated if the new score is higher.
+        Returns the number of members added (ZADD).
+        """
+
+    @abstractmethod
+    def increment(self, member: str, amount: float = 1) -> float:
+        """
+        Adds amount to a member's score, adding the member with a score of amount
+        if it isn't in the set. Returns the new score (ZINCRBY).
+        """
+
+    @abstractmethod
+    def remove(self, *members: str) -> int:
+        """
+        Removes members, returning how many were in the set (ZREM)
+        """
+
+    @abstractmethod
+    def score(self, member: str) -> float | None:
+        """
+        The member's score, or None if it isn't in the set (ZSCORE)
+        """
+
+    @abstractmethod
+    def rank(self, member: str, reverse: bool = False) -> int | None:
+        """
+        The member's position by ascending score, or descending with reverse,
+        or None if it isn't in the set (ZRANK, ZREVRANK)
+        """
+
+    @abstractmethod
+    def range_by_rank(
+        self, start: int, stop: int, reverse: bool = False
+    ) -> list[tuple[str, float]]:
+        """
+        (member, score) for positions start to stop inclusive (ZRANGE)
+        """
+
+    @abstractmethod
+    def range_by_score(
+        self,
+        min_score: float,
+        max_score: float,
+        reverse: bool = False,
+        offset: int = 0,
+        count: int | None = None,
+    ) -> list[tuple[str, float]]:
+        """
+        (member, score) for members scoring between min_score and max_score
+        inclusive, skipping offset of them and returning at most count
+        (ZRANGEBYSCORE, ZREVRANGEBYSCORE)
+        """
+
+    @abstractmethod
+    def count(self, min_score: float, max_score: float) -> int:
+        """
+        Number of members scoring between min_score and max_score inclusive (ZCOUNT)
+        """
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of members (ZCARD)"""
+
+    @abstractmethod
+    def clear(self):
+        """Removes every member (DEL)"""
+
+
+class _Highest:
+    """Sorts after every member, for finding the end of a score"""
+
+    def __lt__(self, other) -> bool:
+        return False
+
+    def __gt__(self, other) -> bool:
+        return True
+
+
+_HIGHEST = _Highest()
+
+
+class InProcessSortedSet(SortedSet):
+    """
+    SortedSet held in memory, with (score, member) pairs in an IndexableSkipList.
+    Every operation is O(log n), plus O(k) for the k members a range returns.
+    Each call is atomic, as a Redis command is.
+    """
+
+    def __init__(self, members: Mapping[str, float] | None = None):
+        self._scores: dict[str, float] = {}
+        self._order = IndexableSkipList()
+        self._lock = threading.RLock()
+        if members:
+            self.add(members)
+
+    def add(self, members: Mapping[str, float], gt: bool = False) -> int:
+        with self._lock:
+            if not self._scores:
+                # Filling an empty set: sort once and build the list in one pass
+                self._scores = dict(members)
+                self._order = IndexableSkipList(
+                    sorted((score, member) for member, score in self._scores.items())
+                )
+                return len(self._scores)
+
+            added = 0
+            for member, score in members.items():
+                old = self._scores.get(member)
+                if old is None:
+                    added += 1
+                elif old == score or (gt and score <= old):
+                    continue
+                else:
+                    self._order.remove((old, member))
+
+                self._scores[member] = score
+                self._order.add((score, member))
+            return added
+
+    def increment(self, member: str, amount: float = 1) -> float:
+        with self._lock:
+            score = self._scores.get(member, 0) + amount
+            self.add({member: score})
+            return score
+
+    def remove(self, *members: str) -> int:
+        with self._lock:
+            removed = 0
+            for member in members:
+                score = self._scores.pop(member, None)
+                if score is not None:
+                    self._order.remove((score, member))
+                    removed += 1
+            return removed
+
+    def score(self, member: str) -> float | None:
+        return self._scores.get(member)
+
+    def rank(self, member: str, reverse: bool = False) -> int | None:
+        with self._lock:
+            score = self._scores.get(member)
+            if score is None:
+                return None
+
+            rank = self._order.index((score, member))
+            return len(self._scores) - 1 - rank if reverse else rank
+
+    def range_by_rank(
+        self, start: int, stop: int, reverse: bool = False
+    ) -> list[tuple[str, float]]:
+        with self._lock:
+            size = len(self._scores)
+            start = max(start + size if start < 0 else start, 0)
+            stop = min(stop + size if stop < 0 else stop, size - 1)
+            if start > stop:
+                return []
+
+            if reverse:
+                keys = self._order.slice(size - 1 - stop, size - start)
+                keys.reverse()
+            else:
+                keys = self._order.slice(start, stop + 1)
+            return [(member, score) for score, member in keys]
+
+    def range_by_score(
+        self,
+        min_score: float,
+        max_score: float,
+        reverse: bool = False,
+        offset: int = 0,
+        count: int | None = None,
+    ) -> list[tuple[str, float]]:
+        with self._lock:
+            low, high = self._score_bounds(min_score, max_score)
+            if reverse:
+                stop = high - offset
+                start = stop - count if count is not None else low
+                keys = self._order.slice(max(start, low), stop)
+                keys.reverse()
+            else:
+                start = low + offset
+                stop = start + count if count is not None else high
+                keys = self._order.slice(start, min(stop, high))
+            return [(member, score) for score, member in keys]
+
+    def count(self, min_score: float, max_score: float) -> int:
+        with self._lock:
+            low, high = self._score_bounds(min_score, max_score)
+            return max(high - low, 0)
+
+    def _score_bounds(self, min_score: float, max_score: float) -> tuple[int, int]:
+        """Positions of the first member scoring min_score or more, and one past
+        the last member scoring max_score or less"""
+        return (
+            self._order.bisect_left((min_score, "")),
+            self._order.bisect_left((max_score, _HIGHEST)),
+        )
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def clear(self):
+        with self._lock:
+            self._scores = {}
+            self._order = IndexableSkipList()
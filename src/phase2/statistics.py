@@ -1,16 +1,27 @@
+from bisect import bisect_right
 from datetime import date, timedelta
+from typing import Iterator
 
 from shared.database import Base, get_db
-from sqlalchemy import select
+from sqlalchemy import ForeignKey, Index, case, cast, func, insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Mapped, Session, mapped_column
-from sqlalchemy.types import Boolean, Date, Integer, Interval, String
+from sqlalchemy.types import Boolean, Date, Float, Integer, Interval, String
 
-from phase2.leaderboard import Leaderboard
-from phase2.round import RoundStats
+from phase2.leaderboard import CachedEntry, Leaderboard, LeaderboardCache, get_leaderboard_cache
+from phase2.round import RoundStats, unpack_guess_log
+
+# Whether add_round updates leaderboard entries with INSERT ... ON CONFLICT ... RETURNING.
+# Needs the unique index on leaderboard_entry.user_id (see phase2.indexes).
+UPSERT_LEADERBOARD = False
 
 
 class RoundStatistics(Base):
     __tablename__ = "round_statistics"
+    __table_args__ = (
+        # Also serves lookups by user_id alone
+        Index("ix_round_statistics_user_mode_date", "user_id", "mode", "daily_date"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)  # entry id
     user_id: Mapped[int] = mapped_column(Integer, nullable=False)  # user id to users table
@@ -24,6 +35,90 @@ class RoundStatistics(Base):
     survival_streak: Mapped[int] = mapped_column(Integer, nullable=False)
 
 
+class GuessEvent(Base):
+    __tablename__ = "guess_events"
+
+    round_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("round_statistics.id", ondelete="CASCADE"), primary_key=True
+    )  # round this guess was made in
+    guess_index: Mapped[int] = mapped_column(Integer, primary_key=True)  # 0 for the first guess
+    country_id: Mapped[str] = mapped_column(String(64), nullable=False)  # catalog name
+    feedback: Mapped[int] = mapped_column(Integer, nullable=False)  # GuessFeedback.pack() code
+    time_offset: Mapped[int] = mapped_column(
+        Integer, nullable=False
+    )  # milliseconds between the start of the round and the guess
+
+
+class UserStatsAggregate(Base):
+    """
+    Running totals of a user's rounds, kept up to date by add_round so their
+    leaderboard stats don't need every round they've played to work out
+    """
+
+    __tablename__ = "user_stats_aggregate"
+
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    daily_rounds: Mapped[int] = mapped_column(Integer, nullable=False)
+    daily_guesses_total: Mapped[int] = mapped_column(Integer, nullable=False)
+    daily_time_total: Mapped[timedelta] = mapped_column(Interval, nullable=False)
+    daily_streak: Mapped[int] = mapped_column(Integer, nullable=False)  # wins since last loss
+    longest_daily_streak: Mapped[int] = mapped_column(Integer, nullable=False)
+    last_daily_date: Mapped[date | None] = mapped_column(Date, nullable=True)
+    survival_rounds: Mapped[int] = mapped_column(Integer, nullable=False)
+    longest_survival_streak: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    @classmethod
+    def empty(cls, user_id: int) -> "UserStatsAggregate":
+        return cls(
+            user_id=user_id,
+            daily_rounds=0,
+            daily_guesses_total=0,
+            daily_time_total=timedelta(),
+            daily_streak=0,
+            longest_daily_streak=0,
+            last_daily_date=None,
+            survival_rounds=0,
+            longest_survival_streak=0,
+        )
+
+    def add(self, round_row: RoundStatistics):
+        """
+        Adds a round played on or after last_daily_date to the totals
+        """
+        if round_row.mode == "daily":
+            self.daily_rounds += 1
+            self.daily_guesses_total += round_row.guesses
+            self.daily_time_total += round_row.round_length
+            self.last_daily_date = round_row.daily_date
+
+            if round_row.won:
+                self.daily_streak += 1
+                self.longest_daily_streak = max(self.longest_daily_streak, self.daily_streak)
+            else:
+                self.daily_streak = 0
+
+        elif round_row.mode == "survival":
+            self.survival_rounds += 1
+            self.longest_survival_streak = max(
+                self.longest_survival_streak, round_row.survival_streak
+            )
+
+    def to_stats(self) -> "LeaderboardStats":
+        return LeaderboardStats(
+            user_id=self.user_id,
+            daily_streak=self.daily_streak,
+            longest_daily_streak=self.longest_daily_streak,
+            average_daily_guesses=(
+                self.daily_guesses_total / self.daily_rounds if self.daily_rounds else 0
+            ),
+            average_daily_time=(
+                self.daily_time_total / self.daily_rounds if self.daily_rounds else timedelta()
+            ),
+            longest_survival_streak=self.longest_survival_streak,
+            score=self.longest_survival_streak + self.longest_daily_streak,
+        )
+
+
 # non ORM LeaderboardStats class
 class LeaderboardStats:
     def __init__(
@@ -46,42 +141,104 @@ class LeaderboardStats:
 
 
 class RoundStatisticsRepository:
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, leaderboard_cache: LeaderboardCache | None = None):
         self.session = session
+        # Kept up to date with the leaderboard entries recorded rounds change
+        self.leaderboard_cache = leaderboard_cache
 
     async def add_round(
-        self, round_stats: RoundStats, survival_streak: int = None
+        self,
+        round_stats: RoundStats,
+        survival_streak: int = None,
+        upsert: bool = UPSERT_LEADERBOARD,
     ) -> RoundStatistics:
         """
         Receives statistics for a round from the game,
         updates the user's stats table accordingly and
         returns the RoundStatistics instance
         """
-        if round_stats.mode != "survival":
-            survival_streak = 0
+        return self.record_rounds([(round_stats, survival_streak)], upsert)[0]
 
-        daily_date = date(
-            round_stats.start_time.year, round_stats.start_time.month, round_stats.start_time.day
-        )
+    def record_rounds(
+        self,
+        rounds: list[tuple[RoundStats, int | None]],
+        upsert: bool = UPSERT_LEADERBOARD,
+    ) -> list[RoundStatistics]:
+        """
+        Records a batch of (round stats, survival streak) pairs. The rounds, their
+        guesses, the users' aggregates and their leaderboard entries are written
+        in one transaction, with one flush and one commit. See
+        Leaderboard.stage_entry for upsert.
+        """
+        round_rows = []
+        aggregates: dict[int, UserStatsAggregate] = {}
 
-        round_row = RoundStatistics(
-            user_id=round_stats.user_id,
-            round_length=round_stats.round_length,
-            won=round_stats.won,
-            guesses=round_stats.guesses,
-            mode=round_stats.mode,
-            daily_date=daily_date,
-            survival_streak=survival_streak,
-        )
+        # Nothing is flushed until everything for the batch has been staged
+        with self.session.no_autoflush:
+            for round_stats, survival_streak in rounds:
+                if round_stats.mode != "survival":
+                    survival_streak = 0
 
-        self.session.add(round_row)  # log the round stats
+                daily_date = date(
+                    round_stats.start_time.year,
+                    round_stats.start_time.month,
+                    round_stats.start_time.day,
+                )
 
-        lb_repo = Leaderboard(self.session)
-        lb_repo.stats_repo = self
-        await lb_repo.sync_user_entry(round_stats.user_id)
+                round_row = RoundStatistics(
+                    user_id=round_stats.user_id,
+                    round_length=round_stats.round_length,
+                    won=round_stats.won,
+                    guesses=round_stats.guesses,
+                    mode=round_stats.mode,
+                    daily_date=daily_date,
+                    survival_streak=survival_streak,
+                )
+                self.session.add(round_row)  # log the round stats
+                round_rows.append(round_row)
+                aggregates[round_row.user_id] = self._update_aggregate(round_row, aggregates)
 
-        self.session.commit()
-        return round_row
+            leaderboard = Leaderboard(self.session, self)
+            entries = [
+                leaderboard.stage_entry(aggregate.to_stats(), upsert=upsert)
+                for aggregate in aggregates.values()
+            ]
+
+        try:
+            self.session.flush()
+        except IntegrityError:
+            self.session.rollback()
+            raise
+        if self.leaderboard_cache is not None:
+            # Copied now, as committing expires them
+            entries = [CachedEntry.from_entry(entry) for entry in entries]
+
+        # All of the guesses go in one insert, now that the rounds have ids
+        guess_events = [
+            {
+                "round_id": round_row.id,
+                "guess_index": index,
+                "country_id": country_id,
+                "feedback": feedback,
+                "time_offset": time_offset,
+            }
+            for round_row, (round_stats, _) in zip(round_rows, rounds)
+            for index, (country_id, feedback, time_offset) in enumerate(
+                unpack_guess_log(round_stats.guess_log)
+            )
+        ]
+        if guess_events:
+            self.session.execute(insert(GuessEvent), guess_events)
+
+        try:
+            self.session.commit()
+        except IntegrityError:
+            self.session.rollback()
+            raise
+
+        if self.leaderboard_cache is not None:
+            self.leaderboard_cache.update(entries)
+        return round_rows
 
     def get_daily_round(self, user_id: int, day: date) -> RoundStatistics:
         """
@@ -94,72 +251,301 @@ class RoundStatisticsRepository:
         )
         return self.session.execute(statement).scalars().one_or_none()
 
-    def get_leaderboard_stats_for_user(self, user_id: int) -> LeaderboardStats | None:
+    def get_guess_events(self, round_id: int) -> list[GuessEvent]:
+        """
+        Get the guesses made in a round, in order
         """
-        Grab and put RoundStatistics rows for this user into a single
-        LeaderboardStats object (same shape as FakeStats in tests).
+        statement = (
+            select(GuessEvent)
+            .where(GuessEvent.round_id == round_id)
+            .order_by(GuessEvent.guess_index)
+        )
+        return list(self.session.execute(statement).scalars())
+
+    def stream_guess_events(
+        self, mode: str | None = None, since: date | None = None, batch_size: int = 1000
+    ) -> Iterator[GuessEvent]:
+        """
+        Yields every guess (optionally only from rounds of one mode, or on or after
+        a date) ordered by round and guess, fetching batch_size rows at a time
+        so analytics jobs don't load the whole table at once
         """
-        statement = select(RoundStatistics).where(RoundStatistics.user_id == user_id)
-        rounds = self.session.execute(statement).scalars().all()
+        statement = (
+            select(GuessEvent)
+            .join(RoundStatistics, RoundStatistics.id == GuessEvent.round_id)
+            .order_by(GuessEvent.round_id, GuessEvent.guess_index)
+            .execution_options(yield_per=batch_size)
+        )
+        if mode is not None:
+            statement = statement.where(RoundStatistics.mode == mode)
+        if since is not None:
+            statement = statement.where(RoundStatistics.daily_date >= since)
+
+        yield from self.session.execute(statement).scalars()
+
+    def _update_aggregate(
+        self,
+        round_row: RoundStatistics,
+        staged: dict[int, UserStatsAggregate] | None = None,
+    ) -> UserStatsAggregate:
+        """
+        Adds a new, not yet flushed round to its user's aggregate. Rounds that
+        arrive out of date order (and users with no aggregate yet) are handled
+        by rebuilding the aggregate from their rounds. staged holds aggregates
+        already updated for earlier rounds in the same batch.
+        """
+        user_id = round_row.user_id
+        aggregate = (staged or {}).get(user_id) or self.session.get(UserStatsAggregate, user_id)
+
+        if aggregate is None or (
+            round_row.mode == "daily"
+            and aggregate.last_daily_date is not None
+            and round_row.daily_date < aggregate.last_daily_date
+        ):
+            if staged and user_id in staged:
+                # Earlier rounds for the user in this batch have to be flushed to
+                # be included in the rebuild
+                self.session.flush()
+                return self.rebuild_aggregate(user_id)
+            return self.rebuild_aggregate(user_id, pending=round_row)
+
+        aggregate.add(round_row)
+        return aggregate
+
+    def rebuild_aggregate(
+        self, user_id: int, pending: RoundStatistics | None = None
+    ) -> UserStatsAggregate | None:
+        """
+        Recomputes a user's aggregate (see compute_aggregate()) and stages it in
+        the session, to be written with the next commit
+        """
+        aggregate = self.compute_aggregate(user_id, pending)
+        if aggregate is None:
+            return None
+        return self.session.merge(aggregate)
+
+    def compute_aggregate(
+        self, user_id: int, pending: RoundStatistics | None = None
+    ) -> UserStatsAggregate | None:
+        """
+        Computes a user's aggregate from all of their rounds (plus a pending
+        round that hasn't been flushed yet), without adding it to the session.
+        Returns None if they haven't played any.
+        """
+        statement = (
+            select(RoundStatistics)
+            .where(RoundStatistics.user_id == user_id)
+            .order_by(RoundStatistics.daily_date, RoundStatistics.id)
+        )
+        rounds = list(self.session.execute(statement).scalars())
+        if pending is not None:
+            # The pending round is the newest, so it goes after every round on its date
+            position = bisect_right([r.daily_date for r in rounds], pending.daily_date)
+            rounds.insert(position, pending)
 
         if not rounds:
             return None
 
-        daily_rounds = [r for r in rounds if r.mode == "daily"]
-        survival_rounds = [r for r in rounds if r.mode == "survival"]
-
-        daily_streak = 0
-        longest_daily_streak = 0
-        average_daily_guesses = 0
-        average_daily_time = timedelta()
-
-        if daily_rounds:
-            # get rounds sorted by date to check streaks
-            daily_rounds_sorted = sorted(daily_rounds, key=lambda r: r.daily_date)
-
-            # count current streak (ending at most recent day) and longest streak (of all time)
-            current = 0
-            for r in reversed(daily_rounds_sorted):
-                average_daily_guesses += r.guesses
-                average_daily_time += r.round_length
-                if r.won:
-                    current += 1
-                    if current > longest_daily_streak:
-                        longest_daily_streak = current
-                else:
-                    # Update the daily streak once when we reach the day it started
-                    if not daily_streak:
-                        daily_streak = current
-                    current = 0
-
-            # Update the daily streak if it wasn't updated in the loop
-            if not daily_streak and daily_rounds_sorted[-1].won:
-                daily_streak = current
-
-            average_daily_guesses /= len(daily_rounds)
-            average_daily_time /= len(daily_rounds)
-        else:
-            average_daily_guesses = 0
-            average_daily_time = timedelta()
-
-        longest_survival_streak = 0
-        for r in survival_rounds:
-            if r.survival_streak > longest_survival_streak:
-                longest_survival_streak = r.survival_streak
-
-        score = longest_survival_streak + longest_daily_streak
+        aggregate = UserStatsAggregate.empty(user_id)
+        for round_row in rounds:
+            aggregate.add(round_row)
+        return aggregate
 
-        return LeaderboardStats(
-            user_id=user_id,
-            daily_streak=daily_streak,
-            longest_daily_streak=longest_daily_streak,
-            average_daily_guesses=average_daily_guesses,
-            average_daily_time=average_daily_time,
-            longest_survival_streak=longest_survival_streak,
-            score=score,
+    def _interval_seconds(self, column):
+        """
+        SQL expression for the number of seconds in an Interval column.
+        SQLite has no interval type, so SQLAlchemy stores them as datetime strings
+        after the epoch ("1970-01-01 00:00:30.000000"): whole seconds come from
+        strftime, and the fraction from the end of the string.
+        """
+        if self.session.get_bind().dialect.name == "sqlite":
+            whole = cast(func.strftime("%s", column), Integer)
+            return whole + cast(func.substr(column, 20), Float)
+        return func.extract("epoch", column)
+
+    def compute_all_aggregates(self) -> dict[int, UserStatsAggregate]:
+        """
+        Computes every user's aggregate from their rounds in one query, without
+        touching the stored aggregates.
+
+        Streaks are found with gaps-and-islands: numbering each daily round by
+        the losses up to and including it puts every run of wins in its own
+        island, and the current streak is the island after the user's last loss.
+        """
+        rounds = RoundStatistics
+        lost = case((rounds.won, 0), else_=1)
+
+        daily = (
+            select(
+                rounds.user_id,
+                rounds.won,
+                rounds.guesses,
+                rounds.daily_date,
+                self._interval_seconds(rounds.round_length).label("seconds"),
+                func.sum(lost)
+                .over(partition_by=rounds.user_id, order_by=(rounds.daily_date, rounds.id))
+                .label("island"),
+            )
+            .where(rounds.mode == "daily")
+            .cte("daily")
+        )
+        islands = (
+            select(daily.c.user_id, daily.c.island, func.count().label("length"))
+            .where(daily.c.won)
+            .group_by(daily.c.user_id, daily.c.island)
+            .cte("islands")
+        )
+        longest = (
+            select(islands.c.user_id, func.max(islands.c.length).label("longest"))
+            .group_by(islands.c.user_id)
+            .cte("longest")
+        )
+        daily_totals = (
+            select(
+                daily.c.user_id,
+                func.count().label("rounds"),
+                func.sum(daily.c.guesses).label("guesses"),
+                func.sum(daily.c.seconds).label("seconds"),
+                func.max(daily.c.daily_date).label("last_date"),
+                func.sum(case((daily.c.won, 0), else_=1)).label("losses"),
+            )
+            .group_by(daily.c.user_id)
+            .cte("daily_totals")
+        )
+        current = (
+            select(islands.c.user_id, islands.c.length)
+            .join(
+                daily_totals,
+                (daily_totals.c.user_id == islands.c.user_id)
+                & (daily_totals.c.losses == islands.c.island),
+            )
+            .cte("current")
+        )
+        survival = (
+            select(
+                rounds.user_id,
+                func.count().label("rounds"),
+                func.max(rounds.survival_streak).label("longest"),
+            )
+            .where(rounds.mode == "survival")
+            .group_by(rounds.user_id)
+            .cte("survival")
+        )
+        users = (
+            select(rounds.user_id)
+            .where(rounds.mode.in_(("daily", "survival")))
+            .distinct()
+            .cte("users")
+        )
+
+        statement = (
+            select(
+                users.c.user_id,
+                daily_totals.c.rounds,
+                daily_totals.c.guesses,
+                daily_totals.c.seconds,
+                daily_totals.c.last_date,
+                current.c.length,
+                longest.c.longest,
+                survival.c.rounds,
+                survival.c.longest,
+            )
+            .outerjoin(daily_totals, daily_totals.c.user_id == users.c.user_id)
+            .outerjoin(current, current.c.user_id == users.c.user_id)
+            .outerjoin(longest, longest.c.user_id == users.c.user_id)
+            .outerjoin(survival, survival.c.user_id == users.c.user_id)
+        )
+
+        aggregates = {}
+        for row in self.session.execute(statement):
+            (
+                user_id,
+                daily_rounds,
+                daily_guesses,
+                daily_seconds,
+                last_daily_date,
+                daily_streak,
+                longest_daily_streak,
+                survival_rounds,
+                longest_survival_streak,
+            ) = row
+            aggregates[user_id] = UserStatsAggregate(
+                user_id=user_id,
+                daily_rounds=daily_rounds or 0,
+                daily_guesses_total=daily_guesses or 0,
+                daily_time_total=timedelta(seconds=round(float(daily_seconds or 0), 6)),
+                daily_streak=daily_streak or 0,
+                longest_daily_streak=longest_daily_streak or 0,
+                last_daily_date=last_daily_date,
+                survival_rounds=survival_rounds or 0,
+                longest_survival_streak=longest_survival_streak or 0,
+            )
+        return aggregates
+
+    def verify_aggregates(self) -> list[int]:
+        """
+        Cross-checks the stored aggregates against compute_all_aggregates(), and
+        returns the ids of users whose aggregate is missing or doesn't match
+        """
+        expected = self.compute_all_aggregates()
+        stored = {
+            aggregate.user_id: aggregate
+            for aggregate in self.session.execute(select(UserStatsAggregate)).scalars()
+        }
+
+        mismatched = []
+        for user_id in sorted(expected.keys() | stored.keys()):
+            if not _same_aggregate(expected.get(user_id), stored.get(user_id)):
+                mismatched.append(user_id)
+        return mismatched
+
+    def backfill_aggregates(self) -> int:
+        """
+        Replaces every user's stored aggregate with one computed from their rounds.
+        Returns the number of users backfilled.
+        """
+        aggregates = self.compute_all_aggregates()
+        for aggregate in aggregates.values():
+            self.session.merge(aggregate)
+        self.session.commit()
+        return len(aggregates)
+
+    def get_leaderboard_stats_for_user(self, user_id: int) -> LeaderboardStats | None:
+        """
+        Get a user's stats from their aggregate, computing it from their rounds
+        if it hasn't been stored yet (a read never writes it, the next round the
+        user records or a backfill does). Returns None if they haven't played any
+        rounds.
+        """
+        aggregate = self.session.get(UserStatsAggregate, user_id)
+        if aggregate is None:
+            aggregate = self.compute_aggregate(user_id)
+            if aggregate is None:
+                return None
+
+        return aggregate.to_stats()
+
+
+def _same_aggregate(a: UserStatsAggregate | None, b: UserStatsAggregate | None) -> bool:
+    if a is None or b is None:
+        return a is b
+
+    # Interval sums done in SQL go through floating point seconds
+    time_difference = abs(a.daily_time_total - b.daily_time_total)
+    return time_difference < timedelta(milliseconds=1) and all(
+        getattr(a, field) == getattr(b, field)
+        for field in (
+            "daily_rounds",
+            "daily_guesses_total",
+            "daily_streak",
+            "longest_daily_streak",
+            "last_daily_date",
+            "survival_rounds",
+            "longest_survival_streak",
         )
+    )
 
 
 def get_statistics_repository() -> RoundStatisticsRepository:
     db = get_db()
-    return RoundStatisticsRepository(db)
+    return RoundStatisticsRepository(db, leaderboard_cache=get_leaderboard_cache())
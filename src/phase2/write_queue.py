@@ -0,0 +1,386 @@
+"""
+Write-behind queue for finished rounds, so players see their results without
+waiting for the database.
+
+Rounds are put on a bounded queue and written in batches by a background worker,
+off the event loop. If a spool directory is configured, queued rounds are also
+appended to segment files in it. A segment is closed once it holds a batch worth
+of rounds or the worker takes rounds from it, batches never span two segments,
+and a segment is only deleted once every round in it has been committed.
+Segments left behind when the server stops are replayed on the next start (so a
+crash between a commit and the segment's deletion records those rounds twice).
+
+Rounds that fail to write are retried with a backoff, and if they still fail
+they're moved to a segment of their own to be retried on the next start.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable
+
+from phase2.round import RoundStats, pack_guess_log, unpack_guess_log
+from phase2.statistics import RoundStatisticsRepository
+
+logger = logging.getLogger("phase2.write_queue")
+
+# Rounds that can wait to be written before put() starts waiting for room
+QUEUE_SIZE = 1000
+# Most rounds written in one transaction
+BATCH_SIZE = 50
+# Times a batch that failed to write is retried before its rounds are left in the spool
+RETRIES = 3
+# Seconds before the first retry, doubling for each one after that
+RETRY_DELAY = 1.0
+
+
+def round_to_record(round_stats: RoundStats, survival_streak: int | None) -> dict:
+    """
+    The parts of a finished round that get stored, as JSON-friendly values
+    """
+    return {
+        "mode": round_stats.mode,
+        "user_id": round_stats.user_id,
+        "won": round_stats.won,
+        "guesses": round_stats.guesses,
+        "start_time": round_stats.start_time.isoformat(),
+        "round_length": round_stats.round_length.total_seconds(),
+        "guess_log": unpack_guess_log(round_stats.guess_log),
+        "survival_streak": survival_streak,
+    }
+
+
+def record_to_round(record: dict) -> tuple[RoundStats, int | None]:
+    round_stats = RoundStats(mode=record["mode"], user_id=record["user_id"])
+    round_stats.won = record["won"]
+    round_stats.guesses = record["guesses"]
+    round_stats.start_time = datetime.fromisoformat(record["start_time"])
+    round_stats.round_length = timedelta(seconds=record["round_length"])
+    round_stats.guess_log = pack_guess_log(record["guess_log"])
+    return round_stats, record["survival_streak"]
+
+
+# A queued round, its survival streak and the spool segment it's in
+_QueuedRound = tuple[RoundStats, int | None, Path | None]
+
+
+class WriteQueueMetrics:
+    """
+    Counters for how the queue is keeping up with finished rounds
+    """
+
+    def __init__(self):
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.max_depth = 0
+        # put() calls that had to wait for room in the queue, and how long they waited
+        self.blocked_puts = 0
+        self.blocked_seconds = 0.0
+        self.last_batch_size = 0
+        self.last_batch_seconds = 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.enqueued} rounds queued, {self.written} written, {self.failed} failed "
+            f"in {self.batches} batches (last: {self.last_batch_size} rounds in "
+            f"{self.last_batch_seconds * 1000:.1f}ms), deepest queue {self.max_depth}, "
+            f"{self.blocked_puts} puts blocked for {self.blocked_seconds:.2f}s"
+        )
+
+
+class RoundWriteQueue:
+    """
+    Queues finished rounds and records them in batches with
+    RoundStatisticsRepository.record_rounds from a background worker.
+
+    Until start() is called (see main.py), put() records each round straight away.
+    """
+
+    def __init__(
+        self,
+        repository_factory: Callable[[], RoundStatisticsRepository],
+        max_size: int = QUEUE_SIZE,
+        batch_size: int = BATCH_SIZE,
+        spool: Path | None = None,
+        sync_spool: bool = False,
+        retries: int = RETRIES,
+        retry_delay: float = RETRY_DELAY,
+    ):
+        self.repository_factory = repository_factory
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.spool = spool
+        self.sync_spool = sync_spool
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.metrics = WriteQueueMetrics()
+
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        # A round taken from the queue that belongs in the next batch
+        self._carried: _QueuedRound | None = None
+
+        # Segment rounds are being appended to, how many it holds, and the
+        # number of rounds in each segment that haven't been written yet
+        self._segment: Path | None = None
+        self._segment_size = 0
+        self._next_segment = 0
+        self._unwritten: dict[Path, int] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    @property
+    def depth(self) -> int:
+        """Number of rounds waiting to be written"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        """
+        Starts the background worker on the running event loop, first queueing
+        any rounds left in the spool
+        """
+        if self.running:
+            return
+
+        segments = self._read_spool()
+        recovered = sum(len(records) for _, records in segments)
+        # Left over rounds can go over the limit rather than block startup
+        self._queue = asyncio.Queue(max(self.max_size, recovered))
+        self._carried = None
+        self._segment = None
+        self._unwritten = {}
+        for path, records in segments:
+            if not records:
+                path.unlink(missing_ok=True)
+                continue
+            self._unwritten[path] = len(records)
+            for record in records:
+                round_stats, survival_streak = record_to_round(record)
+                self._queue.put_nowait((round_stats, survival_streak, path))
+        if recovered:
+            logger.info(f"Recovered {recovered} unwritten rounds from {self.spool}")
+
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Waits for every queued round to be written, then stops the worker. If
+        the worker has died, rounds it didn't get to are left in the spool.
+        """
+        if self._worker is None:
+            return
+
+        if not self._worker.done():
+            joined = asyncio.create_task(self._queue.join())
+            await asyncio.wait({joined, self._worker}, return_when=asyncio.FIRST_COMPLETED)
+            joined.cancel()
+            self._worker.cancel()
+
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception(f"Round writer died with {self.depth} rounds left unwritten")
+        self._worker = None
+        logger.info(f"Round writer stopped: {self.metrics}")
+
+    async def put(self, round_stats: RoundStats, survival_streak: int | None = None):
+        """
+        Queues a finished round to be recorded. Only waits if the queue is full.
+        """
+        self.metrics.enqueued += 1
+
+        if not self.running:
+            repository = self.repository_factory()
+            await repository.add_round(round_stats, survival_streak=survival_streak)
+            self.metrics.written += 1
+            return
+
+        try:
+            segment = self._append_to_spool(round_stats, survival_streak)
+        except OSError:
+            # Still worth queueing, it just won't survive the server stopping first
+            logger.exception("Error spooling round, queueing it without a spool copy")
+            segment = None
+
+        item = (round_stats, survival_streak, segment)
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.metrics.blocked_puts += 1
+            start = time.perf_counter()
+            await self._queue.put(item)
+            self.metrics.blocked_seconds += time.perf_counter() - start
+
+        self.metrics.max_depth = max(self.metrics.max_depth, self.depth)
+
+    async def _next_batch(self) -> list["_QueuedRound"]:
+        """
+        Takes the next batch of rounds off the queue, all from the same segment
+        """
+        if self._carried is not None:
+            batch, self._carried = [self._carried], None
+        else:
+            batch = [await self._queue.get()]
+
+        segment = batch[0][2]
+        while len(batch) < self.batch_size and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item[2] != segment:
+                self._carried = item
+                break
+            batch.append(item)
+
+        if segment is not None and segment == self._segment:
+            # Rounds put from now on go in a new segment, so this one is written whole
+            self._segment = None
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+
+            start = time.perf_counter()
+            try:
+                failed = await asyncio.to_thread(self._write, batch)
+                delay = self.retry_delay
+                for _ in range(self.retries):
+                    if not failed:
+                        break
+                    await asyncio.sleep(delay)
+                    delay *= 2
+                    failed = await asyncio.to_thread(self._write, failed)
+
+                if failed:
+                    self.metrics.failed += len(failed)
+                    logger.error(f"Giving up on writing {len(failed)} rounds for now")
+                # The batch's segment can only go once its failed rounds are kept elsewhere
+                if not failed or self._keep_failed(failed):
+                    self._release(batch)
+            finally:
+                self.metrics.batches += 1
+                self.metrics.last_batch_size = len(batch)
+                self.metrics.last_batch_seconds = time.perf_counter() - start
+
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch: list["_QueuedRound"]) -> list["_QueuedRound"]:
+        """
+        Records a batch, falling back to one round at a time if the batch fails
+        so one bad round doesn't hold back the rest. Returns the rounds that
+        couldn't be recorded.
+        """
+        repository = None
+        try:
+            repository = self.repository_factory()
+            repository.record_rounds([(round_stats, streak) for round_stats, streak, _ in batch])
+            self.metrics.written += len(batch)
+            return []
+        except Exception:
+            if repository is not None:
+                repository.session.rollback()
+            if len(batch) == 1:
+                logger.exception("Error recording round")
+                return batch
+            logger.exception(f"Error recording a batch of {len(batch)} rounds, retrying each")
+
+        failed = []
+        for item in batch:
+            failed.extend(self._write([item]))
+        return failed
+
+    def _segment_path(self) -> Path:
+        path = self.spool / f"{self._next_segment:012d}.jsonl"
+        self._next_segment += 1
+        return path
+
+    def _append_to_spool(self, round_stats: RoundStats, survival_streak: int | None) -> Path | None:
+        """
+        Appends a round to the open segment, opening a new one if needed.
+        Returns the segment it went in.
+        """
+        if self.spool is None:
+            return None
+
+        if self._segment is None or self._segment_size >= self.batch_size:
+            self._segment = self._segment_path()
+            self._segment_size = 0
+
+        self.spool.mkdir(parents=True, exist_ok=True)
+        with open(self._segment, "a") as file:
+            file.write(json.dumps(round_to_record(round_stats, survival_streak)) + "\n")
+            if self.sync_spool:
+                file.flush()
+                os.fsync(file.fileno())
+
+        self._segment_size += 1
+        self._unwritten[self._segment] = self._unwritten.get(self._segment, 0) + 1
+        return self._segment
+
+    def _keep_failed(self, failed: list["_QueuedRound"]) -> bool:
+        """
+        Copies rounds that couldn't be written to a segment of their own, which
+        isn't replayed until the next start. Returns False if they couldn't be
+        copied, in which case their original segments have to be kept.
+        """
+        if self.spool is None:
+            return True
+
+        path = self._segment_path()
+        try:
+            with open(path, "w") as file:
+                for round_stats, survival_streak, _ in failed:
+                    file.write(json.dumps(round_to_record(round_stats, survival_streak)) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+        except OSError:
+            logger.exception(f"Error keeping unwritten rounds in {path}")
+            return False
+        return True
+
+    def _release(self, batch: list["_QueuedRound"]):
+        """
+        Deletes segments once every round in them has been dealt with
+        """
+        for _, _, segment in batch:
+            if segment is None:
+                continue
+            self._unwritten[segment] -= 1
+            if not self._unwritten[segment]:
+                del self._unwritten[segment]
+                segment.unlink(missing_ok=True)
+
+    def _read_spool(self) -> list[tuple[Path, list[dict]]]:
+        """
+        Every segment in the spool, oldest first, with the rounds in it
+        """
+        if self.spool is None or not self.spool.is_dir():
+            return []
+
+        segments = []
+        for path in sorted(self.spool.glob("*.jsonl")):
+            if not path.stem.isdigit():
+                continue
+
+            records = []
+            for line in path.read_text().splitlines():
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # Most likely a line cut short by a crash
+                    logger.warning(f"Skipping unreadable line in {path}")
+            segments.append((path, records))
+
+        if segments:
+            self._next_segment = max(self._next_segment, int(segments[-1][0].stem) + 1)
+        return segments
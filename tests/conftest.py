@@ -0,0 +1,12 @@
+import os
+import shutil
+import tempfile
+
+# Set before any of the app's modules are imported, so caches, spools and
+# snapshots written while testing don't end up in the checkout
+_data_dir = tempfile.mkdtemp(prefix="phase2-test-data-")
+os.environ["PHASE2_DATA_DIR"] = _data_dir
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_data_dir, ignore_errors=True)
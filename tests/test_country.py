@@ -1,18 +1,16 @@
-from countryinfo import CountryInfo
-
-from phase2.country import Country, get_country, get_random_country, map_to_country_obj
-
-
-def test_map_to_country_obj():
-    obj = CountryInfo("Canada")
-
-    country = map_to_country_obj(obj)
+import random
 
-    assert isinstance(country, Country)
+from countryinfo import CountryInfo
 
-    assert country.name == obj.name()
-    assert country.population == obj.population()
-    assert country.size == obj.area()
+from phase2.country import (
+    BitInterner,
+    Country,
+    CountryCatalog,
+    get_catalog,
+    get_country,
+    get_random_country,
+    verify_country,
+)
 
 
 def test_get_country_valid_name():
@@ -33,3 +31,92 @@ def test_get_random_country():
 
     assert isinstance(country, Country)
     assert country.name != ""
+
+
+def test_catalog_lookup_is_case_insensitive():
+    catalog = get_catalog()
+
+    assert catalog.get("Canada") is catalog.get(" canada ")
+    assert "CANADA" in catalog
+
+
+def test_catalog_alternative_spellings():
+    catalog = CountryCatalog()
+
+    assert catalog.get("USA").name == "united states"
+
+
+def test_catalog_skips_countries_missing_fields():
+    catalog = CountryCatalog(
+        {
+            "testland": {
+                "name": "Testland",
+                "population": 1,
+                "area": 2,
+                "region": "Europe",
+                "languages": ["en"],
+                "currencies": ["EUR"],
+                "timezones": ["UTC"],
+                "altSpellings": ["TL"],
+            },
+            "wales": {"name": "Wales"},
+        }
+    )
+
+    assert len(catalog) == 1
+    assert catalog.get("tl").name == "testland"
+    assert catalog.get("wales") is None
+
+
+def test_catalog_stats():
+    stats = CountryCatalog().stats()
+
+    assert stats.countries > 200
+    assert stats.load_seconds > 0
+    assert stats.memory_bytes > 0
+    assert "countries" in str(stats)
+
+
+def test_get_catalog_is_shared():
+    assert get_catalog() is get_catalog()
+
+
+def test_eligible_pool_excludes_incomplete_countries():
+    pool = get_catalog().eligible
+
+    assert get_country("canada") in pool
+    assert get_country("greenland") not in pool
+    assert pool.excluded["greenland"] == ("timezones",)
+    assert "population" in pool.excluded["wales"]
+
+
+def test_eligible_pool_draw():
+    pool = get_catalog().eligible
+
+    country = pool.draw(random.Random(1))
+
+    assert country in pool
+    assert pool.countries[pool.index(country)] is country
+    assert country is pool.draw(random.Random(1))
+
+
+def test_verify_country():
+    assert verify_country(CountryInfo("Canada"))
+    assert not verify_country(CountryInfo("Greenland"))
+
+
+def test_bit_interner_masks():
+    interner = BitInterner()
+
+    assert interner.mask(None) == 0
+    assert interner.mask(["en", "fr"]) == interner.mask(["fr", "en"])
+    assert interner.mask(["en"]) & interner.mask(["en", "fr"])
+    assert not interner.mask(["de"]) & interner.mask(["en", "fr"])
+    assert len(interner) == 3
+
+
+def test_country_masks():
+    country = get_country("canada")
+
+    assert country.language_mask
+    assert country.language_mask != get_country("united states").language_mask
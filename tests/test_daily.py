@@ -3,11 +3,19 @@ Tests all execution paths in game/daily.py. Notably, compare_countries() does no
 since every path it can take it covered by the handle_guess() tests.
 """
 
+import random
+from datetime import date
 from unittest.mock import MagicMock, patch
 
 import pytest
 
-from game.daily import end_game, get_daily_country, handle_guess
+from game.daily import (
+    compare_countries,
+    end_game,
+    get_daily_country,
+    handle_guess,
+    pick_daily_country,
+)
 from phase2.country import Country, get_country
 from phase2.round import RoundStats
 from phase2.statistics import RoundStatisticsRepository
@@ -52,6 +60,37 @@ def test_get_daily_country_same_country_for_same_day():
     assert first_call.name == second_call.name
 
 
+@pytest.mark.noautofixt
+def test_get_daily_country_for_given_day():
+    day = date(2025, 1, 1)
+
+    assert get_daily_country(day) is pick_daily_country(day)
+    assert get_daily_country(day) is pick_daily_country(date(2025, 1, 1))
+
+
+@pytest.mark.noautofixt
+def test_get_daily_country_leaves_global_random_alone():
+    random.seed(276)
+    expected = random.random()
+
+    random.seed(276)
+    pick_daily_country(date(2025, 1, 2))
+    get_daily_country()
+
+    assert random.random() == expected
+
+
+@pytest.mark.noautofixt
+def test_compare_countries_set_overlaps():
+    feedback = compare_countries(get_country("canada"), get_country("united states"))
+
+    assert feedback.name is False
+    assert feedback.languages == "partial"
+    assert feedback.currencies is False
+    assert feedback.timezones == "partial"
+    assert feedback.region is True
+
+
 # region handle_guess() Tests
 
 
@@ -108,22 +147,22 @@ async def test_handle_guess_limit(round_stats, mocked_get_daily_country, mocked_
 # region end_game() tests
 async def test_win_game(round_stats, mocked_stats_repo):
     round_stats.game_ended.emit = MagicMock()
-    round_stats.end_round = MagicMock()
 
-    await end_game(True, round_stats)
+    with patch.object(RoundStats, "end_round") as mocked_end_round:
+        await end_game(True, round_stats)
 
     round_stats.game_ended.emit.assert_called_once_with(True)
-    round_stats.end_round.assert_called_once()
+    mocked_end_round.assert_called_once()
 
 
 async def test_lose_game(round_stats, mocked_stats_repo):
     round_stats.game_ended.emit = MagicMock()
-    round_stats.end_round = MagicMock()
 
-    await end_game(False, round_stats)
+    with patch.object(RoundStats, "end_round") as mocked_end_round:
+        await end_game(False, round_stats)
 
     round_stats.game_ended.emit.assert_called_once_with(False)
-    round_stats.end_round.assert_called_once()
+    mocked_end_round.assert_called_once()
 
 
 # endregion
@@ -0,0 +1,85 @@
+import random
+from array import array
+from collections import Counter
+
+import pytest
+
+from game import survival
+from game.rate_difficulty import rate_countries
+from phase2.country import get_catalog
+from phase2.difficulty import (
+    TIERS,
+    AliasSampler,
+    DifficultyTable,
+    get_difficulty_table,
+    get_random_country_by_difficulty,
+)
+
+
+def test_alias_sampler_follows_weights():
+    sampler = AliasSampler([1, 0, 3])
+    rng = random.Random(1)
+
+    counts = Counter(sampler.draw(rng) for _ in range(20000))
+
+    assert counts[1] == 0
+    assert 2.7 < counts[2] / counts[0] < 3.3
+
+
+def test_alias_sampler_needs_weights():
+    with pytest.raises(ValueError):
+        AliasSampler([0, 0])
+
+
+def test_table_tiers():
+    pool = get_catalog().eligible
+    table = DifficultyTable(pool, array("f", range(1, len(pool) + 1)))
+
+    assert list(table.tiers) == list(TIERS)
+    assert sum(len(countries) for countries in table.tiers.values()) == len(pool)
+    assert table.tier(pool.countries[0]) == "easy"
+    assert table.tier(pool.countries[-1]) == "hard"
+    assert table.draw("hard", random.Random(1)) in table.tiers["hard"]
+    assert table.draw_weighted(random.Random(1)) in pool
+
+
+def test_table_save_and_load(tmp_path):
+    pool = get_catalog().eligible
+    table = DifficultyTable(pool, array("f", [2.5] * len(pool)))
+    path = tmp_path / "difficulty.json"
+
+    table.save(path)
+    loaded = DifficultyTable.load(pool, path)
+
+    assert loaded.scores == table.scores
+    assert DifficultyTable.load(pool, tmp_path / "missing.json") is None
+
+
+def test_shipped_ratings_cover_every_country():
+    table = get_difficulty_table()
+
+    assert table is not None
+    assert get_random_country_by_difficulty("easy") in table.tiers["easy"]
+    assert get_random_country_by_difficulty() in get_catalog().eligible
+
+
+def test_rate_countries():
+    pool = get_catalog().eligible
+
+    table = rate_countries(pool=pool, games=3, processes=1)
+
+    assert len(table.scores) == len(pool)
+    assert all(score >= 1 for score in table.scores)
+
+
+def test_rate_countries_in_process_pool():
+    one_process = rate_countries(games=2, processes=1, seed=5)
+    two_processes = rate_countries(games=2, processes=2, seed=5)
+
+    assert one_process.scores == two_processes.scores
+
+
+def test_survival_difficulty_tier(monkeypatch):
+    monkeypatch.setattr(survival, "DIFFICULTY_TIER", "hard")
+
+    assert survival.survival_countries() == get_difficulty_table().tiers["hard"]
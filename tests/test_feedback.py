@@ -0,0 +1,131 @@
+import pytest
+
+from game.daily import compare_countries, compare_many, get_feedback_matrix, grade_guess
+from game.feedback import FeedbackMatrix
+from phase2.country import Country, get_catalog, get_country
+from phase2.round import FEEDBACK_CODE_LIMIT, FIELD_CODES, GuessFeedback
+
+
+def test_matrix_matches_compare_countries():
+    matrix = get_feedback_matrix()
+    countries = get_catalog().countries
+
+    assert len(matrix) == len(countries)
+    for guess in countries[::7]:
+        for answer in countries:
+            expected = compare_countries(guess, answer).as_dict()
+            assert matrix.feedback(guess, answer).as_dict() == expected
+
+
+def test_matrix_keeps_field_order():
+    guess, answer = get_country("canada"), get_country("peru")
+
+    feedback = get_feedback_matrix().feedback(guess, answer)
+
+    assert list(feedback.as_dict()) == list(compare_countries(guess, answer).as_dict())
+
+
+def test_matrix_save_and_load(tmp_path):
+    countries = get_catalog().countries[:20]
+    matrix = FeedbackMatrix(countries, compare_countries)
+    path = tmp_path / "matrix.bin"
+
+    matrix.save(path)
+    loaded = FeedbackMatrix.load(path, countries, compare_countries)
+
+    assert loaded is not None
+    assert loaded.codes == matrix.codes
+
+
+def test_matrix_load_rejects_other_countries(tmp_path):
+    countries = get_catalog().countries[:20]
+    path = tmp_path / "matrix.bin"
+    FeedbackMatrix(countries, compare_countries).save(path)
+
+    assert FeedbackMatrix.load(path, countries[:10], compare_countries) is None
+    assert FeedbackMatrix.load(tmp_path / "missing.bin", countries, compare_countries) is None
+
+
+def test_matrix_load_rejects_other_grading(tmp_path, monkeypatch):
+    countries = get_catalog().countries[:20]
+    path = tmp_path / "matrix.bin"
+    FeedbackMatrix(countries, compare_countries, version=1).save(path)
+
+    assert FeedbackMatrix.load(path, countries, compare_countries, version=1) is not None
+    assert FeedbackMatrix.load(path, countries, compare_countries, version=2) is None
+
+    monkeypatch.setattr("game.feedback.FIELD_CODES", {**FIELD_CODES, "size": {}})
+    assert FeedbackMatrix.load(path, countries, compare_countries, version=1) is None
+
+
+def test_grade_guess_outside_matrix():
+    testland = Country("testland", 10, 10, "Europe", ["en"], ["EUR"], ["UTC"])
+    answer = get_country("ireland")
+
+    assert get_feedback_matrix().code(testland, answer) is None
+    assert grade_guess(testland, answer).as_dict() == compare_countries(testland, answer).as_dict()
+
+
+def test_compare_many_whole_catalog():
+    guess = get_country("japan")
+
+    results = compare_many(guess)
+
+    assert len(results) == len(get_catalog().countries)
+    for answer, feedback in zip(get_catalog().countries, results):
+        assert feedback.as_dict() == compare_countries(guess, answer).as_dict()
+
+
+def test_compare_many_given_answers():
+    testland = Country("testland", 10, 10, "Europe", ["en"], ["EUR"], ["UTC"])
+    answers = [get_country("peru"), testland, get_country("japan")]
+
+    for guess in (get_country("chile"), testland):
+        results = compare_many(guess, answers)
+
+        assert [f.as_dict() for f in results] == [
+            compare_countries(guess, answer).as_dict() for answer in answers
+        ]
+
+
+def test_compare_many_codes_for_unknown_guess():
+    testland = Country("testland", 10, 10, "Europe", ["en"], ["EUR"], ["UTC"])
+    matrix = get_feedback_matrix()
+
+    codes = matrix.codes_for(testland)
+
+    assert len(codes) == len(matrix)
+
+
+def test_pack_roundtrip():
+    codes = set()
+    for guess in get_catalog().countries[::11]:
+        for answer in get_catalog().countries:
+            feedback = compare_countries(guess, answer)
+            code = feedback.pack()
+
+            assert 0 <= code < FEEDBACK_CODE_LIMIT
+            assert GuessFeedback.unpack(code).as_dict() == feedback.as_dict()
+            codes.add(code)
+
+    assert GuessFeedback.unpack(0).as_dict() == {}
+    assert len(codes) > 1
+
+
+def test_feedback_equality_follows_code():
+    feedback = GuessFeedback(name=False, population="<", currencies="partial")
+    same = GuessFeedback(name=False, population="<", currencies="partial")
+
+    assert feedback == same
+    assert hash(feedback) == hash(same) == feedback.pack()
+    assert feedback != GuessFeedback(name=False, population=">", currencies="partial")
+    assert {feedback: 1}[same] == 1
+
+
+def test_pack_rejects_invalid_values():
+    with pytest.raises(ValueError):
+        GuessFeedback(population="partial").pack()
+    with pytest.raises(ValueError):
+        GuessFeedback.unpack(FEEDBACK_CODE_LIMIT)
+    with pytest.raises(ValueError):
+        GuessFeedback.unpack(0b11)  # name has no third value
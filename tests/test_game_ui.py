@@ -131,6 +131,19 @@ async def test_valid_entry(user: User) -> None:
     )
 
 
+async def test_remaining_hint(user: User) -> None:
+    await user.open("/")
+
+    await user.should_not_see(marker="remaining")
+    user.find("Show remaining countries").click()
+    await user.should_see(marker="remaining")
+
+    user.find("Guess").type("United States").trigger("keydown.enter")
+    await asyncio.sleep(0.1)
+
+    await user.should_see("1 country remains")
+
+
 async def test_repeat_guess(user: User) -> None:
     await user.open("/")
 
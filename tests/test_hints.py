@@ -0,0 +1,91 @@
+from datetime import date, timedelta
+
+import pytest
+
+from game import schedule, survival
+from game.daily import compare_countries, get_daily_country
+from game.hints import (
+    count_remaining,
+    describe_remaining,
+    get_candidate_index,
+    remaining_countries,
+    warm_daily,
+)
+from phase2.country import get_catalog, get_country
+from phase2.difficulty import get_difficulty_table
+from phase2.round import RoundStats
+
+
+def play(answer, guesses) -> RoundStats:
+    round_stats = RoundStats(mode="daily")
+    for name in guesses:
+        round_stats.guessed_names.append(name)
+        round_stats.feedback.append(compare_countries(get_country(name), answer))
+    return round_stats
+
+
+def test_no_guesses_leaves_every_answer():
+    round_stats = RoundStats(mode="daily")
+
+    assert count_remaining(round_stats) == len(get_catalog().eligible)
+
+
+def test_remaining_matches_brute_force():
+    answer = get_country("peru")
+    guesses = ["canada", "brazil"]
+    round_stats = play(answer, guesses)
+
+    expected = [
+        candidate
+        for candidate in get_catalog().eligible.countries
+        if all(
+            compare_countries(get_country(name), candidate).as_dict() == feedback.as_dict()
+            for name, feedback in zip(guesses, round_stats.feedback)
+        )
+    ]
+
+    assert remaining_countries(round_stats) == expected
+    assert answer in expected
+    assert count_remaining(round_stats) == len(expected)
+
+
+@pytest.mark.parametrize("mode", ["daily", "survival"])
+def test_remaining_only_counts_difficulty_tier(monkeypatch, mode):
+    monkeypatch.setattr(schedule, "DAILY_DIFFICULTY_TIER", "easy")
+    monkeypatch.setattr(survival, "DIFFICULTY_TIER", "easy")
+    tier = get_difficulty_table().tiers["easy"]
+
+    round_stats = RoundStats(mode=mode)
+    assert count_remaining(round_stats) == len(tier)
+
+    answer = tier[0]
+    round_stats = play(answer, ["canada"])
+    round_stats.mode = mode
+    assert set(remaining_countries(round_stats)) <= set(tier)
+    assert answer in remaining_countries(round_stats)
+
+
+def test_correct_guess_leaves_one_country():
+    answer = get_country("japan")
+
+    assert remaining_countries(play(answer, ["france", "japan"])) == [answer]
+
+
+def test_describe_remaining():
+    answer = get_country("canada")
+
+    assert describe_remaining(play(answer, ["canada"])) == "1 country remains"
+    assert describe_remaining(RoundStats(mode="daily")) == (
+        f"{len(get_catalog().eligible)} countries remain"
+    )
+
+
+def test_warm_daily_readies_tomorrow():
+    tomorrow = date.today() + timedelta(days=1)
+    get_candidate_index.cache_clear()
+
+    answer = warm_daily(tomorrow)
+
+    assert answer is get_daily_country(tomorrow)
+    assert schedule.get_daily_schedule().lookup(tomorrow) is answer
+    assert get_candidate_index.cache_info().currsize == 1
@@ -0,0 +1,52 @@
+import pytest
+from shared.database import Base
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from phase2.indexes import drop_indexes, ensure_indexes, verify_indexes
+from phase2.leaderboard import LeaderboardEntry
+
+
+@pytest.fixture(scope="function")
+def engine():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+def test_models_declare_indexes(engine):
+    assert verify_indexes(engine) == []
+
+
+def test_ensure_indexes_adds_missing(engine):
+    drop_indexes(engine)
+    missing = verify_indexes(engine)
+
+    assert "ux_leaderboard_entry_user_id" in missing
+    assert "ix_round_statistics_user_mode_date" in missing
+    assert sorted(ensure_indexes(engine)) == sorted(missing)
+    assert verify_indexes(engine) == []
+    assert ensure_indexes(engine) == []
+
+
+def test_ensure_indexes_drops_replaced(engine):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX ix_leaderboard_entry_score ON leaderboard_entry (score)"))
+
+    ensure_indexes(engine)
+
+    names = {index["name"] for index in inspect(engine).get_indexes("leaderboard_entry")}
+    assert "ix_leaderboard_entry_score" not in names
+    assert "ix_leaderboard_entry_score_desc_entry_id" in names
+
+
+def test_one_leaderboard_entry_per_user(engine):
+    with Session(engine) as session:
+        session.add(LeaderboardEntry(user_id=1, score=5))
+        session.commit()
+
+        session.add(LeaderboardEntry(user_id=1, score=7))
+        with pytest.raises(IntegrityError):
+            session.commit()
@@ -2,11 +2,17 @@ from datetime import date, timedelta
 
 import pytest
 from shared.database import Base
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, select
 from sqlalchemy.orm import Session
 
 from phase2.friends import Friendship
-from phase2.leaderboard import Leaderboard, LeaderboardEntry
+from phase2.leaderboard import (
+    CachedEntry,
+    Leaderboard,
+    LeaderboardCache,
+    LeaderboardEntry,
+    decode_cursor,
+)
 from phase2.statistics import RoundStatistics
 
 
@@ -216,6 +222,176 @@ async def test_get_250_entries_from_position_50(repo, session):
     assert scores == expected_scores
 
 
+@pytest.mark.asyncio
+async def test_get_page_walks_whole_leaderboard(repo, session):
+    """
+    get_page should return every entry exactly once, in leaderboard order,
+    including entries that share a score
+    """
+    for i in range(25):
+        create_entry(session, user_id=i, score=i // 3)
+
+    pages, cursor = [], None
+    while True:
+        page, cursor = await repo.get_page(cursor, limit=10)
+        pages.append(page)
+        if cursor is None:
+            break
+
+    assert [len(page) for page in pages] == [10, 10, 5]
+    entries = [entry for page in pages for entry in page]
+    assert entries == await repo.get_250_entries(position=1)
+    assert [(e.score, e.entry_id) for e in entries] == sorted(
+        ((e.score, e.entry_id) for e in entries), key=lambda key: (-key[0], key[1])
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_page_exact_fit_has_no_next_cursor(repo, session):
+    for i in range(10):
+        create_entry(session, user_id=i, score=i)
+
+    page, cursor = await repo.get_page(limit=10)
+
+    assert len(page) == 10
+    assert cursor is None
+
+
+@pytest.mark.asyncio
+async def test_get_page_rejects_invalid_cursor(repo):
+    with pytest.raises(ValueError):
+        await repo.get_page("not a cursor")
+    with pytest.raises(ValueError):
+        decode_cursor("")
+
+
+def test_get_rank(repo, session):
+    create_entry(session, user_id=1, score=10)
+    create_entry(session, user_id=2, score=30)
+    create_entry(session, user_id=3, score=10)  # same score, newer entry ranks lower
+
+    assert repo.get_rank(2) == 1
+    assert repo.get_rank(1) == 2
+    assert repo.get_rank(3) == 3
+    assert repo.get_rank(99) is None
+
+
+@pytest.mark.asyncio
+async def test_get_window_around_user(repo, session):
+    for i in range(20):
+        create_entry(session, user_id=i, score=i)
+
+    window = repo.get_window(user_id=10, radius=3)
+
+    # User 10 is ranked 10th (users 19 down to 11 are above)
+    assert [(rank, entry.user_id) for rank, entry in window] == [
+        (7, 13), (8, 12), (9, 11), (10, 10), (11, 9), (12, 8), (13, 7)
+    ]
+    # Matches the ranks of the full leaderboard
+    everyone = await repo.get_250_entries(position=1)
+    assert all(everyone[rank - 1] is entry for rank, entry in window)
+
+
+def test_get_window_at_edges(repo, session):
+    for i in range(5):
+        create_entry(session, user_id=i, score=i)
+
+    assert [rank for rank, _ in repo.get_window(user_id=4, radius=2)] == [1, 2, 3]
+    assert [rank for rank, _ in repo.get_window(user_id=0, radius=2)] == [3, 4, 5]
+    assert repo.get_window(user_id=99) == []
+
+
+@pytest.mark.asyncio
+async def test_cached_reads_match_database(repo, session, engine):
+    for i in range(300):
+        create_entry(session, user_id=i, score=i // 4)
+    cache = LeaderboardCache()
+    cache.load(session)
+    cached = Leaderboard(session, cache=cache)
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(1))
+
+    def rows(entries):
+        return [(e.entry_id, e.user_id, e.score) for e in entries]
+
+    assert rows(await cached.get_top_10_entries()) == rows(await repo.get_top_10_entries())
+    assert rows(await cached.get_250_entries(40)) == rows(await repo.get_250_entries(40))
+
+    cached_page, cached_cursor = await cached.get_page(limit=20)
+    page, cursor = await repo.get_page(limit=20)
+    assert (rows(cached_page), cached_cursor) == (rows(page), cursor)
+    cached_page, _ = await cached.get_page(cursor, limit=20)
+    page, _ = await repo.get_page(cursor, limit=20)
+    assert rows(cached_page) == rows(page)
+
+    for user_id in (0, 150, 299, 999):
+        assert cached.get_rank(user_id) == repo.get_rank(user_id)
+        assert await cached.get_score(user_id) == await repo.get_score(user_id)
+        assert [(rank, e.user_id) for rank, e in cached.get_window(user_id, 5)] == [
+            (rank, e.user_id) for rank, e in repo.get_window(user_id, 5)
+        ]
+
+    # Only the uncached reads went to the database
+    uncached_statements = len(statements)
+    await cached.get_top_10_entries()
+    cached.get_rank(150)
+    cached.get_window(150, 5)
+    assert len(statements) == uncached_statements
+
+
+@pytest.mark.asyncio
+async def test_sync_user_entry_updates_cache(session):
+    cache = LeaderboardCache()
+    cache.load(session)
+    leaderboard = Leaderboard(session, cache=cache)
+
+    stats = {
+        user_id: FakeStats(user_id, 0, 0, 0, timedelta(), 0, score)
+        for user_id, score in [(1, 10), (2, 20)]
+    }
+    leaderboard.stats_repo = FakeStatsRepo(stats)
+    await leaderboard.sync_user_entry(1)
+    await leaderboard.sync_user_entry(2)
+    assert leaderboard.get_rank(1) == 2
+
+    stats[1].score = 30
+    await leaderboard.sync_user_entry(1)
+
+    assert leaderboard.get_rank(1) == 1
+    assert await leaderboard.get_score(1) == 30
+    assert [e.user_id for e in await leaderboard.get_top_10_entries()] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_cached_page_after_entry_moves(session):
+    for i in range(10):
+        create_entry(session, user_id=i, score=i // 2)
+    cache = LeaderboardCache()
+    cache.load(session)
+    leaderboard = Leaderboard(session, cache=cache)
+
+    first, cursor = await leaderboard.get_page(limit=4)
+
+    # The last entry on the first page climbs to the top before the next page is read
+    moved = await leaderboard.get_entry(first[-1].user_id)
+    moved.score = 100
+    session.commit()
+    cache.update([moved])
+
+    second, _ = await leaderboard.get_page(cursor, limit=4)
+    assert [e.user_id for e in first] == [8, 9, 6, 7]
+    assert [e.user_id for e in second] == [4, 5, 2, 3]
+
+
+def test_unloaded_cache_ignores_updates(session):
+    cache = LeaderboardCache()
+    cache.update([create_entry(session, user_id=1, score=5)])
+
+    assert cache.get(1) is None
+    assert Leaderboard(session, cache=cache).get_rank(1) == 1
+
+
 @pytest.mark.asyncio
 async def test_get_friends_entries_returns_sorted_results(session):
     db = session
@@ -247,4 +423,89 @@ async def test_get_friends_entries_returns_sorted_results(session):
     assert len(entries) == 3
 
     # Sorted by score DESCENDING
-    assert [e.user_id for e in entries] == [2, 1, 3]
\ No newline at end of file
+    assert [e.user_id for e in entries] == [2, 1, 3]
+
+def test_get_friends_entries_single_ranked_query(session, engine):
+    session.add_all([
+        Friendship(user_id=1, friend_id=2),
+        Friendship(user_id=1, friend_id=3),
+        Friendship(user_id=1, friend_id=3),  # duplicate friendship
+        Friendship(user_id=1, friend_id=4),  # no entry yet
+        Friendship(user_id=5, friend_id=1),  # someone else's friend list
+    ])
+    session.add_all([
+        LeaderboardEntry(user_id=1, score=50),
+        LeaderboardEntry(user_id=2, score=100),
+        LeaderboardEntry(user_id=3, score=50),
+        LeaderboardEntry(user_id=5, score=70),
+    ])
+    session.commit()
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(1))
+    ranked = Leaderboard(session).get_friends_entries(1, with_rank=True)
+
+    assert len(statements) == 1
+    # Tied scores share a rank, oldest entry first
+    assert [(rank, entry.user_id) for rank, entry in ranked] == [(1, 2), (2, 1), (2, 3)]
+    assert [e.user_id for e in Leaderboard(session).get_friends_entries(9)] == []
+
+
+def test_friends_leaderboard_cache(session, engine):
+    session.add_all([Friendship(user_id=1, friend_id=2), Friendship(user_id=1, friend_id=3)])
+    session.add_all([LeaderboardEntry(user_id=1, score=50), LeaderboardEntry(user_id=2, score=10)])
+    session.commit()
+    cache = LeaderboardCache()
+    leaderboard = Leaderboard(session, cache=cache)
+
+    def friends_of_1():
+        return [(e.user_id, e.score) for e in leaderboard.get_friends_entries(1)]
+
+    assert friends_of_1() == [(1, 50), (2, 10)]
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(1))
+    assert friends_of_1() == [(1, 50), (2, 10)]
+    assert statements == []
+
+    # A friend's entry is synced
+    entry = session.scalars(select(LeaderboardEntry).where(LeaderboardEntry.user_id == 2)).one()
+    entry.score = 80
+    session.commit()
+    cache.update([entry])
+    assert friends_of_1() == [(2, 80), (1, 50)]
+
+    # A friend without an entry gets one
+    cache.update([create_entry(session, user_id=3, score=60)])
+    assert friends_of_1() == [(2, 80), (3, 60), (1, 50)]
+
+    # A new friendship
+    create_entry(session, user_id=4, score=99)
+    friends_of_1()
+    session.add(Friendship(user_id=1, friend_id=4))
+    session.commit()
+    assert friends_of_1()[0] == (4, 99)
+
+    # A removed friendship
+    session.delete(session.scalars(select(Friendship).where(Friendship.friend_id == 4)).one())
+    session.commit()
+    assert [user_id for user_id, _ in friends_of_1()] == [2, 3, 1]
+
+
+def test_friends_leaderboard_cache_hands_out_copies(session):
+    session.add(Friendship(user_id=1, friend_id=2))
+    session.add_all([LeaderboardEntry(user_id=1, score=50), LeaderboardEntry(user_id=2, score=10)])
+    session.commit()
+    cache = LeaderboardCache()
+    leaderboard = Leaderboard(session, cache=cache)
+
+    uncached = Leaderboard(session).get_friends_entries(1, with_rank=True)
+    ranked = leaderboard.get_friends_entries(1, with_rank=True)
+    assert all(isinstance(entry, CachedEntry) for _, entry in uncached + ranked)
+
+    ranked.clear()
+    assert len(leaderboard.get_friends_entries(1, with_rank=True)) == 2
+
+    # Nothing is left behind for users whose leaderboards were all dropped
+    cache.friends.invalidate([1])
+    assert cache.friends._in_groups_of == {}
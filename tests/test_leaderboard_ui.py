@@ -1,5 +1,6 @@
+from datetime import timedelta
 from typing import Any, Dict, List
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import httpx
 import pytest
@@ -7,7 +8,8 @@ from nicegui import ui
 from nicegui.testing import User
 
 from game import leaderboard_ui
-from game.leaderboard_ui import fetch_leaderboard
+from game.leaderboard_ui import fetch_leaderboard, fetch_leaderboard_around
+from phase2.leaderboard import LeaderboardEntry
 
 pytest_plugins = ["nicegui.testing.user_plugin"]
 
@@ -195,4 +197,49 @@ def test_fetch_friends_leaderboard(monkeypatch: pytest.MonkeyPatch) -> None:
     # Returned rows
     assert result
 
-    patcher.stop()
\ No newline at end of file
+    patcher.stop()
+
+
+def test_fetch_leaderboard_around(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Rows around the player come from Leaderboard.get_window, with their ranks."""
+    entry = LeaderboardEntry(
+        entry_id=5,
+        user_id=42,
+        score=300,
+        daily_streak=2,
+        longest_daily_streak=4,
+        average_daily_guesses=3,
+        average_daily_time=timedelta(seconds=31.25),
+        longest_survival_streak=6,
+    )
+    fake_repo = MagicMock()
+    fake_repo.get_window.return_value = [(17, entry)]
+    monkeypatch.setattr(leaderboard_ui, "get_leaderboard_repository", lambda: fake_repo)
+
+    rows = fetch_leaderboard_around(42, radius=5)
+
+    fake_repo.get_window.assert_called_once_with(42, 5)
+    assert rows == [
+        {
+            "entry_id": 5,
+            "user_id": 42,
+            "daily_streak": 2,
+            "longest_daily_streak": 4,
+            "average_daily_guesses": 3,
+            "average_daily_time": "31.2s",
+            "longest_survival_streak": 6,
+            "high_score": 300,
+            "rank": 17,
+        }
+    ]
+
+
+def test_fetch_leaderboard_around_without_database(monkeypatch: pytest.MonkeyPatch) -> None:
+    """If the leaderboard can't be read, there are no rows around the player."""
+
+    def broken_repo():
+        raise RuntimeError("no database")
+
+    monkeypatch.setattr(leaderboard_ui, "get_leaderboard_repository", broken_repo)
+
+    assert fetch_leaderboard_around(42) == []
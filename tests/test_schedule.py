@@ -0,0 +1,55 @@
+import io
+from datetime import date, timedelta
+
+from game.daily import get_daily_country
+from game.schedule import DailySchedule, get_daily_schedule, pick_daily_country
+
+
+def test_schedule_matches_seeding_rule():
+    start = date(2025, 1, 1)
+    schedule = DailySchedule(start, days=30)
+
+    assert len(schedule) == 30
+    assert schedule.end == date(2025, 1, 30)
+    for offset in range(30):
+        day = start + timedelta(days=offset)
+        assert schedule.lookup(day) is pick_daily_country(day)
+
+
+def test_schedule_lookup_outside_range():
+    schedule = DailySchedule(date(2025, 1, 1), days=10)
+
+    assert schedule.lookup(date(2024, 12, 31)) is None
+    assert schedule.lookup(date(2025, 1, 11)) is None
+
+
+def test_schedule_warm_rolls_forward():
+    schedule = DailySchedule(date(2025, 1, 1), days=10)
+
+    schedule.warm(date(2025, 1, 5))
+
+    assert schedule.start == date(2025, 1, 4)
+    assert schedule.end == date(2025, 1, 14)
+    assert schedule.lookup(date(2025, 1, 14)) is pick_daily_country(date(2025, 1, 14))
+    assert schedule.lookup(date(2025, 1, 3)) is None
+
+
+def test_schedule_write_csv():
+    schedule = DailySchedule(date(2025, 1, 1), days=2)
+    out = io.StringIO()
+
+    schedule.write_csv(out)
+
+    lines = out.getvalue().splitlines()
+    assert lines[0] == "date,country"
+    assert lines[1] == f"2025-01-01,{pick_daily_country(date(2025, 1, 1)).name}"
+    assert len(lines) == 3
+
+
+def test_get_daily_country_reads_schedule():
+    today = date.today()
+
+    assert get_daily_schedule().lookup(today) is get_daily_country()
+    assert get_daily_country(today - timedelta(days=30)) is pick_daily_country(
+        today - timedelta(days=30)
+    )
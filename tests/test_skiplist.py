@@ -0,0 +1,59 @@
+import bisect
+import random
+
+import pytest
+
+from phase2.skiplist import IndexableSkipList
+
+
+def test_matches_sorted_list():
+    rng = random.Random(1)
+    skiplist = IndexableSkipList(rng=random.Random(2))
+    expected = []
+
+    for _ in range(3000):
+        key = rng.randrange(500)
+        if key in expected:
+            skiplist.remove(key)
+            expected.remove(key)
+        else:
+            skiplist.add(key)
+            bisect.insort(expected, key)
+
+        probe = rng.randrange(500)
+        assert skiplist.bisect_left(probe) == bisect.bisect_left(expected, probe)
+        assert skiplist.bisect_right(probe) == bisect.bisect_right(expected, probe)
+
+    assert len(skiplist) == len(expected)
+    assert list(skiplist) == expected
+    assert [skiplist[i] for i in range(len(expected))] == expected
+    assert [skiplist.index(key) for key in expected] == list(range(len(expected)))
+    assert skiplist.slice(10, 25) == expected[10:25]
+    assert skiplist[-1] == expected[-1]
+
+
+def test_built_from_sorted_keys():
+    keys = [(-score, -entry_id) for score, entry_id in [(9, 3), (9, 1), (4, 2), (1, 7)]]
+    skiplist = IndexableSkipList(sorted(keys))
+
+    assert list(skiplist) == sorted(keys)
+    skiplist.add((-5, -9))
+    assert skiplist.index((-5, -9)) == 2
+    assert skiplist.slice(1, 4) == [(-9, -1), (-5, -9), (-4, -2)]
+
+
+def test_rejects_bad_keys():
+    skiplist = IndexableSkipList([1, 2, 3])
+
+    with pytest.raises(ValueError):
+        skiplist.add(2)
+    with pytest.raises(ValueError):
+        skiplist.remove(4)
+    with pytest.raises(ValueError):
+        skiplist.index(4)
+    with pytest.raises(IndexError):
+        skiplist[3]
+    with pytest.raises(ValueError):
+        IndexableSkipList([2, 1])
+    assert 2 in skiplist
+    assert 4 not in skiplist
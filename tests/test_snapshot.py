@@ -0,0 +1,133 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from game.daily import compare_countries
+from game.snapshot import SnapshotStore, pack_snapshot, unpack_snapshot
+from game.survival import SurvivalStats, handle_survival_guess, survival_mode
+from phase2.country import get_catalog, get_country
+from phase2.round import RoundStats, pack_guess_log
+
+
+def make_session() -> tuple[SurvivalStats, RoundStats]:
+    survival_stats = SurvivalStats()
+    survival_stats.lives = 2
+    survival_stats.streak = 7
+    survival_stats.total_countries_guessed = 7
+    survival_stats.current_country = get_country("canada")
+
+    round_stats = RoundStats(mode="survival")
+    round_stats.start_time = datetime(2025, 3, 1, 12, 30, 15, 250, tzinfo=timezone.utc)
+    round_stats.guessed_names = ["france", "japan"]
+    round_stats.guesses = 2
+    round_stats.guess_log = pack_guess_log(
+        [("peru", 5, 1000), ("france", 9, 4000), ("japan", 3, 7500)]
+    )
+    return survival_stats, round_stats
+
+
+def test_snapshot_roundtrip():
+    session = make_session()
+    data = pack_snapshot(*session)
+    assert len(data) < 512
+
+    survival_stats, round_stats = SurvivalStats(), RoundStats(mode="survival")
+    # Entries past the ones the snapshot counts are ignored
+    unpack_snapshot(data, survival_stats, round_stats, session[1].guess_log + b"\x00" * 8)
+
+    assert survival_stats.lives == 2
+    assert survival_stats.streak == 7
+    assert survival_stats.total_countries_guessed == 7
+    assert survival_stats.current_country is get_country("canada")
+    assert round_stats.guesses == 2
+    assert round_stats.guessed_names == ["france", "japan"]
+    assert round_stats.start_time == datetime(2025, 3, 1, 12, 30, 15, 250, tzinfo=timezone.utc)
+    assert [feedback.as_dict() for feedback in round_stats.feedback] == [
+        compare_countries(get_country(name), get_country("canada")).as_dict()
+        for name in ["france", "japan"]
+    ]
+    assert round_stats.guess_log == session[1].guess_log
+    assert survival_stats.countries.remaining() == session[0].countries.remaining()
+
+
+def test_snapshot_rejects_malformed_data():
+    data = pack_snapshot(*make_session())
+
+    with pytest.raises(ValueError):
+        unpack_snapshot(data[:-1], SurvivalStats(), RoundStats(mode="survival"))
+    with pytest.raises(ValueError):
+        unpack_snapshot(b"\x09" + data[1:], SurvivalStats(), RoundStats(mode="survival"))
+    with pytest.raises(ValueError):
+        unpack_snapshot(data + b"\x00", SurvivalStats(), RoundStats(mode="survival"))
+    with pytest.raises(ValueError, match="guess log"):
+        unpack_snapshot(data, SurvivalStats(), RoundStats(mode="survival"), b"\x00" * 8)
+
+
+def test_snapshot_rejects_other_catalog(monkeypatch):
+    data = pack_snapshot(*make_session())
+    monkeypatch.setattr(get_catalog(), "fingerprint", get_catalog().fingerprint ^ 1)
+
+    with pytest.raises(ValueError, match="different country catalog"):
+        unpack_snapshot(data, SurvivalStats(), RoundStats(mode="survival"))
+
+
+def test_store_restore_and_delete(tmp_path):
+    store = SnapshotStore(tmp_path, fsync_every=1)
+    store.save("42", *make_session())
+
+    survival_stats, round_stats = SurvivalStats(), RoundStats(mode="survival")
+    assert store.restore("42", survival_stats, round_stats)
+    assert survival_stats.streak == 7
+
+    store.delete("42")
+    assert not store.restore("42", SurvivalStats(), RoundStats(mode="survival"))
+
+
+def test_store_appends_guess_log(tmp_path):
+    store = SnapshotStore(tmp_path)
+    survival_stats, round_stats = make_session()
+    store.save("42", survival_stats, round_stats)
+    snapshot_size = store.path("42").stat().st_size
+
+    # Later writes only append the new entries, and the snapshot stays the same size
+    round_stats.guess_log += pack_guess_log([("chad", 1, 9000)])
+    store.save("42", survival_stats, round_stats)
+    assert store.log_path("42").read_bytes() == round_stats.guess_log
+    assert store.path("42").stat().st_size == snapshot_size
+
+    restored = RoundStats(mode="survival")
+    assert store.restore("42", SurvivalStats(), restored)
+    assert restored.guess_log == round_stats.guess_log
+
+    store.delete("42")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_store_discards_corrupt_snapshot(tmp_path):
+    store = SnapshotStore(tmp_path)
+    store.path("42").write_bytes(b"junk")
+
+    assert not store.restore("42", SurvivalStats(), RoundStats(mode="survival"))
+    assert not store.path("42").exists()
+
+
+def test_store_rejects_unsafe_keys(tmp_path):
+    with pytest.raises(ValueError):
+        SnapshotStore(tmp_path).path("../42")
+
+
+@pytest.mark.asyncio
+async def test_survival_run_resumes(tmp_path, monkeypatch):
+    store = SnapshotStore(tmp_path)
+    monkeypatch.setattr("game.survival.get_snapshot_store", lambda: store)
+
+    survival_stats, round_stats = survival_mode("7")
+    guess = "france" if survival_stats.current_country.name != "france" else "japan"
+    await handle_survival_guess(guess, round_stats, survival_stats)
+
+    resumed_stats, resumed_round = survival_mode("7")
+    assert resumed_stats.current_country is survival_stats.current_country
+    assert resumed_round.guessed_names == [guess]
+    assert resumed_round.start_time == round_stats.start_time
+    assert resumed_round.guess_log == round_stats.guess_log
+    assert resumed_stats.countries.remaining() == survival_stats.countries.remaining()
@@ -0,0 +1,38 @@
+import pytest
+
+from game.solver import Solver
+from phase2.country import get_country
+from phase2.round import MAX_GUESSES
+
+
+def test_play_finds_answer():
+    answer = get_country("peru")
+
+    with Solver(processes=1) as solver:
+        guesses = solver.play(answer)
+
+    assert guesses[-1] is answer
+    assert len(guesses) <= MAX_GUESSES
+
+
+def test_process_pool_picks_same_guess():
+    with Solver(processes=1) as solver:
+        expected = solver.best_guess(solver.answer_indexes)
+
+    with Solver(processes=2) as solver:
+        assert solver.best_guess(solver.answer_indexes) == expected
+
+
+def test_benchmark():
+    with Solver(processes=1, strategy="minimax") as solver:
+        result = solver.benchmark()
+
+    assert result.games == len(solver.answers)
+    assert result.average_guesses >= 1
+    assert sum(result.distribution.values()) == result.games
+    assert "Solved within" in str(result)
+
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError):
+        Solver(processes=1, strategy="luck")
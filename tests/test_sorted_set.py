@@ -0,0 +1,87 @@
+import random
+
+import pytest
+
+from phase2.sorted_set import InProcessSortedSet
+
+
+@pytest.fixture
+def scores():
+    return InProcessSortedSet({"amy": 30, "bob": 10, "cat": 20, "dan": 20})
+
+
+def test_orders_by_score_then_member(scores):
+    assert scores.range_by_rank(0, -1) == [("bob", 10), ("cat", 20), ("dan", 20), ("amy", 30)]
+    assert scores.range_by_rank(0, 1, reverse=True) == [("amy", 30), ("dan", 20)]
+    assert scores.range_by_rank(-2, -1) == [("dan", 20), ("amy", 30)]
+    assert scores.range_by_rank(3, 10) == [("amy", 30)]
+    assert scores.range_by_rank(2, 1) == []
+
+
+def test_rank(scores):
+    assert scores.rank("bob") == 0
+    assert scores.rank("cat") == 1
+    assert scores.rank("bob", reverse=True) == 3
+    assert scores.rank("eve") is None
+
+
+def test_add_and_update(scores):
+    assert scores.add({"eve": 15, "bob": 40}) == 1
+    assert scores.score("bob") == 40
+    assert scores.rank("bob", reverse=True) == 0
+
+    # With gt, scores only go up
+    assert scores.add({"bob": 5, "cat": 25}, gt=True) == 0
+    assert scores.score("bob") == 40
+    assert scores.score("cat") == 25
+    assert len(scores) == 5
+
+
+def test_increment(scores):
+    assert scores.increment("bob", 15) == 25
+    assert scores.increment("eve") == 1
+    assert scores.range_by_rank(0, 1) == [("eve", 1), ("cat", 20)]
+
+
+def test_remove_and_clear(scores):
+    assert scores.remove("bob", "eve", "cat") == 2
+    assert scores.range_by_rank(0, -1) == [("dan", 20), ("amy", 30)]
+
+    scores.clear()
+    assert len(scores) == 0
+    assert scores.range_by_rank(0, -1) == []
+
+
+def test_range_by_score(scores):
+    assert scores.range_by_score(15, 30) == [("cat", 20), ("dan", 20), ("amy", 30)]
+    assert scores.range_by_score(20, 20, reverse=True) == [("dan", 20), ("cat", 20)]
+    assert scores.range_by_score(0, 100, offset=1, count=2) == [("cat", 20), ("dan", 20)]
+    assert scores.range_by_score(0, 100, reverse=True, offset=1, count=2) == [
+        ("dan", 20),
+        ("cat", 20),
+    ]
+    assert scores.range_by_score(float("-inf"), float("inf")) == scores.range_by_rank(0, -1)
+    assert scores.range_by_score(31, 40) == []
+    assert scores.count(20, 30) == 3
+    assert scores.count(30, 20) == 0
+
+
+def test_matches_sorted_list():
+    rng = random.Random(3)
+    scores = InProcessSortedSet()
+    expected: dict[str, int] = {}
+
+    for _ in range(2000):
+        member = f"user{rng.randrange(200)}"
+        if rng.random() < 0.2:
+            scores.remove(member)
+            expected.pop(member, None)
+        else:
+            score = rng.randrange(50)
+            scores.add({member: score})
+            expected[member] = score
+
+    ordered = sorted(expected.items(), key=lambda item: (item[1], item[0]))
+    assert scores.range_by_rank(0, -1) == ordered
+    assert [scores.rank(member) for member, _ in ordered] == list(range(len(ordered)))
+    assert scores.range_by_score(10, 20) == [item for item in ordered if 10 <= item[1] <= 20]
@@ -2,12 +2,17 @@ from datetime import date, datetime, time, timedelta
 
 import pytest
 from shared.database import Base
-from sqlalchemy import create_engine, select
+from sqlalchemy import create_engine, event, select
 from sqlalchemy.orm import Session
 
-from phase2.leaderboard import LeaderboardEntry
-from phase2.round import RoundStats
-from phase2.statistics import RoundStatistics, RoundStatisticsRepository
+from phase2.leaderboard import LeaderboardCache, LeaderboardEntry
+from phase2.round import GuessFeedback, RoundStats
+from phase2.statistics import (
+    GuessEvent,
+    RoundStatistics,
+    RoundStatisticsRepository,
+    UserStatsAggregate,
+)
 
 
 @pytest.fixture(scope="function")
@@ -109,7 +114,7 @@ async def test_get_leaderboard_stats_for_user(repo):
     assert stats.longest_survival_streak == 0
 
     # Test daily streak counting
-    round_stats.daily_date = today + timedelta(days=1)
+    round_stats.start_time = datetime.combine(today + timedelta(days=1), time())
     created = await repo.add_round(round_stats)
 
     stats = repo.get_leaderboard_stats_for_user(user_id=1)
@@ -117,10 +122,225 @@ async def test_get_leaderboard_stats_for_user(repo):
     assert stats.daily_streak == 2
 
     # Test daily streak breaking
-    round_stats.daily_date = today + timedelta(days=2)
+    round_stats.start_time = datetime.combine(today + timedelta(days=2), time())
     round_stats.won = False
     created = await repo.add_round(round_stats)
 
     stats = repo.get_leaderboard_stats_for_user(user_id=1)
 
     assert stats.daily_streak == 0
+
+
+def make_guessed_round(mode: str, day: date, names: list[str]) -> RoundStats:
+    round_stats = RoundStats(mode=mode, user_id=1)
+    round_stats.start_round()
+    for name in names:
+        round_stats.record_guess(name, GuessFeedback(name=False, region=True))
+    round_stats.end_round()
+    round_stats.start_time = datetime.combine(day, time())
+    return round_stats
+
+
+async def test_add_round_stores_guess_events(repo, session):
+    round_stats = make_guessed_round("daily", date(2025, 1, 1), ["france", "japan", "peru"])
+
+    created = await repo.add_round(round_stats)
+    events = repo.get_guess_events(created.id)
+
+    assert [event.guess_index for event in events] == [0, 1, 2]
+    assert [event.country_id for event in events] == ["france", "japan", "peru"]
+    assert all(
+        GuessFeedback.unpack(event.feedback) == GuessFeedback(name=False, region=True)
+        for event in events
+    )
+    assert all(event.time_offset >= 0 for event in events)
+
+
+async def test_add_round_without_guesses(repo, session):
+    created = await repo.add_round(make_guessed_round("daily", date(2025, 1, 1), []))
+
+    assert repo.get_guess_events(created.id) == []
+    assert session.execute(select(GuessEvent)).first() is None
+
+
+async def test_stream_guess_events(repo):
+    first = await repo.add_round(make_guessed_round("daily", date(2025, 1, 1), ["chad", "peru"]))
+    second = await repo.add_round(
+        make_guessed_round("survival", date(2025, 1, 2), ["fiji"]), survival_streak=0
+    )
+
+    streamed = [
+        (event.round_id, event.country_id) for event in repo.stream_guess_events(batch_size=1)
+    ]
+    assert streamed == [(first.id, "chad"), (first.id, "peru"), (second.id, "fiji")]
+
+    assert [event.round_id for event in repo.stream_guess_events(mode="survival")] == [second.id]
+    assert [
+        event.country_id for event in repo.stream_guess_events(since=date(2025, 1, 2))
+    ] == ["fiji"]
+
+
+def make_daily_round(day: date, won: bool, guesses: int = 3) -> RoundStats:
+    round_stats = RoundStats(mode="daily", user_id=1)
+    round_stats.start_time = datetime.combine(day, time())
+    round_stats.round_length = timedelta(seconds=10 * guesses)
+    round_stats.won = won
+    round_stats.guesses = guesses
+    return round_stats
+
+
+async def test_aggregate_tracks_streaks(repo):
+    start = date(2025, 2, 1)
+    for offset, won in enumerate([False, True, True, False, True]):
+        await repo.add_round(make_daily_round(start + timedelta(days=offset), won))
+
+    stats = repo.get_leaderboard_stats_for_user(1)
+    assert stats.daily_streak == 1
+    assert stats.longest_daily_streak == 2
+
+    await repo.add_round(make_daily_round(start + timedelta(days=5), False))
+    assert repo.get_leaderboard_stats_for_user(1).daily_streak == 0
+
+
+async def test_aggregate_averages_and_survival(repo):
+    await repo.add_round(make_daily_round(date(2025, 2, 1), True, guesses=2))
+    await repo.add_round(make_daily_round(date(2025, 2, 2), True, guesses=4))
+    survival = make_daily_round(date(2025, 2, 2), False)
+    survival.mode = "survival"
+    await repo.add_round(survival, survival_streak=6)
+
+    stats = repo.get_leaderboard_stats_for_user(1)
+    assert stats.average_daily_guesses == 3
+    assert stats.average_daily_time == timedelta(seconds=30)
+    assert stats.longest_survival_streak == 6
+    assert stats.score == 6 + 2
+
+
+async def test_aggregate_rebuilt_for_out_of_order_round(repo):
+    await repo.add_round(make_daily_round(date(2025, 2, 2), True))
+    await repo.add_round(make_daily_round(date(2025, 2, 3), False))
+    # A late result for the day before the others
+    await repo.add_round(make_daily_round(date(2025, 2, 1), True))
+
+    stats = repo.get_leaderboard_stats_for_user(1)
+    assert stats.daily_streak == 0
+    assert stats.longest_daily_streak == 2
+
+
+async def test_aggregate_built_lazily(repo, session):
+    await repo.add_round(make_daily_round(date(2025, 2, 1), True))
+    await repo.add_round(make_daily_round(date(2025, 2, 2), True))
+    session.delete(session.get(UserStatsAggregate, 1))
+    session.commit()
+
+    stats = repo.get_leaderboard_stats_for_user(1)
+
+    assert stats.daily_streak == 2
+    # Reads don't leave anything pending in the session
+    assert not session.new and not session.dirty
+    assert session.get(UserStatsAggregate, 1) is None
+
+    await repo.add_round(make_daily_round(date(2025, 2, 3), True))
+    assert session.get(UserStatsAggregate, 1).daily_streak == 3
+
+
+async def test_compute_all_aggregates_matches_incremental(repo):
+    start = date(2025, 3, 1)
+    histories = {
+        1: [False, True, True, False],
+        2: [True, True, False, True, True, True],
+        3: [True],
+    }
+    for user_id, results in histories.items():
+        for offset, won in enumerate(results):
+            round_stats = make_daily_round(start + timedelta(days=offset), won, guesses=offset + 1)
+            round_stats.user_id = user_id
+            await repo.add_round(round_stats)
+
+    survival = make_daily_round(start, False)
+    survival.mode = "survival"
+    survival.user_id = 4
+    await repo.add_round(survival, survival_streak=9)
+
+    computed = repo.compute_all_aggregates()
+
+    assert computed.keys() == {1, 2, 3, 4}
+    assert (computed[1].daily_streak, computed[1].longest_daily_streak) == (0, 2)
+    assert (computed[2].daily_streak, computed[2].longest_daily_streak) == (3, 3)
+    assert (computed[3].daily_streak, computed[3].longest_daily_streak) == (1, 1)
+    assert computed[2].daily_time_total == timedelta(seconds=10 * sum(range(1, 7)))
+    assert computed[4].longest_survival_streak == 9
+    assert computed[4].daily_rounds == 0
+    assert repo.verify_aggregates() == []
+
+
+async def test_backfill_fixes_stale_aggregates(repo, session):
+    await repo.add_round(make_daily_round(date(2025, 3, 1), True))
+    await repo.add_round(make_daily_round(date(2025, 3, 2), True))
+    session.get(UserStatsAggregate, 1).daily_streak = 7
+
+    assert repo.verify_aggregates() == [1]
+    assert repo.backfill_aggregates() == 1
+    assert repo.verify_aggregates() == []
+    assert repo.get_leaderboard_stats_for_user(1).daily_streak == 2
+
+
+@pytest.mark.parametrize("upsert", [False, True])
+async def test_add_round_is_one_transaction(repo, session, upsert):
+    flushes, commits = [], []
+    event.listen(session, "after_flush", lambda *args: flushes.append(1))
+    event.listen(session, "after_commit", lambda *args: commits.append(1))
+
+    # A new user, then an existing one
+    for day in (date(2025, 4, 1), date(2025, 4, 2)):
+        flushes.clear()
+        commits.clear()
+        await repo.add_round(
+            make_guessed_round("daily", day, ["chad", "peru"]), upsert=upsert
+        )
+        assert (len(flushes), len(commits)) == (1, 1)
+
+    entry = session.execute(select(LeaderboardEntry)).scalars().one()
+    assert entry.user_id == 1
+
+
+async def test_upsert_keeps_best_score(repo, session):
+    winner = make_daily_round(date(2025, 4, 1), True)
+    await repo.add_round(winner, upsert=True)
+    await repo.add_round(make_daily_round(date(2025, 4, 2), True), upsert=True)
+    await repo.add_round(make_daily_round(date(2025, 4, 3), False), upsert=True)
+
+    entry = session.execute(select(LeaderboardEntry)).scalars().one()
+    assert entry.daily_streak == 0
+    assert entry.longest_daily_streak == 2
+    assert entry.score == 2
+
+
+async def test_record_rounds_batch(repo):
+    first = make_guessed_round("daily", date(2025, 5, 1), ["chad"])
+    second = make_guessed_round("daily", date(2025, 5, 2), ["peru", "fiji"])
+    other_user = make_guessed_round("daily", date(2025, 5, 1), [])
+    other_user.user_id = 2
+    second.won = first.won = other_user.won = True
+
+    rows = repo.record_rounds([(first, None), (second, None), (other_user, None)])
+
+    assert [len(repo.get_guess_events(row.id)) for row in rows] == [1, 2, 0]
+    assert repo.get_leaderboard_stats_for_user(1).daily_streak == 2
+    assert repo.get_leaderboard_stats_for_user(2).daily_streak == 1
+    assert repo.verify_aggregates() == []
+
+
+def test_record_rounds_updates_leaderboard_cache(session):
+    cache = LeaderboardCache()
+    cache.load(session)
+    repo = RoundStatisticsRepository(session, leaderboard_cache=cache)
+
+    round_stats = make_guessed_round("daily", date(2025, 5, 1), ["chad"])
+    round_stats.won = True
+    repo.record_rounds([(round_stats, None)])
+
+    cached = cache.get(round_stats.user_id)
+    entry = session.scalars(select(LeaderboardEntry)).one()
+    assert (cached.entry_id, cached.score) == (entry.entry_id, entry.score)
+    assert cache.rank(round_stats.user_id) == 1
@@ -1,16 +1,26 @@
 
 
+import random
 from unittest.mock import patch
 
-from game.survival import STARTING_LIVES, SurvivalStats, survival_mode
-from phase2.round import RoundStats
+from game.daily import grade_guess
+from game.survival import (
+    SESSION_MEMORY_BUDGET,
+    STARTING_LIVES,
+    ShuffleBag,
+    SurvivalStats,
+    survival_mode,
+)
+from phase2.country import get_catalog, get_country
+from phase2.memory import measure_allocation
+from phase2.round import GUESS_LOG_ENTRY, RoundStats
 
 
 class TestSurvivalMode:
-    @patch("game.survival.get_random_country")
-    def test_survival_mode(self, mock_get_random):
+    @patch("game.survival.ShuffleBag.next")
+    def test_survival_mode(self, mock_next):
         """Test that survival_mode initializes correctly"""
-        mock_country = mock_get_random.return_value
+        mock_country = mock_next.return_value
         
         survival_stats, round_stats = survival_mode()
         
@@ -25,5 +35,62 @@ class TestSurvivalMode:
         assert isinstance(round_stats, RoundStats)
         assert round_stats.mode == "survival"
         
-        # Verify get_random_country was called
-        mock_get_random.assert_called_once()
\ No newline at end of file
+        # Verify the first country was taken from the bag
+        mock_next.assert_called_once()
+
+
+class TestShuffleBag:
+    def test_no_repeats_until_exhausted(self):
+        countries = get_catalog().eligible.countries
+        bag = ShuffleBag(countries, random.Random(1))
+
+        first_cycle = [bag.next() for _ in countries]
+        second_cycle = [bag.next() for _ in countries]
+
+        assert len(set(map(id, first_cycle))) == len(countries)
+        assert len(set(map(id, second_cycle))) == len(countries)
+        assert first_cycle[-1] is not second_cycle[0]
+
+    def test_refills_in_background(self):
+        countries = get_catalog().eligible.countries[:5]
+        bag = ShuffleBag(countries, random.Random(1), refill_at=2)
+
+        for _ in range(3):
+            bag.next()
+
+        assert len(bag) == 2
+        assert bag._next_cycle is not None
+        assert len({id(bag.next()) for _ in range(7)}) == 5
+
+    def test_next_country(self):
+        survival_stats = SurvivalStats()
+
+        country = survival_stats.next_country()
+
+        assert survival_stats.current_country is country
+        assert country in get_catalog().eligible
+
+
+def test_session_memory_budget():
+    # 10 countries of 5 graded guesses each, everything a run keeps between guesses
+    countries = 10
+    guesses = ["france", "japan", "brazil", "kenya", "india"]
+
+    def full_session():
+        # Built by hand rather than with survival_mode, so log records aren't counted
+        survival_stats, round_stats = SurvivalStats(), RoundStats(mode="survival")
+        round_stats.start_round()
+        for _ in range(countries):
+            # Moving on to the next country, as handle_correct_guess does
+            survival_stats.next_country()
+            round_stats.guesses = 0
+            round_stats.guessed_names = []
+            round_stats.feedback = []
+            for name in guesses:
+                feedback = grade_guess(get_country(name), survival_stats.current_country)
+                round_stats.record_guess(name, feedback)
+        return survival_stats, round_stats
+
+    survival_stats, round_stats = full_session()  # warms up the catalog and feedback matrix
+    assert len(round_stats.guess_log) == countries * len(guesses) * GUESS_LOG_ENTRY.size
+    assert measure_allocation(full_session, count=200) < SESSION_MEMORY_BUDGET
@@ -12,11 +12,11 @@ pytest_plugins = ["nicegui.testing.user_plugin"]
 
 @pytest.fixture(autouse=True)
 def mocked_get_random_country(request):
-    """Mock get_random_country to return consistent country for testing"""
+    """Mock the survival shuffle bag to return consistent country for testing"""
     if "noautofixt" in request.keywords:
         yield "Nil"
     else:
-        patcher = patch("game.survival.get_random_country")
+        patcher = patch("game.survival.ShuffleBag.next")
         mock = patcher.start()
         mock.return_value = get_country("united states")
         yield mock
@@ -0,0 +1,229 @@
+import asyncio
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+from phase2.round import RoundStats, pack_guess_log
+from phase2.write_queue import RoundWriteQueue, record_to_round, round_to_record
+
+
+def make_round(user_id: int = 1) -> RoundStats:
+    round_stats = RoundStats(mode="daily", user_id=user_id)
+    round_stats.start_time = datetime(2025, 5, 1, tzinfo=timezone.utc)
+    round_stats.round_length = timedelta(seconds=42)
+    round_stats.won = True
+    round_stats.guesses = 2
+    round_stats.guess_log = pack_guess_log([("peru", 5, 1000), ("chad", 1, 2500)])
+    return round_stats
+
+
+def test_record_roundtrip():
+    round_stats, streak = record_to_round(
+        json.loads(json.dumps(round_to_record(make_round(), 4)))
+    )
+
+    assert streak == 4
+    assert round_stats.user_id == 1
+    assert round_stats.start_time == make_round().start_time
+    assert round_stats.round_length == timedelta(seconds=42)
+    assert round_stats.guess_log == make_round().guess_log
+
+
+async def test_put_writes_inline_until_started():
+    repository = MagicMock()
+    repository.add_round = AsyncMock()
+    writer = RoundWriteQueue(lambda: repository)
+
+    round_stats = make_round()
+    await writer.put(round_stats, survival_streak=3)
+
+    repository.add_round.assert_awaited_once_with(round_stats, survival_streak=3)
+    assert writer.metrics.written == 1
+
+
+async def test_rounds_written_in_batches():
+    repository = MagicMock()
+    writer = RoundWriteQueue(lambda: repository, batch_size=10)
+    writer.start()
+
+    rounds = [make_round(user_id) for user_id in range(25)]
+    for round_stats in rounds:
+        await writer.put(round_stats)
+    await writer.stop()
+
+    written = [item[0] for call in repository.record_rounds.call_args_list for item in call.args[0]]
+    assert written == rounds
+    assert all(len(call.args[0]) <= 10 for call in repository.record_rounds.call_args_list)
+    assert writer.metrics.written == 25
+    assert writer.metrics.max_depth >= 1
+    assert not writer.running
+
+
+async def test_failed_batch_retried_one_by_one():
+    bad = make_round(user_id=666)
+
+    def record_rounds(batch):
+        if any(round_stats is bad for round_stats, _ in batch):
+            raise ValueError("bad round")
+
+    repository = MagicMock()
+    repository.record_rounds.side_effect = record_rounds
+    writer = RoundWriteQueue(lambda: repository, retry_delay=0)
+    writer.start()
+
+    # Queued together so they end up in the same batch
+    for round_stats in [make_round(1), bad, make_round(2)]:
+        writer._queue.put_nowait((round_stats, None, None))
+    await writer.stop()
+
+    assert writer.metrics.written == 2
+    assert writer.metrics.failed == 1
+    # Tried in the batch, on its own, then once per retry
+    tried = [batch for call in repository.record_rounds.call_args_list for batch in call.args]
+    assert sum(any(r is bad for r, _ in batch) for batch in tried) == 2 + writer.retries
+
+
+async def test_failed_round_retried_after_backoff():
+    attempts = []
+
+    def record_rounds(batch):
+        attempts.append(batch)
+        if len(attempts) == 1:
+            raise ValueError("database unavailable")
+
+    repository = MagicMock()
+    repository.record_rounds.side_effect = record_rounds
+    writer = RoundWriteQueue(lambda: repository, retry_delay=0)
+    writer.start()
+
+    await writer.put(make_round())
+    await writer.stop()
+
+    assert len(attempts) == 2
+    assert writer.metrics.written == 1
+    assert writer.metrics.failed == 0
+
+
+async def test_backpressure_when_full():
+    release = threading.Event()
+    repository = MagicMock()
+    repository.record_rounds.side_effect = lambda batch: release.wait(5)
+    writer = RoundWriteQueue(lambda: repository, max_size=1, batch_size=1)
+    writer.start()
+
+    await writer.put(make_round())
+    await asyncio.sleep(0.05)  # the worker takes the first round
+    await writer.put(make_round())
+
+    blocked = asyncio.create_task(writer.put(make_round()))
+    await asyncio.sleep(0.05)
+    assert not blocked.done()
+
+    release.set()
+    await blocked
+    await writer.stop()
+
+    assert writer.metrics.blocked_puts == 1
+    assert writer.metrics.written == 3
+
+
+async def test_spool_replayed_on_start(tmp_path):
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    (spool / "000000000003.jsonl").write_text(
+        json.dumps(round_to_record(make_round(7), None)) + "\n" + '{"cut short'
+    )
+    (spool / "000000000004.jsonl").write_text('{"cut short')
+    repository = MagicMock()
+    writer = RoundWriteQueue(lambda: repository, spool=spool)
+
+    writer.start()
+    await writer.put(make_round(8))
+    await writer.stop()
+
+    calls = repository.record_rounds.call_args_list
+    assert [[item[0].user_id for item in call.args[0]] for call in calls] == [[7], [8]]
+    assert list(spool.iterdir()) == []
+
+
+async def test_segment_kept_until_committed(tmp_path):
+    release = threading.Event()
+    repository = MagicMock()
+    repository.record_rounds.side_effect = lambda batch: release.wait(5)
+    writer = RoundWriteQueue(lambda: repository, spool=tmp_path)
+    writer.start()
+
+    await writer.put(make_round(1))
+    await asyncio.sleep(0.05)  # the worker takes the round and closes its segment
+    await writer.put(make_round(2))
+    assert len(list(tmp_path.iterdir())) == 2
+
+    release.set()
+    await writer.stop()
+
+    assert list(tmp_path.iterdir()) == []
+
+
+async def test_failed_rounds_kept_in_spool(tmp_path):
+    bad = make_round(user_id=666)
+
+    def record_rounds(batch):
+        if any(round_stats is bad for round_stats, _ in batch):
+            raise ValueError("bad round")
+
+    repository = MagicMock()
+    repository.record_rounds.side_effect = record_rounds
+    writer = RoundWriteQueue(lambda: repository, spool=tmp_path, retries=1, retry_delay=0)
+    writer.start()
+
+    for round_stats in [make_round(1), bad, make_round(2)]:
+        await writer.put(round_stats)
+    await writer.stop()
+
+    # Only the failed round is left, to be tried again on the next start
+    [segment] = tmp_path.iterdir()
+    assert [json.loads(line)["user_id"] for line in segment.read_text().splitlines()] == [666]
+
+    repository = MagicMock()
+    writer = RoundWriteQueue(lambda: repository, spool=tmp_path)
+    writer.start()
+    await writer.stop()
+
+    [call] = repository.record_rounds.call_args_list
+    assert [round_stats.user_id for round_stats, _ in call.args[0]] == [666]
+    assert list(tmp_path.iterdir()) == []
+
+
+async def test_stop_when_worker_died(tmp_path):
+    repository = MagicMock()
+    writer = RoundWriteQueue(lambda: repository, batch_size=1, spool=tmp_path)
+    writer.start()
+
+    def crash(batch):
+        raise RuntimeError("worker bug")
+
+    writer._release = crash
+    for user_id in range(3):
+        await writer.put(make_round(user_id))
+
+    await asyncio.wait_for(writer.stop(), timeout=1)
+
+    assert not writer.running
+    # Nothing was released, so every round is still in the spool
+    assert sum(len(path.read_text().splitlines()) for path in tmp_path.iterdir()) == 3
+
+
+async def test_round_queued_when_spool_fails(tmp_path):
+    spool = tmp_path / "spool"
+    spool.write_text("")  # a file where the spool directory should be
+    repository = MagicMock()
+    writer = RoundWriteQueue(lambda: repository, spool=spool)
+    writer.start()
+
+    round_stats = make_round()
+    await writer.put(round_stats)
+    await writer.stop()
+
+    [call] = repository.record_rounds.call_args_list
+    assert call.args[0] == [(round_stats, None)]